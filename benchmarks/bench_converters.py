@@ -0,0 +1,92 @@
+"""
+Check the streaming html converter against the BeautifulSoup visitor on a
+corpus of generated fragments, then compare both on large pasted notes.
+
+    python -m benchmarks.bench_converters --count 20000 --paragraphs 5000
+"""
+import argparse
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from hyranote.asciidoc_stream import AsciidocStreamConverter
+from hyranote.asciidoc_visitor import AsciidocVisitor
+from hyranote.logging import Logging
+
+TAGS = ['p', 'div', 'span', 'b', 'i', 'em', 'strong', 'a href="https://example.com"', 'a href="local"', 'ul', 'ol',
+        'li', 'pre', 'code class="language-python"', 'br', 'hr', 'img src="image.png" alt="alt"', 'blockquote', 'cite',
+        'figure', 'figure class="paragraph-image"', 'figcaption', 'noscript', 'h1', 'h3', 'h5', 'table', 'tr', 'td',
+        'section', 'script', 'span style="font-weight: bold"', 'u']
+TEXTS = ['text', ' ', '\n', '  spaced  ', '&amp;', '&lt;', 'multi\nline', '<!-- comment -->', '&nbsp;']
+
+ARTICLE = '''<h2>Section {i}</h2><p>Lorem <b>ipsum</b> dolor <a href="https://example.com/{i}">sit</a> amet,
+<em>consectetur</em> adipiscing elit.<br>Sed do eiusmod.</p>
+<ul><li>first <code>item</code></li><li>second<ol><li>nested {i}</li></ol></li></ul>
+<figure class="paragraph-image"><noscript><img src="https://example.com/{i}.png" alt="figure"></noscript>
+<figcaption>Caption {i}</figcaption></figure>
+<blockquote><p>Quote {i}</p><cite>Author</cite></blockquote>
+<pre><code class="language-python">def f():
+    return {i}</code></pre>
+'''
+
+
+def generate_fragment(rnd: random.Random) -> str:
+    out = []
+    for _ in range(rnd.randint(1, 12)):
+        r = rnd.random()
+        if r < 0.4:
+            out.append(f'<{rnd.choice(TAGS)}>')
+        elif r < 0.7:
+            out.append(f'</{rnd.choice(TAGS).split()[0]}>')
+        else:
+            out.append(rnd.choice(TEXTS))
+    return ''.join(out)
+
+
+def convert_soup(visitor, text):
+    doc = BeautifulSoup(f'<div>{text}</div>', features='html.parser')
+    return visitor.visit(doc.find()).strip()
+
+
+def convert_stream(converter, text):
+    return converter.convert(text).strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark streaming html converter')
+    parser.add_argument('--count', type=int, default=20000, help='Number of generated fragments')
+    parser.add_argument('--paragraphs', type=int, default=5000, help='Sections in the large note')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logger = Logging(Logging.LOG_ERROR + 1)
+    visitor = AsciidocVisitor(logger)
+    converter = AsciidocStreamConverter(logger)
+
+    rnd = random.Random(args.seed)
+    corpus = [generate_fragment(rnd) for _ in range(args.count)]
+    corpus.append(''.join(ARTICLE.format(i=i) for i in range(10)))
+    mismatches = 0
+    for text in corpus:
+        expected = convert_soup(visitor, text)
+        value = convert_stream(converter, text)
+        if value != expected:
+            mismatches += 1
+            print(f'MISMATCH {text!r}:\n  soup   {expected!r}\n  stream {value!r}')
+    print(f'{len(corpus)} fragments, {mismatches} mismatches')
+
+    note = ''.join(ARTICLE.format(i=i) for i in range(args.paragraphs))
+    for name, convert, engine in [('soup', convert_soup, visitor), ('stream', convert_stream, converter)]:
+        start = time.perf_counter()
+        value = convert(engine, note)
+        elapsed = time.perf_counter() - start
+        print(f'{name:<8} {elapsed:8.3f}s {len(note) / elapsed / 1e6:8.2f} MB/s {len(value):>10} chars')
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+"""
+Benchmark the html visitor on large notes made of nested lists, which
+exercise the per-render list state of the visitor.
+
+    python -m benchmarks.bench_lists --items 5000 --depth 6
+"""
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+from hyranote.asciidoc_visitor import AsciidocVisitor
+from hyranote.logging import Logging
+
+
+def make_nested_list(items, depth, i=0):
+    parts = []
+    for j in range(items):
+        tag = 'ul' if (i + j) % 2 else 'ol'
+        nested = ''
+        if depth > 1 and j % 3 == 0:
+            nested = make_nested_list(3, depth - 1, i + 1)
+        parts.append(f'<li>item <b>{j}</b> at level {i} <a href="https://example.com/{j}">link</a>'
+                     f'<br>second line{nested.format(tag=tag)}</li>')
+    tag = 'ul' if i % 2 else 'ol'
+    return f'<{tag}>{"".join(parts)}</{tag}>'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark nested list conversion')
+    parser.add_argument('--items', type=int, default=5000, help='Items of the outer list')
+    parser.add_argument('--depth', type=int, default=6, help='Nesting depth of the lists')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    html = make_nested_list(args.items, args.depth)
+    doc = BeautifulSoup(f'<div>{html}</div>', features='html.parser')
+    visitor = AsciidocVisitor(Logging(Logging.LOG_ERROR))
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        value = visitor.visit(doc.find())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f'{len(html):>10} chars html {len(value):>10} chars markup {best:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark loading contents.xml with plistlib against the lazy loader on a
+synthetic multi-year journal: wall time and peak memory of loading then
+rendering one week with the weekly generator. Each loader runs in its own
+process so peak RSS is measured separately.
+
+    python -m benchmarks.bench_load --years 20 --items 40
+"""
+import argparse
+import os
+import plistlib
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from hyranote.hyranote import Generator
+from hyranote.plist_stream import load_lazy_contents
+from hyranote.sinks import MemorySink
+
+
+def make_journal(years, items):
+    def node(text, subnodes=(), note=''):
+        return {'title': {'text': text}, 'note': {'text': note}, 'subnodes': list(subnodes)}
+
+    year_nodes = []
+    for year in range(years):
+        quarters = []
+        for quarter in range(1, 5):
+            weeks = []
+            for week in range((quarter - 1) * 13 + 1, quarter * 13 + 1):
+                notes = [node(f'<p>item {i} of W{week}</p>', note=f'<p>{"lorem ipsum " * 20}</p>')
+                         for i in range(items)]
+                weeks.append(node(f'W{week}', notes))
+            quarters.append(node(f'Q{quarter}', weeks))
+        year_nodes.append(node(f'{2000 + year}', quarters))
+    return {'canvas': {'mindMaps': [{'mainNode': node('Journal', year_nodes)}]}}
+
+
+def peak_memory_mb():
+    # VmHWM is reset by exec unlike ru_maxrss, which keeps the peak of the
+    # forked benchmark driver
+    try:
+        with open('/proc/self/status', 'rt') as fp:
+            for line in fp:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+
+
+def run(loader, input_dir):
+    start = time.perf_counter()
+    if loader == 'lazy':
+        data = load_lazy_contents(input_dir)
+    else:
+        with open(os.path.join(input_dir, 'contents.xml'), 'rb') as fp:
+            data = plistlib.load(fp)
+    loaded = time.perf_counter()
+    sink = MemorySink()
+    main_node = data['canvas']['mindMaps'][0]['mainNode']
+    Generator({'mainNode': main_node}, {'previous_week': 41, 'current_week': 42, 'current_quarter': 4,
+                                        'prefix': 'Bench', 'output_dir': '.'}).generate(sink)
+    rendered = time.perf_counter()
+    peak = peak_memory_mb()
+    print(f'{loader:<10} load {loaded - start:8.3f}s render {rendered - loaded:8.3f}s '
+          f'peak {peak:>6} MB {len(sink.getvalue()):>10} chars')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark contents.xml loaders')
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--items', type=int, default=40)
+    parser.add_argument('--run', nargs=2, metavar=('LOADER', 'INPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        run(*args.run)
+        return
+
+    with tempfile.TemporaryDirectory() as input_dir:
+        with open(os.path.join(input_dir, 'contents.xml'), 'wb') as fp:
+            plistlib.dump(make_journal(args.years, args.items), fp)
+        size = os.path.getsize(os.path.join(input_dir, 'contents.xml'))
+        print(f'contents.xml {size / (1 << 20):.1f} MB')
+        for loader in ('plistlib', 'lazy'):
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_load', '--run', loader, input_dir], check=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark rendering a single large mind map with its subtrees split over
+worker processes against a serial run, outputs of both are compared. With
+--skew most nodes sit under the first top-level branch.
+
+    python -m benchmarks.bench_split --nodes 20000 --jobs 4 --split-depth 1 --skew
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import add_arguments, document_options, make_document
+from hyranote.cache import ConversionCache
+from hyranote.hyranote import Generator, SimpleGenerator, converters
+from hyranote.logging import Logging
+from hyranote.sinks import MemorySink
+
+
+def render(generator_class, main_node, configs) -> tuple:
+    # cold cache for each run, the conversions are what is split
+    cache = ConversionCache(converters['soup'].version, max_size=1 << 20)
+    generator = generator_class(main_node, dict(configs, cache=cache))
+    sink = MemorySink()
+    start = time.perf_counter()
+    generator.generate(sink)
+    return time.perf_counter() - start, sink.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rendering subtrees of a mind map in worker processes')
+    add_arguments(parser)
+    parser.add_argument('--jobs', type=int, default=4, help='Number of worker processes')
+    parser.add_argument('--split-depth', type=int, default=1, help='Depth of subtrees sent to workers')
+    parser.add_argument('--skew', action='store_true', help='Move most top-level branches under the first one')
+    args = parser.parse_args()
+
+    data, _ = make_document(**document_options(args))
+    main_node = data['canvas']['mindMaps'][0]
+    branches = main_node['mainNode']['subnodes']
+    if args.skew and len(branches) > 2:
+        # a giant first branch and a small second one
+        branches[0]['subnodes'] = [x for branch in branches[:-1] for x in branch['subnodes']]
+        del branches[1:-1]
+    configs = {'input': 'bench.mindnode', 'logging': Logging.LOG_ERROR, 'previous_week': 1, 'current_week': 2,
+               'current_quarter': 1}
+    for generator_class in (SimpleGenerator, Generator):
+        serial, expected = render(generator_class, main_node, configs)
+        split, value = render(generator_class, main_node, dict(configs, jobs=args.jobs, split_depth=args.split_depth))
+        print(f'{generator_class.__name__:<16} serial {serial:8.3f}s  split {split:8.3f}s  '
+              f'{len(value):>10} chars  {"same" if value == expected else "DIFFERENT"}')
+
+
+if __name__ == '__main__':
+    main()
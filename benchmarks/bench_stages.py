@@ -0,0 +1,164 @@
+"""
+Time each stage of rendering a synthetic MindNode file separately: plist
+load, snapshot load, html conversion, tree walk with conversions cached,
+output write and resource sync, then rendering with output writes and
+resource sync done one after the other and overlapped. Results are written
+as JSON so runs of different commits can be compared. Resources are
+hardlinked within a file system, give --images-dir on another one to time
+real copies.
+
+    python -m benchmarks.bench_stages --nodes 20000 --attachments 100 --output before.json
+    python -m benchmarks.bench_stages --nodes 20000 --attachments 100 --compare before.json
+"""
+import argparse
+import json
+import os
+import platform
+import plistlib
+import shutil
+import subprocess
+import tempfile
+import time
+
+from benchmarks.synthetic import add_arguments, document_options, write_bundle
+from hyranote.cache import ConversionCache
+from hyranote.hutil import sync_resources
+from hyranote.hyranote import SimpleGenerator, converters
+from hyranote.pipeline import IOPipeline
+from hyranote.sinks import FileSink
+from hyranote.snapshot import load_contents
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def iter_texts(node):
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        yield node.get('title', {}).get('text', '')
+        yield node.get('note', {}).get('text', '')
+        stack.extend(node.get('subnodes', []))
+
+
+def render_and_sync(bundle, data, work_dir, images, converter, pipeline=None):
+    """
+    Render @ref.data with a cold cache into @ref.work_dir and copy its
+    attachments, in the background when @ref.pipeline is given
+    """
+    shutil.rmtree(images, ignore_errors=True)
+    main_node = data['canvas']['mindMaps'][0]
+    generator = SimpleGenerator(main_node, {'input': bundle, 'output_dir': work_dir, 'converter': converter,
+                                            'pipeline': pipeline})
+    generator.generate()
+    if pipeline is None:
+        sync_resources(bundle, images, generator.attachments)
+
+
+def run_once(bundle, work_dir, converter, images_dir=None) -> dict:
+    timings = {}
+    contents_path = os.path.join(bundle, 'contents.xml')
+
+    start = time.perf_counter()
+    with open(contents_path, 'rb') as fp:
+        data = plistlib.load(fp)
+    timings['plist_load'] = time.perf_counter() - start
+
+    snapshot_dir = os.path.join(work_dir, 'snapshots')
+    load_contents(bundle, snapshot_dir)
+    start = time.perf_counter()
+    load_contents(bundle, snapshot_dir)
+    timings['snapshot_load'] = time.perf_counter() - start
+
+    main_node = data['canvas']['mindMaps'][0]
+    cache = ConversionCache(converters[converter].version, max_size=1 << 30)
+    generator = SimpleGenerator(main_node, {'input': bundle, 'output_dir': work_dir, 'converter': converter,
+                                            'cache': cache})
+    texts = set(iter_texts(main_node['mainNode']))
+    start = time.perf_counter()
+    for x in texts:
+        generator._convert_to_markup(x)
+    timings['convert'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    chunks = list(generator.render())
+    timings['walk'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with FileSink(os.path.join(work_dir, 'output.asciidoc')) as sink:
+        for chunk in chunks:
+            sink.write(chunk)
+    timings['write'] = time.perf_counter() - start
+
+    images = os.path.join(images_dir or work_dir, 'images')
+    shutil.rmtree(images, ignore_errors=True)
+    start = time.perf_counter()
+    sync_resources(bundle, images, generator.attachments)
+    timings['copy_resources'] = time.perf_counter() - start
+    start = time.perf_counter()
+    sync_resources(bundle, images, generator.attachments)
+    timings['resync_resources'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    render_and_sync(bundle, data, work_dir, images, converter)
+    timings['sequential'] = time.perf_counter() - start
+    start = time.perf_counter()
+    with IOPipeline(bundle, images) as pipeline:
+        render_and_sync(bundle, data, work_dir, images, converter, pipeline)
+    timings['pipelined'] = time.perf_counter() - start
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark rendering stages on a synthetic MindNode file')
+    add_arguments(parser)
+    parser.add_argument('--converter', choices=sorted(converters), default='soup')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the fastest one is kept')
+    parser.add_argument('--images-dir', type=str, help='Folder to sync resources into, by default next to outputs')
+    parser.add_argument('--output', type=str, help='Write results to this JSON file')
+    parser.add_argument('--compare', type=str, help='JSON results of a previous run to compare with')
+    args = parser.parse_args()
+
+    options = document_options(args)
+    stages = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        bundle = os.path.join(tmp, 'bench.mindnode')
+        write_bundle(bundle, args.attachment_size, **options)
+        size = os.path.getsize(os.path.join(bundle, 'contents.xml'))
+        for i in range(args.repeat):
+            work_dir = os.path.join(tmp, f'run{i}')
+            os.makedirs(work_dir)
+            for name, value in run_once(bundle, work_dir, args.converter, args.images_dir).items():
+                stages[name] = min(stages.get(name, value), value)
+
+    results = {
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'converter': args.converter,
+        'document': dict(options, contents_bytes=size),
+        'stages': stages,
+    }
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'rt') as fp:
+            baseline = json.load(fp)
+
+    print(f'contents.xml {size / (1 << 20):.1f} MB, {args.nodes} nodes, commit {results["commit"]}')
+    for name, value in stages.items():
+        line = f'{name:<18} {value:8.4f}s'
+        if baseline and name in baseline.get('stages', {}):
+            before = baseline['stages'][name]
+            line += f'  {before:8.4f}s before ({value / before if before else 0:5.2f}x)'
+        print(line)
+    if args.output:
+        with open(args.output, 'wt') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
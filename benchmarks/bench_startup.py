@@ -0,0 +1,76 @@
+"""
+Check startup cost of the command line with `python -X importtime`: each
+subcommand's help must import no module listed in its forbidden set and
+the total import time must stay within the budget. Exit with status 1 when
+a check fails, so the script can gate changes in CI.
+
+    python -m benchmarks.bench_startup --budget-ms 40
+"""
+import argparse
+import subprocess
+import sys
+
+# modules which must not be imported just to parse the command line
+HEAVY = ['bs4', 'hyranote.hyranote', 'concurrent.futures.process', 'html.parser']
+
+COMMANDS = [
+    (['--help'], HEAVY),
+    (['dump', '--help'], HEAVY),
+    (['generate', '--help'], HEAVY),
+    (['simple', '--help'], HEAVY),
+    (['batch', '--help'], HEAVY),
+    (['serve', '--help'], HEAVY),
+    (['cache', 'stats', '--help'], HEAVY),
+]
+
+
+def measure(argv: list):
+    """
+    Return total import time in microseconds and imported module names of
+    running the command line with @ref.argv
+    """
+    code = f'import sys; sys.argv = {["hyranote"] + argv!r}; from hyranote.cli import main; main()'
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    total = 0
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if not fields[0].strip().isdigit():
+            # header line
+            continue
+        total += int(fields[0])
+        modules.add(fields[2].strip())
+    return total, modules
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check import time of the command line')
+    parser.add_argument('--budget-ms', type=float, default=40.0, help='Maximum total import time per command')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per command, the fastest one is kept')
+    args = parser.parse_args()
+
+    failures = 0
+    for argv, forbidden in COMMANDS:
+        total = None
+        modules = set()
+        for _ in range(args.repeat):
+            elapsed, modules = measure(argv)
+            total = elapsed if total is None else min(total, elapsed)
+        errors = []
+        if total / 1000 > args.budget_ms:
+            errors.append(f'over budget of {args.budget_ms:.1f} ms')
+        heavy = sorted(x for x in forbidden if x in modules)
+        if heavy:
+            errors.append(f'imports {", ".join(heavy)}')
+        status = 'FAIL' if errors else 'ok  '
+        print(f'{status} {total / 1000:8.2f} ms {len(modules):>4} modules  hyranote {" ".join(argv)}'
+              f'{"  " + "; ".join(errors) if errors else ""}')
+        failures += bool(errors)
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
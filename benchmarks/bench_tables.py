@@ -0,0 +1,67 @@
+"""
+Benchmark the html converters on notes holding large tables, with a header
+row, inline formatting and cells spanning rows and columns.
+
+    python -m benchmarks.bench_tables --cells 10000 --columns 10
+"""
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+from hyranote.asciidoc_stream import AsciidocStreamConverter
+from hyranote.asciidoc_visitor import AsciidocVisitor
+from hyranote.logging import Logging
+
+
+def make_table(cells, columns):
+    rows = [''.join(f'<th>Column {j}</th>' for j in range(columns))]
+    for i in range(max(1, cells // columns - 1)):
+        if i % 10 == 5:
+            # a cell spanning two columns and another one spanning two rows
+            cols = [f'<td colspan="2">wide <i>{i}</i></td>', f'<td rowspan="2">tall {i}</td>']
+            cols += [f'<td>{i}.{j}</td>' for j in range(3, columns)]
+        elif i % 10 == 6:
+            cols = [f'<td>{i}.{j}</td>' for j in range(columns) if j != 2]
+        else:
+            cols = [f'<td>row <b>{i}</b> <a href="https://example.com/{i}/{j}">cell {j}</a></td>'
+                    for j in range(columns)]
+        rows.append(''.join(cols))
+    return '<table><thead><tr>' + rows[0] + '</tr></thead><tbody>' + \
+        ''.join(f'<tr>{x}</tr>' for x in rows[1:]) + '</tbody></table>'
+
+
+def best_of(repeat, f):
+    best = None
+    value = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = f()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark table conversion')
+    parser.add_argument('--cells', type=int, default=10000, help='Number of cells of the table')
+    parser.add_argument('--columns', type=int, default=10, help='Number of columns of the table')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    html = make_table(args.cells, args.columns)
+    logger = Logging(Logging.LOG_ERROR)
+    visitor = AsciidocVisitor(logger)
+    stream = AsciidocStreamConverter(logger)
+
+    def tree():
+        # bs4 trees are modified by conversion, parse them on each run
+        return visitor.visit(BeautifulSoup(f'<div>{html}</div>', features='html.parser').find())
+
+    for name, f in (('tree', tree), ('stream', lambda: stream.convert(html))):
+        elapsed, value = best_of(args.repeat, f)
+        print(f'{name:<8} {len(html):>10} chars html {len(value):>10} chars markup {elapsed:8.3f}s')
+
+
+if __name__ == '__main__':
+    main()
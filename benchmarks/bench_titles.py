@@ -0,0 +1,106 @@
+"""
+Check the plain text fast path of title conversion against the full html
+parser on a corpus of real and generated fragments, then measure conversion
+throughput of both paths.
+
+    python -m benchmarks.bench_titles --count 20000
+"""
+import argparse
+import random
+import sys
+import time
+
+from bs4 import BeautifulSoup
+
+from hyranote.asciidoc_visitor import AsciidocVisitor, convert_plain_fragment
+from hyranote.logging import Logging
+
+REAL_FRAGMENTS = [
+    'W42',
+    'Q4 2020',
+    '[S] Backlog',
+    'Review PR #123',
+    '<span>Weekly sync</span>',
+    '<span style="font: 13px \'Helvetica Neue\'">Design review</span>',
+    '<span style="font-weight: bold">Important</span>',
+    '<span style="font: bold 13px Helvetica">Bold font</span>',
+    'Tom &amp; Jerry',
+    '<span>a &lt; b &amp;&amp; c &gt; d</span>',
+    'Q&amp;A session&nbsp;',
+    'it&#39;s &quot;quoted&quot;',
+    '&copy; 2020',
+    'AT&T',
+    '<b>bold</b> title',
+    '<span>nested <i>italic</i></span>',
+    '<p>paragraph</p>',
+    '  padded title \n',
+    'multi\nline\n  title',
+    '<span></span>',
+    '<span> </span>',
+    '',
+]
+
+PIECES = ['word', ' ', '  ', '\n', '\t', '&amp;', '&lt;', '&gt;', '&quot;', '&#39;', '&nbsp;', '&copy;', '&',
+          '&amp', '>', '#', '*', '[S]', 'W12', 'é', '\xa0', ';']
+STYLES = ['', ' style=""', ' style="font: 13px Helvetica"', ' style="font-weight: bold"',
+          ' style="color: red; font-weight: normal"', ' class="x"']
+
+
+def generate_fragment(rnd: random.Random) -> str:
+    text = ''.join(rnd.choice(PIECES) for _ in range(rnd.randint(0, 8)))
+    kind = rnd.random()
+    if kind < 0.4:
+        return text
+    if kind < 0.8:
+        return f'<span{rnd.choice(STYLES)}>{text}</span>'
+    return f'{text}<span{rnd.choice(STYLES)}>{text}</span>{text}'
+
+
+def convert_full(visitor: AsciidocVisitor, text: str) -> str:
+    doc = BeautifulSoup(f'<div>{text}</div>', features='html.parser')
+    return visitor.visit(doc.find()).strip()
+
+
+def convert_fast(visitor: AsciidocVisitor, text: str) -> str:
+    value = convert_plain_fragment(text)
+    if value is None:
+        value = convert_full(visitor, text)
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark plain text fast path of title conversion')
+    parser.add_argument('--count', type=int, default=20000, help='Number of generated fragments')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rnd = random.Random(args.seed)
+    corpus = REAL_FRAGMENTS + [generate_fragment(rnd) for _ in range(args.count)]
+    visitor = AsciidocVisitor(Logging(Logging.LOG_ERROR))
+
+    mismatches = 0
+    fast = 0
+    for text in corpus:
+        value = convert_plain_fragment(text)
+        if value is None:
+            continue
+        fast += 1
+        expected = convert_full(visitor, text)
+        if value != expected:
+            mismatches += 1
+            print(f'MISMATCH {text!r}: {value!r} != {expected!r}')
+    print(f'{len(corpus)} fragments, {fast} on fast path, {mismatches} mismatches')
+
+    for name, convert in [('full parser', convert_full), ('fast path', convert_fast)]:
+        start = time.perf_counter()
+        for text in corpus:
+            convert(visitor, text)
+        elapsed = time.perf_counter() - start
+        print(f'{name:<12} {len(corpus) / elapsed:12.0f} titles/s')
+
+    if mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
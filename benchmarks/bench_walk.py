@@ -0,0 +1,63 @@
+"""
+Benchmark tree walking of the generators and the html visitor on synthetic
+trees: a deep chain of nodes and a single node with a very wide list of
+children.
+
+    python -m benchmarks.bench_walk --depth 10000 --width 1000000
+"""
+import argparse
+import time
+
+from bs4 import BeautifulSoup
+
+from hyranote.hyranote import SimpleGenerator
+
+
+def make_deep_tree(depth):
+    root = {'title': {'text': 'root'}}
+    node = root
+    for i in range(depth):
+        child = {'title': {'text': f'level {i % 100}'}}
+        node['subnodes'] = [child]
+        node = child
+    return root
+
+
+def make_wide_tree(width):
+    subnodes = [{'title': {'text': f'item {i % 1000}'}} for i in range(width)]
+    return {'title': {'text': 'root'}, 'subnodes': subnodes}
+
+
+def bench_tree(name, root):
+    generator = SimpleGenerator({'mainNode': root}, {'input': 'bench.mindnode'})
+    size = 0
+    start = time.perf_counter()
+    for chunk in generator._iter_node(root):
+        size += len(chunk)
+    elapsed = time.perf_counter() - start
+    print(f'{name:<12} {elapsed:8.3f}s {size:>12} chars')
+
+
+def bench_html(name, html):
+    generator = SimpleGenerator({'mainNode': {}}, {'input': 'bench.mindnode'})
+    doc = BeautifulSoup(f'<div>{html}</div>', features='html.parser')
+    start = time.perf_counter()
+    value = generator.visitor.visit(doc.find())
+    elapsed = time.perf_counter() - start
+    print(f'{name:<12} {elapsed:8.3f}s {len(value):>12} chars')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark tree walkers')
+    parser.add_argument('--depth', type=int, default=10000)
+    parser.add_argument('--width', type=int, default=1000000)
+    args = parser.parse_args()
+
+    bench_tree('deep tree', make_deep_tree(args.depth))
+    bench_tree('wide tree', make_wide_tree(args.width))
+    bench_html('deep html', '<span>' * args.depth + 'text' + '</span>' * args.depth)
+    bench_html('wide html', '<ul>' + '<li>item</li>' * (args.width // 10) + '</ul>')
+
+
+if __name__ == '__main__':
+    main()
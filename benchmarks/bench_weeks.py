@@ -0,0 +1,68 @@
+"""
+Benchmark generating weekly notes of a whole year on a synthetic journal:
+one generator run per week against a single walk fanning nodes out to the
+notes of every week. Outputs of both are compared.
+
+    python -m benchmarks.bench_weeks --nodes 50000 --depth 8 --weeks 52
+"""
+import argparse
+import datetime
+import filecmp
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import add_arguments, document_options, make_document
+from hyranote.cache import ConversionCache
+from hyranote.hyranote import Generator, WeeklyArchive
+from hyranote.logging import Logging
+
+
+def get_weeks(count, year=2026):
+    weeks = []
+    for x in range(1, count + 1):
+        date = datetime.date.fromisocalendar(year, x, 4)
+        prev_week = (date - datetime.timedelta(days=7)).isocalendar()[1]
+        weeks.append((prev_week, x, int((date.month + 2) / 3), date))
+    return weeks
+
+
+def new_cache():
+    return ConversionCache('bench', max_size=1 << 20)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark generating notes of many weeks')
+    add_arguments(parser)
+    parser.add_argument('--weeks', type=int, default=52, help='Number of weeks to generate')
+    args = parser.parse_args()
+
+    data, _ = make_document(**document_options(args))
+    main_node = data['canvas']['mindMaps'][0]
+    weeks = get_weeks(args.weeks)
+    with tempfile.TemporaryDirectory() as output_dir:
+        configs = {'output_dir': output_dir, 'prefix': 'Bench', 'logging': Logging.LOG_ERROR}
+        runs = {}
+        for name in ('per-week', 'single'):
+            path = os.path.join(output_dir, name)
+            os.mkdir(path)
+            run_configs = dict(configs, output_dir=path)
+            start = time.perf_counter()
+            if name == 'single':
+                WeeklyArchive(main_node, dict(run_configs, weeks=weeks, cache=new_cache())).generate()
+            else:
+                for prev_week, week, quarter, date in weeks:
+                    # a cold cache like separate runs of the command line
+                    Generator(main_node, dict(run_configs, previous_week=prev_week, current_week=week,
+                                              current_quarter=quarter, date=date, cache=new_cache())).generate()
+            runs[name] = time.perf_counter() - start
+            print(f'{name:<10} {args.weeks:>4} weeks {runs[name]:8.3f}s')
+        names = sorted(os.listdir(os.path.join(output_dir, 'single')))
+        _, mismatch, errors = filecmp.cmpfiles(os.path.join(output_dir, 'per-week'),
+                                               os.path.join(output_dir, 'single'), names, shallow=False)
+        print(f'{len(names)} files, {len(mismatch) + len(errors)} differ, '
+              f'speedup {runs["per-week"] / runs["single"]:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,147 @@
+"""
+Generate synthetic MindNode files for benchmarks.
+
+A document has @ref.nodes nodes spread over levels up to @ref.depth with at
+most @ref.fanout children per node. Notes are made of html blocks picked
+from @ref.mix until they reach @ref.note_size characters. With labels, the
+first two levels are titled with quarters and weeks like a weekly journal.
+
+    python -m benchmarks.synthetic /tmp/bench.mindnode --nodes 50000 --attachments 200
+"""
+import argparse
+import os
+import plistlib
+import random
+
+BLOCKS = {
+    'text': '<p>Lorem <b>ipsum</b> dolor <a href="https://example.com/{i}">sit</a> amet, '
+            '<em>consectetur</em> adipiscing elit.<br>Sed do eiusmod {i}.</p>',
+    'list': '<ul><li>first <code>item</code></li><li>second<ol><li>nested {i}</li>'
+            '<li>other <i>nested</i></li></ol></li><li>third</li></ul>',
+    'code': '<pre><code class="language-python">def f_{i}(x):\n    return x * {i}\n</code></pre>',
+    'table': '<table><tr><th>Name</th><th>Value</th></tr><tr><td>row {i}</td><td><b>{i}</b></td></tr>'
+             '<tr><td>other</td><td>value</td></tr></table>',
+    'figure': '<figure class="paragraph-image"><noscript><img src="https://example.com/{i}.png" alt="figure">'
+              '</noscript><figcaption>Caption {i}</figcaption></figure>',
+}
+TITLES = ['<span>Topic {i}</span>', 'Plain title {i}', '<b>Bold</b> title {i}', '<span>Item <i>{i}</i></span>']
+# smallest valid png, attachments are padded to @ref.attachment_size bytes
+PNG = bytes.fromhex('89504e470d0a1a0a0000000d4948445200000001000000010806000000'
+                    '1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082')
+
+
+def make_note(rnd: random.Random, mix: list, size: int, i: int) -> str:
+    if size <= 0:
+        return ''
+    parts = []
+    length = 0
+    while length < size:
+        block = BLOCKS[rnd.choice(mix)].format(i=i)
+        parts.append(block)
+        length += len(block)
+    return ''.join(parts)
+
+
+def make_document(nodes=10000, depth=6, fanout=8, note_size=300, mix=None, labels=True,
+                  attachments=0, seed=1) -> tuple:
+    """
+    Return plist data of a synthetic MindNode file and names of its
+    attachments as a tuple
+    """
+    rnd = random.Random(seed)
+    mix = mix or list(BLOCKS)
+    root = {'title': {'text': 'Synthetic'}, 'subnodes': []}
+    count = 1
+    week = 0
+    level = [root]
+    all_nodes = []
+    for node_level in range(1, depth + 1):
+        next_level = []
+        for parent in level:
+            for j in range(rnd.randint(1, fanout)):
+                if count >= nodes:
+                    break
+                if labels and node_level == 1:
+                    title = f'Q{j % 4 + 1} plan'
+                elif labels and node_level == 2:
+                    week = week % 52 + 1
+                    title = f'W{week} notes'
+                else:
+                    title = rnd.choice(TITLES).format(i=count)
+                node = {'title': {'text': title}, 'subnodes': []}
+                note = make_note(rnd, mix, note_size, count) if node_level > 2 and rnd.random() < 0.5 else ''
+                if note:
+                    node['note'] = {'text': note}
+                if node_level > 2 and rnd.random() < 0.1:
+                    node['task'] = {'state': rnd.randint(1, 2)}
+                parent['subnodes'].append(node)
+                next_level.append(node)
+                all_nodes.append(node)
+                count += 1
+        if not next_level:
+            break
+        level = next_level
+
+    leaves = [x for x in all_nodes if not x['subnodes']] or all_nodes
+    names = []
+    for i, node in enumerate(rnd.sample(leaves, min(attachments, len(leaves)))):
+        name = f'image{i}.png'
+        node['attachment'] = {'fileName': name}
+        names.append(name)
+    return {'canvas': {'mindMaps': [{'mainNode': root}]}}, names
+
+
+def write_bundle(path: str, attachment_size: int = 64 * 1024, **kwargs) -> dict:
+    """
+    Write a synthetic MindNode file at @ref.path, keyword arguments are
+    those of `make_document`. Return the plist data.
+    """
+    data, names = make_document(**kwargs)
+    resources = os.path.join(path, 'resources')
+    os.makedirs(resources, exist_ok=True)
+    with open(os.path.join(path, 'contents.xml'), 'wb') as fp:
+        plistlib.dump(data, fp)
+    for i, name in enumerate(names):
+        with open(os.path.join(resources, name), 'wb') as fp:
+            fp.write(PNG)
+            fp.write(i.to_bytes(4, 'big') * max(0, (attachment_size - len(PNG)) // 4))
+    return data
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--nodes', type=int, default=10000, help='Number of nodes')
+    parser.add_argument('--depth', type=int, default=6, help='Maximum depth of the tree')
+    parser.add_argument('--fanout', type=int, default=8, help='Maximum number of children of a node')
+    parser.add_argument('--note-size', type=int, default=300, help='Characters of html per note')
+    parser.add_argument('--mix', type=str, default=','.join(BLOCKS),
+                        help=f'Comma separated kinds of note blocks among {", ".join(BLOCKS)}')
+    parser.add_argument('--no-labels', dest='labels', action='store_false',
+                        help='Do not title first levels with quarters and weeks')
+    parser.add_argument('--attachments', type=int, default=0, help='Number of image attachments')
+    parser.add_argument('--attachment-size', type=int, default=64 * 1024, help='Bytes per attachment')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def document_options(args) -> dict:
+    return {
+        'nodes': args.nodes,
+        'depth': args.depth,
+        'fanout': args.fanout,
+        'note_size': args.note_size,
+        'mix': args.mix.split(','),
+        'labels': args.labels,
+        'attachments': args.attachments,
+        'seed': args.seed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic MindNode file')
+    parser.add_argument('output', type=str, help='Path of the MindNode file to write')
+    add_arguments(parser)
+    args = parser.parse_args()
+    write_bundle(args.output, args.attachment_size, **document_options(args))
+
+
+if __name__ == '__main__':
+    main()
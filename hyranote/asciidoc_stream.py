@@ -0,0 +1,453 @@
+from html.entities import html5
+from html.parser import HTMLParser
+
+from hyranote.asciidoc_visitor import (AsciidocVisitor, TableState, cleanup_text, is_bold, render_break, render_code,
+                                       render_heading, render_image, render_link, render_list_item, render_listing,
+                                       render_minor_heading, render_paragraph, render_passthrough, render_quote,
+                                       render_rule, wrap_around)
+from hyranote.document import Element, visited_children
+from hyranote.logging import Logging
+from hyranote.visitor import get_dispatch_table, get_ignored_tags
+
+_ascii_spaces = str.maketrans('', '', ' \n\t\x0c\r')
+
+# attributes holding a list of values, for all elements and by element name
+_list_attributes = {
+    '*': {'class', 'accesskey', 'dropzone'},
+    'a': {'rel', 'rev'},
+    'link': {'rel', 'rev'},
+    'td': {'headers'},
+    'th': {'headers'},
+    'form': {'accept-charset'},
+    'object': {'archive'},
+    'area': {'rel'},
+    'icon': {'sizes'},
+    'iframe': {'sandbox'},
+    'output': {'for'},
+}
+
+
+class _Element(object):
+    """
+    State of an open html element, only kept until its end tag is seen
+    """
+    __slots__ = ('name', 'attrs', 'node', 'parent', 'visitor', 'parts', 'children', 'first_child')
+
+    def __init__(self, name, attrs, node, parent):
+        self.name = name
+        self.attrs = attrs
+        # collected element being converted, see `AsciidocStreamConverter`
+        self.node = node
+        # name of the parent element in the html tree
+        self.parent = parent
+        self.visitor = None
+        # converted content of children
+        self.parts = []
+        self.children = 0
+        self.first_child = None
+
+
+class AsciidocStreamConverter(HTMLParser):
+    """
+    Convert html to asciidoc from the event stream of `html.parser.HTMLParser`
+    without building a BeautifulSoup tree. Only open elements are kept on a
+    stack, the content of an element is converted as soon as its end tag is
+    seen and the element is discarded.
+
+    Blockquotes, figures and tables depend on content after their start tag:
+    the cite or figcaption they take out, the noscript a medium figure shows
+    and the markup of a table which is passed through. Such an element is
+    collected into a tree of `hyranote.document.Element` until its end tag,
+    then converted by walking the tree like `AsciidocVisitor` does.
+
+    The output is the same as `AsciidocVisitor` on a tree built by
+    BeautifulSoup's `html.parser` builder, so this class mimics the builder:
+    void elements are closed right away, unmatched end tags are ignored and
+    whitespace-only strings outside `pre` are collapsed.
+    """
+    version = f'{AsciidocVisitor.version}-stream'
+
+    void_elements = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+                     'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+                     'nextid', 'spacer'}
+    preserve_whitespace = {'pre', 'textarea'}
+    collected_elements = {'blockquote', 'figure', 'table'}
+
+    def __init__(self, logger: Logging):
+        self.logger = logger
+        self._tag_visitors = {tag: getattr(self, name) for tag, name in get_dispatch_table(type(self)).items()}
+        self._ignored = get_ignored_tags(type(self))
+        super(AsciidocStreamConverter, self).__init__(convert_charrefs=False)
+
+    def reset(self):
+        super(AsciidocStreamConverter, self).reset()
+        self._stack = [_Element(None, {}, None, None)]
+        self._text = []
+        self._lists = []
+        self._pre = 0
+        self._preserve = 0
+        self._tables = []
+        # innermost open element of the tree being collected
+        self._fragment = None
+        self._already_closed = []
+        self._result = None
+
+    def convert(self, text: str) -> str:
+        """
+        Convert html fragment @ref.text to asciidoc markup
+        """
+        self.reset()
+        self.feed(f'<div>{text}</div>')
+        self.close()
+        return self._result or ''
+
+    def close(self):
+        super(AsciidocStreamConverter, self).close()
+        self._flush_text()
+        if self._fragment is not None:
+            self._close_fragment(None)
+        while len(self._stack) > 1:
+            self._pop()
+
+    # event handlers of HTMLParser
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag in self.void_elements:
+            self._end(tag)
+            self._already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        self._end(tag)
+
+    def handle_endtag(self, tag):
+        if tag in self._already_closed:
+            self._already_closed.remove(tag)
+            return
+        self._end(tag)
+
+    def handle_data(self, data):
+        self._text.append(data)
+
+    def handle_entityref(self, name):
+        self._text.append(html5.get(f'{name};', f'&{name}'))
+
+    def handle_charref(self, name):
+        try:
+            if name[0] in 'xX':
+                code_point = int(name.lstrip('xX'), 16)
+            else:
+                code_point = int(name)
+        except ValueError:
+            code_point = None
+        data = None
+        if code_point is not None and code_point < 256:
+            try:
+                data = bytes([code_point]).decode('windows-1252')
+            except UnicodeDecodeError:
+                pass
+        if not data and code_point is not None:
+            try:
+                data = chr(code_point)
+            except (ValueError, OverflowError):
+                pass
+        self._text.append(data or '\N{REPLACEMENT CHARACTER}')
+
+    def handle_comment(self, data):
+        self._unknown_node('Comment', data)
+
+    def handle_decl(self, decl):
+        self._unknown_node('Doctype', decl[len('DOCTYPE '):])
+
+    def handle_pi(self, data):
+        self._unknown_node('ProcessingInstruction', data)
+
+    def unknown_decl(self, data):
+        if data.upper().startswith('CDATA['):
+            self._unknown_node('CData', data[len('CDATA['):])
+        else:
+            self._unknown_node('Declaration', data)
+
+    # html tree, built like the html.parser builder of BeautifulSoup
+
+    def _collapse(self, text: str) -> str:
+        if not self._preserve and not text.translate(_ascii_spaces):
+            return '\n' if '\n' in text else ' '
+        return text
+
+    def _flush_text(self):
+        if not self._text:
+            return
+        text = self._collapse(''.join(self._text))
+        self._text = []
+        if self._fragment is not None:
+            self._fragment.contents.append(text)
+        else:
+            self._add_text(text)
+
+    def _unknown_node(self, node_type, data):
+        self._flush_text()
+        self.logger.tally('UNKNOWN Node Type:', node_type)
+        if self._fragment is not None:
+            self._fragment.contents.append(Element(None, {}, self._fragment, (node_type, self._collapse(data))))
+        else:
+            self._add_child(node_type)
+
+    @staticmethod
+    def _attributes(tag, attrs) -> dict:
+        value = {k: '' if v is None else v for k, v in attrs}
+        lists = _list_attributes.get(tag)
+        for k, v in value.items():
+            if k in _list_attributes['*'] or lists is not None and k in lists:
+                value[k] = v.split()
+        return value
+
+    def _start(self, tag, attrs):
+        self._flush_text()
+        attrs = self._attributes(tag, attrs)
+        if tag in self.preserve_whitespace:
+            self._preserve += 1
+        if self._fragment is not None:
+            element = Element(tag, attrs, self._fragment)
+            self._fragment.contents.append(element)
+            self._fragment = element
+        elif tag in self.collected_elements:
+            self._fragment = Element(tag, attrs, None)
+        else:
+            self._push(tag, attrs, None)
+
+    def _end(self, tag):
+        self._flush_text()
+        element = self._fragment
+        while element is not None and element.name != tag:
+            element = element.parent
+        if element is not None:
+            self._close_fragment(element)
+            return
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].name == tag:
+                break
+        else:
+            # unmatched end tag
+            return
+        if self._fragment is not None:
+            self._close_fragment(None)
+        while len(self._stack) > i:
+            if self._stack[-1].name in self.preserve_whitespace:
+                self._preserve -= 1
+            self._pop()
+
+    def _close_fragment(self, last):
+        """
+        Close collected elements up to @ref.last, all of them when it is
+        `None`, and convert the tree once its root is closed
+        """
+        element = self._fragment
+        while True:
+            if element.name in self.preserve_whitespace:
+                self._preserve -= 1
+            if element is last or element.parent is None:
+                break
+            element = element.parent
+        self._fragment = element.parent
+        if self._fragment is None:
+            self._convert_fragment(element)
+
+    def _convert_fragment(self, root: Element):
+        # `None` closes the innermost element
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                self._pop()
+            elif type(node) is str:
+                self._add_text(node)
+            elif node.name is None:
+                self._add_child(node.extra[0])
+            else:
+                self._push(node.name, node.attrs, node)
+                stack.append(None)
+                if node.name not in self._ignored:
+                    stack.extend(reversed(visited_children(node)))
+
+    # element stack
+
+    def _add_child(self, name):
+        top = self._stack[-1]
+        top.children += 1
+        if top.children == 1:
+            top.first_child = name
+
+    def _add_text(self, text):
+        self._add_child(None)
+        self._stack[-1].parts.append(text)
+
+    def _push(self, tag, attrs, node):
+        top = self._stack[-1]
+        self._add_child(tag)
+        parent = top.name if node is None or node.parent is None else node.parent.name
+        element = _Element(tag, attrs, node, parent)
+        if tag == 'table':
+            self._tables.append(TableState())
+        elif tag in ('ul', 'ol'):
+            self._lists.append(tag)
+        elif tag == 'pre':
+            self._pre += 1
+        element.visitor = self._tag_visitors.get(tag)
+        if element.visitor is None:
+            self.logger.tally('Cannot get visit method:', f'visit_tag_{tag}')
+        self._stack.append(element)
+
+    def _pop(self):
+        element = self._stack.pop()
+        tag = element.name
+        text = ''.join(element.parts)
+        if tag in ('ul', 'ol'):
+            self._lists.pop()
+
+        value = element.visitor(element, text) if element.visitor is not None else text
+        if tag == 'pre':
+            self._pre -= 1
+
+        parent = self._stack[-1]
+        if parent.name is None:
+            if self._result is None:
+                self._result = value
+            return
+        parent.parts.append(value)
+
+    # conversion of closed elements, see `AsciidocVisitor` for the tree version
+
+    def visit_tag_fall_through(self, element, text):
+        return text
+
+    def visit_tag_ignore_content(self, element, text):
+        return ''
+
+    def visit_tag_span(self, element, text):
+        if is_bold(element.attrs.get('style', '')):
+            return self.visit_tag_strong(element, text)
+        return text
+
+    visit_tag_section = visit_tag_fall_through
+    visit_tag_input = visit_tag_fall_through
+
+    visit_tag_iframe = visit_tag_ignore_content
+    visit_tag_style = visit_tag_ignore_content
+    visit_tag_svg = visit_tag_ignore_content
+    visit_tag_button = visit_tag_ignore_content
+    visit_tag_form = visit_tag_ignore_content
+    visit_tag_script = visit_tag_ignore_content
+    visit_tag_template = visit_tag_ignore_content
+
+    def visit_tag_a(self, element, text):
+        return render_link(element.attrs.get('href', ''), text,
+                           element.children == 1 and element.first_child == 'img')
+
+    def visit_tag_p(self, element, text):
+        return render_paragraph(text)
+
+    visit_tag_article = visit_tag_p
+    visit_tag_div = visit_tag_p
+
+    def visit_heading_node(level):
+        def visitor(self, element, text):
+            return render_heading(level, text)
+
+        return visitor
+
+    visit_tag_h1 = visit_heading_node(2)
+    visit_tag_h2 = visit_heading_node(2)
+    visit_tag_h3 = visit_heading_node(3)
+    visit_tag_h4 = visit_heading_node(4)
+
+    def visit_tag_h5(self, element, text):
+        return render_minor_heading(text)
+    visit_tag_h6 = visit_tag_h5
+
+    def visit_tag_strong(self, element, text):
+        return wrap_around(text, '**')
+
+    visit_tag_b = visit_tag_strong
+
+    def visit_tag_em(self, element, text):
+        return wrap_around(text, '__')
+
+    visit_tag_i = visit_tag_em
+
+    def visit_tag_blockquote(self, element, text):
+        return render_quote(text, element.node.extra)
+
+    def visit_tag_hr(self, element, text):
+        return render_rule()
+
+    def visit_tag_br(self, element, text):
+        return render_break(text, self._pre > 0)
+
+    def visit_tag_ol(self, element, text):
+        return render_paragraph(text)
+
+    visit_tag_ul = visit_tag_ol
+
+    def visit_tag_li(self, element, text):
+        return render_list_item(self._lists, text)
+
+    def visit_tag_figure(self, element, text):
+        return render_paragraph(text)
+
+    def visit_tag_img(self, element, text):
+        return render_image(element.attrs.get('src'), element.attrs.get('alt', ''))
+
+    def visit_tag_pre(self, element, text):
+        return render_listing(text)
+
+    def visit_tag_code(self, element, text):
+        return render_code(text, element.attrs.get('class', []))
+
+    def visit_tag_table(self, element, text):
+        table = self._tables.pop()
+        if self._tables:
+            # nested tables are only kept by passing the outer table through
+            self._tables[-1].passthrough = True
+        if text.strip():
+            table.passthrough = True
+        value = table.render()
+        if value is not None:
+            return value
+        if self._tables:
+            # already part of the markup of the outer table
+            return ''
+        return render_passthrough(element.node.prettify())
+
+    # elements are popped before their visitor is called, the top of the
+    # stack is the element converting their content
+
+    def visit_tag_tr(self, element, text):
+        if not self._tables:
+            return text
+        self._tables[-1].end_row(text, element.parent == 'thead')
+        return ''
+
+    def visit_tag_td(self, element, text):
+        if not self._tables:
+            return text
+        table = self._tables[-1]
+        if element.parent != 'tr':
+            table.passthrough = True
+        table.add_cell(text, element.name == 'th', element.attrs.get('colspan'), element.attrs.get('rowspan'))
+        return ''
+
+    visit_tag_th = visit_tag_td
+
+    def visit_tag_caption(self, element, text):
+        if not self._tables:
+            return text
+        self._tables[-1].caption = cleanup_text(text)
+        return ''
+
+    visit_tag_thead = visit_tag_fall_through
+    visit_tag_tbody = visit_tag_fall_through
+    visit_tag_tfoot = visit_tag_fall_through
+    visit_tag_colgroup = visit_tag_ignore_content
+    visit_tag_col = visit_tag_ignore_content
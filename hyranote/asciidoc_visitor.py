@@ -1,18 +1,357 @@
 import re
 
-from bs4 import Tag
+from bs4 import CData, Tag
+
+from .visitor import NodeVisitor, is_text
+
+_trivial_span_re = re.compile(r'<span(?:\s+style="([^"<>]*)")?>([^<]*)</span>')
+_html_entity_re = re.compile(r'&(?:amp|lt|gt|quot|#39|nbsp);')
+_newline_re = re.compile(r'\n\s*')
+# lines of a table cell which need the cell to be parsed as asciidoc blocks
+_table_block_re = re.compile(r"^(?:[*.]+ |\[|\.{4}|-{4}|_{4}|\+{4}|=+ |''')", re.M)
+_html_entities = {
+    '&amp;': '&',
+    '&lt;': '<',
+    '&gt;': '>',
+    '&quot;': '"',
+    '&#39;': "'",
+    '&nbsp;': '\xa0',
+}
+# elements whose content is not part of the text of their ancestors
+_hidden_text = {'script', 'style', 'template'}
+
+
+def convert_plain_fragment(text: str):
+    """
+    Fast path of `AsciidocVisitor` for html fragments without markup or with
+    only a single non-bold `<span>`, which covers most MindNode titles.
+    Return `None` when the fragment needs to be parsed by the html parser.
+    """
+    if '<' in text:
+        m = _trivial_span_re.fullmatch(text)
+        if m is None or 'bold' in (m.group(1) or ''):
+            return None
+        text = m.group(2)
+    if '&' in text:
+        if '&' in _html_entity_re.sub('', text):
+            return None
+        text = _html_entity_re.sub(lambda m: _html_entities[m.group(0)], text)
+    return text.strip()
+
+
+def node_text(node) -> str:
+    """
+    Return text of the html element @ref.node, a bs4 `Tag` or an `Element` of
+    `hyranote.document`, like `Tag.text` of recent bs4 versions: without
+    comments and content of script, style and template elements
+    """
+    parts = []
+    stack = [node]
+    while stack:
+        x = stack.pop()
+        if isinstance(x, str):
+            if type(x) is str or is_text(x):
+                parts.append(x)
+            elif type(x) is CData:
+                parts.append(str(x))
+        elif x.name is None:
+            # comments and other nodes of the document model
+            if x.extra[0] == 'CData':
+                parts.append(x.extra[1])
+        elif x is node or x.name not in _hidden_text:
+            stack.extend(reversed(x.contents))
+    return ''.join(parts)
+
+
+# output rules of the html elements, shared by `AsciidocVisitor` and the
+# streaming converter of `hyranote.asciidoc_stream` which only differ in how
+# they walk the html
+
+def cleanup_text(text: str) -> str:
+    text = text.strip()
+    text = _newline_re.sub(' ', text)
+    return text
+
+
+def wrap_around(text: str, w: str) -> str:
+    if not text:
+        return ''
+    new_text = text.strip()
+    if not new_text:
+        return ''
+    begin, t, end = text.partition(new_text)
+    return f'{begin}{w}{t}{w}{end}'
+
+
+def is_bold(style: str) -> bool:
+    """
+    Tell whether the inline @ref.style of an element sets a bold font
+    """
+    for kv in style.split(';'):
+        kvx = kv.strip().split(':')
+        if len(kvx) <= 1:
+            continue
+        k = kvx[0].strip()
+        v = kvx[1].strip()
+        if k not in ['font', 'font-weight']:
+            continue
+        if 'bold' in v:
+            return True
+    return False
+
+
+def render_link(href: str, text: str, only_image: bool) -> str:
+    """
+    Return the link of an anchor, @ref.only_image tells whether its only
+    child is an image
+    """
+    if not text:
+        return ''
+    if not href.startswith(('http://', 'https://')):
+        return text
+    if only_image:
+        # anchor around image, should ignore the anchor
+        return text
+
+    return f'link:{href}[{text}]'
+
+
+def render_paragraph(text: str) -> str:
+    return f'{text}\n\n'
+
+
+def render_heading(level: int, text: str) -> str:
+    text = cleanup_text(text)
+    if not text:
+        # empty heading
+        return '\n\n'
+
+    return f'\n{"=" * (level + 1)} {text}\n\n'
+
+
+def render_minor_heading(text: str) -> str:
+    text = cleanup_text(text)
+    if not text:
+        # empty heading
+        return '\n\n'
+
+    return f'\n\n**{text}**\n\n'
+
+
+def render_quote(text: str, cite) -> str:
+    if cite is None:
+        return f'[quote]\n____\n{text}\n____\n\n'
+    else:
+        return f'[quote, {cite}]\n____\n{text}\n____\n\n'
+
+
+def render_rule() -> str:
+    return "\n'''\n\n"
+
+
+def render_break(text: str, pre: bool) -> str:
+    if not pre:
+        return f"\n\n{text}"
+    else:
+        return f"\n{text}"
+
 
-from .visitor import NodeVisitor
+def render_list_item(lists: list, text: str) -> str:
+    """
+    Return the item of the innermost list of @ref.lists, the types of the
+    enclosing lists
+    """
+    if not text:
+        return ''
+
+    if len(lists) == 0:
+        # something wrong, ignore data
+        return ''
+    last = lists[-1]
+    if last == 'ul':
+        sep = '*'
+    else:
+        sep = '.'
+    return f'{sep*len(lists)} {text}\n'
+
+
+def render_image(src, alt: str) -> str:
+    if src is None:
+        return ''
+
+    return f'image:{src}[{alt}]'
+
+
+def render_listing(text: str) -> str:
+    return f'''[listing]
+....
+{text}
+....
+
+'''
+
+
+def render_code(text: str, classes: list) -> str:
+    """
+    Return inline or multiline code, the first of @ref.classes names the
+    language
+    """
+    if '\n' in text:
+        # multiline code
+        lang = (classes or ['text'])[0]
+        lang = lang.replace('language-', '')
+        ascii_content = f'''[source, {lang}]
+----
+{text}
+----
+'''
+        return ascii_content
+    else:
+        # inline
+        return f'`{text}`'
+
+
+def render_passthrough(html: str) -> str:
+    return f'++++\n{html}\n++++\n\n'
+
+
+def _span(value) -> int:
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+class TableState(object):
+    """
+    Rows of an html table being converted. Cells are added as soon as their
+    content is converted and `render` builds the asciidoc table once the end
+    of the table is reached.
+    """
+    __slots__ = ('rows', 'cells', 'header', 'caption', 'passthrough')
+
+    def __init__(self):
+        self.rows = []
+        # cells of the current row
+        self.cells = []
+        self.header = False
+        self.caption = None
+        # set when the table can't be represented as an asciidoc table
+        self.passthrough = False
+
+    def add_cell(self, text: str, header: bool, colspan, rowspan):
+        self.cells.append((text, header, _span(colspan), _span(rowspan)))
+
+    def end_row(self, text: str, head: bool):
+        """
+        End the current row, @ref.text is content of the row outside of cells
+        and @ref.head tells whether the row is part of `thead`
+        """
+        cells = self.cells
+        self.cells = []
+        if not cells or text.strip():
+            self.passthrough = True
+        if not self.rows:
+            self.header = head or all(x[1] for x in cells)
+        self.rows.append(cells)
+
+    def columns(self):
+        """
+        Return the number of columns, `None` when the table can't be
+        represented, e.g. rows don't fill the same columns once cells
+        spanning several rows or columns are placed
+        """
+        if self.passthrough or self.cells or not self.rows:
+            return None
+        # rows left of cells covering each column, including the current row
+        spans = []
+        width = None
+        for cells in self.rows:
+            column = 0
+            for _, _, colspan, rowspan in cells:
+                while column < len(spans) and spans[column]:
+                    column += 1
+                end = column + colspan
+                if end > len(spans):
+                    spans.extend([0] * (end - len(spans)))
+                for i in range(column, end):
+                    if spans[i]:
+                        return None
+                    spans[i] = rowspan
+                column = end
+            if width is None:
+                width = len(spans)
+            if len(spans) != width or not all(spans):
+                return None
+            spans = [x - 1 for x in spans]
+        if any(spans):
+            return None
+        return width
+
+    def render(self):
+        """
+        Return the asciidoc table, `None` when it can't be represented
+        """
+        width = self.columns()
+        if width is None:
+            return None
+        lines = []
+        if self.caption:
+            lines.append(f'.{self.caption}')
+        options = ', options="header"' if self.header else ''
+        lines.append(f'[cols="{width}*"{options}]')
+        lines.append('|===')
+        for cells in self.rows:
+            lines.append(' '.join(self._render_cell(*x) for x in cells))
+        lines.append('|===')
+        return '\n'.join(lines) + '\n\n'
+
+    @staticmethod
+    def _render_cell(text, header, colspan, rowspan):
+        spec = ''
+        if colspan > 1:
+            spec = str(colspan)
+        if rowspan > 1:
+            spec = f'{spec}.{rowspan}'
+        if spec:
+            spec += '+'
+        text = text.strip().replace('|', '\\|')
+        if _table_block_re.search(text):
+            spec += 'a'
+        return f'{spec}|{text}'
+
+
+class RenderContext(object):
+    """
+    State of one `AsciidocVisitor.visit` call which depends on the ancestors
+    of the visited node: types of the enclosing lists, innermost last, the
+    number of enclosing `pre` elements and the innermost table. Handlers
+    update it before visiting their children and restore it afterwards.
+    """
+    __slots__ = ('lists', 'pre', 'table')
+
+    def __init__(self):
+        self.lists = []
+        self.pre = 0
+        self.table = None
 
 
 class AsciidocVisitor(NodeVisitor):
+    # bump whenever the generated markup changes, it invalidates cached conversions
+    version = '3'
+
+    def __init__(self, logger):
+        super(AsciidocVisitor, self).__init__(logger)
+        self.context = RenderContext()
+
+    def visit(self, node):
+        self.context = RenderContext()
+        return super(AsciidocVisitor, self).visit(node)
+
     def text_cleanup(self, text: str) -> str:
-        text = text.strip()
-        rex = re.compile(r'\n\s*')
-        text = re.sub(rex, ' ', text)
-        return text
+        return cleanup_text(text)
 
-    def visit_TagHeading(self, node, level, text, *args, **kwargs):
+    def visit_TagHeading(self, node, level, text):
         text = self.text_cleanup(text)
         if not text:
             # empty heading
@@ -20,25 +359,16 @@ class AsciidocVisitor(NodeVisitor):
 
         return f'{"="*(level+1)} {text}\n\n'
 
-    def visit_tag_fall_through(self, node, *args, **kwargs):
-        return self.generic_visit(node, *args, **kwargs)
+    def visit_tag_fall_through(self, node):
+        return (yield from self.generic_visit(node))
 
-    def visit_tag_ignore_content(self, node, *args, **kwargs):
+    def visit_tag_ignore_content(self, node):
         return ''
 
-    def visit_tag_span(self, node, *args, **kwargs):
-        styles = node.get('style', '').split(';')
-        for kv in styles:
-            kvx = kv.strip().split(':')
-            if len(kvx) <= 1:
-                continue
-            k = kvx[0].strip()
-            v = kvx[1].strip()
-            if k not in ['font', 'font-weight']:
-                continue
-            if 'bold' in v:
-                return self.visit_tag_strong(node, *args, **kwargs)
-        return self.generic_visit(node, *args, **kwargs)
+    def visit_tag_span(self, node):
+        if is_bold(node.get('style', '')):
+            return (yield from self.visit_tag_strong(node))
+        return (yield from self.generic_visit(node))
 
     visit_tag_section = visit_tag_fall_through
     visit_tag_input = visit_tag_fall_through
@@ -51,41 +381,40 @@ class AsciidocVisitor(NodeVisitor):
     visit_tag_button = visit_tag_ignore_content
     visit_tag_form = visit_tag_ignore_content
     visit_tag_script = visit_tag_ignore_content
-
-    def visit_tag_a(self, node, *args, **kwargs):
-        href = node.get('href', '')
-        # kwargs['href'] = href
-        text = self.generic_visit(node, *args, **kwargs)
-        # del kwargs['href']
-        if not text:
-            return ''
-        m = re.match(r'https?://', href)
-        if m is None:
-            return text
-        if len(node.contents) == 1:
-            child = node.contents[0]
-            if type(child) is Tag and child.name == 'img':
-                # anchor around image, should ignore the anchor
-                return text
-
-        return f'link:{href}[{text}]'
-
-    def visit_tag_p(self, node, *args, **kwargs):
-        text = self.generic_visit(node, *args, **kwargs)
-        return f'{text}\n\n'
+    # inert markup, not displayed
+    visit_tag_template = visit_tag_ignore_content
+
+    def visit_tag_a(self, node):
+        text = yield from self.generic_visit(node)
+        return render_link(node.get('href', ''), text,
+                           len(node.contents) == 1 and self.is_tag(node.contents[0], 'img'))
+
+    @staticmethod
+    def is_tag(node, name: str) -> bool:
+        return type(node) is Tag and node.name == name
+
+    def extract_child(self, node, name: str):
+        """
+        Take the first descendant element @ref.name out of @ref.node, return
+        its text or `None` when there is none
+        """
+        child = node.find(name)
+        if child is None:
+            return None
+        child.extract()
+        return node_text(child)
+
+    def visit_tag_p(self, node):
+        text = yield from self.generic_visit(node)
+        return render_paragraph(text)
 
     visit_tag_article = visit_tag_p
     visit_tag_div = visit_tag_p
 
     def visit_heading_node(level):
-        def visitor(self, node, *args, **kwargs):
-            text = self.generic_visit(node, *args, **kwargs)
-            text = self.text_cleanup(text)
-            if not text:
-                # empty heading
-                return '\n\n'
-
-            return f'\n{"=" * (level + 1)} {text}\n\n'
+        def visitor(self, node):
+            text = yield from self.generic_visit(node)
+            return render_heading(level, text)
 
         return visitor
 
@@ -94,152 +423,137 @@ class AsciidocVisitor(NodeVisitor):
     visit_tag_h3 = visit_heading_node(3)
     visit_tag_h4 = visit_heading_node(4)
 
-    def visit_tag_h5(self, node, *args, **kwargs):
-        text = self.generic_visit(node, *args, **kwargs)
-        text = self.text_cleanup(text)
-        if not text:
-            # empty heading
-            return '\n\n'
-
-        return f'\n\n**{text}**\n\n'
+    def visit_tag_h5(self, node):
+        text = yield from self.generic_visit(node)
+        return render_minor_heading(text)
     visit_tag_h6 = visit_tag_h5
 
-    def visit_tag_strong(self, node, *args, **kwargs):
-        text = self.generic_visit(node, *args, **kwargs)
+    def visit_tag_strong(self, node):
+        text = yield from self.generic_visit(node)
         return self.tag_wrap_around(text, '**')
 
     visit_tag_b = visit_tag_strong
 
-    def visit_tag_em(self, node, *args, **kwargs):
-        text = self.generic_visit(node, *args, **kwargs)
+    def visit_tag_em(self, node):
+        text = yield from self.generic_visit(node)
         return self.tag_wrap_around(text, '__')
 
     visit_tag_i = visit_tag_em
 
     def tag_wrap_around(self, text, w):
-        if not text:
-            return ''
-        new_text = text.strip()
-        if not new_text:
-            return ''
-        begin, t, end = text.partition(new_text)
-        return f'{begin}{w}{t}{w}{end}'
-
-    def visit_tag_blockquote(self, node, *args, **kwargs):
-        cite_node = node.find('cite')
-        cite = None
-        if cite_node is not None:
-            cite_node.extract()
-            cite = cite_node.text
-        text = self.generic_visit(node, *args, **kwargs)
-        if cite is None:
-            return f'[quote]\n____\n{text}\n____\n\n'
-        else:
-            return f'[quote, {cite}]\n____\n{text}\n____\n\n'
+        return wrap_around(text, w)
+
+    def visit_tag_blockquote(self, node):
+        cite = self.extract_child(node, 'cite')
+        text = yield from self.generic_visit(node)
+        return render_quote(text, cite)
 
-    def visit_tag_hr(self, node, *args, **kwargs):
-        return "\n'''\n\n"
+    def visit_tag_hr(self, node):
+        return render_rule()
 
-    def visit_tag_br(self, node, *args, **kwargs):
-        pre = kwargs.get('pre')
+    def visit_tag_br(self, node):
+        pre = self.context.pre
         if len(node.contents) > 0:
-            text = self.generic_visit(node, *args, **kwargs)
+            text = yield from self.generic_visit(node)
         else:
             text = ''
+        return render_break(text, pre > 0)
 
-        if not pre:
-            return f"\n\n{text}"
-        else:
-            return f"\n{text}"
-
-    def visit_tag_ol(self, node, *args, **kwargs):
-        return self.wrapper_list(node, 'ol', *args, **kwargs)
-
-    def visit_tag_ul(self, node, *args, **kwargs):
-        return self.wrapper_list(node, 'ul', *args, **kwargs)
-
-    def wrapper_list(self, node, list_type, *args, **kwargs):
-        indent = kwargs.get('indent', 0)
-        indent = indent + 1
-        indent_stack = kwargs.get('indent_stack', [])
-        indent_stack.append(list_type)
-        kwargs['indent'] = indent
-        kwargs['indent_stack'] = indent_stack
-        text = self.generic_visit(node, *args, **kwargs)
-        indent = indent - 1
-        indent_stack.pop()
-        kwargs['indent'] = indent
-        kwargs['indent_stack'] = indent_stack
-        return f'{text}\n\n'
-
-    def visit_tag_li(self, node, *args, **kwargs):
-        text = self.generic_visit(node, *args, **kwargs)
-        if not text:
-            return ''
-
-        indent = kwargs.get('indent', 1)
-        indent_stack = kwargs.get('indent_stack', [])
-        if len(indent_stack) == 0:
-            # something wrong, ignore data
-            return ''
-        last = indent_stack[-1]
-        if last == 'ul':
-            sep = '*'
-        else:
-            sep = '.'
-        return f'{sep*indent} {text}\n'
-
-    def visit_tag_figure(self, node, *args, **kwargs):
-        caption_node = node.find('figcaption')
-        if caption_node is not None:
-            kwargs['caption'] = caption_node.text
-            caption_node.extract()
+    def visit_tag_ol(self, node):
+        return self.wrapper_list(node, 'ol')
+
+    def visit_tag_ul(self, node):
+        return self.wrapper_list(node, 'ul')
+
+    def wrapper_list(self, node, list_type):
+        lists = self.context.lists
+        lists.append(list_type)
+        try:
+            text = yield from self.generic_visit(node)
+        finally:
+            lists.pop()
+        return render_paragraph(text)
+
+    def visit_tag_li(self, node):
+        text = yield from self.generic_visit(node)
+        return render_list_item(self.context.lists, text)
+
+    def visit_tag_figure(self, node):
+        self.extract_child(node, 'figcaption')
         # specialized for medium
         node_to_visit = node
         if 'paragraph-image' in node.get('class', []):
             noscript = node.find('noscript')
             if noscript is not None:
                 node_to_visit = noscript
-        text = self.generic_visit(node_to_visit, *args, **kwargs)
-        if caption_node is not None:
-            del kwargs['caption']
-        return f'{text}\n\n'
-
-    def visit_tag_img(self, node, *args, **kwargs):
-        alt = node.get('alt', '')
-        src = node.get('src')
-        if src is None:
-            return ''
-
-        return f'image:{src}[{alt}]'
-
-    def visit_tag_pre(self, node, *args, **kwargs):
-        kwargs['pre'] = True
-        text = self.generic_visit(node, *args, **kwargs)
-        del kwargs['pre']
-        return f'''[listing]
-....
-{text}
-....
+        text = yield from self.generic_visit(node_to_visit)
+        return render_paragraph(text)
+
+    def visit_tag_img(self, node):
+        return render_image(node.get('src'), node.get('alt', ''))
+
+    def visit_tag_pre(self, node):
+        self.context.pre += 1
+        try:
+            text = yield from self.generic_visit(node)
+        finally:
+            self.context.pre -= 1
+        return render_listing(text)
+
+    def visit_tag_code(self, node):
+        text = yield from self.generic_visit(node)
+        return render_code(text, node.get('class', []))
+
+    def visit_tag_table(self, node):
+        outer = self.context.table
+        table = self.context.table = TableState()
+        try:
+            text = yield from self.generic_visit(node)
+        finally:
+            self.context.table = outer
+        if outer is not None:
+            # nested tables are only kept by passing the outer table through
+            outer.passthrough = True
+        if text.strip():
+            table.passthrough = True
+        return self.render_table(node, table)
+
+    def render_table(self, node, table: TableState) -> str:
+        value = table.render()
+        if value is None:
+            return render_passthrough(node.prettify())
+        return value
+
+    def visit_tag_tr(self, node):
+        text = yield from self.generic_visit(node)
+        table = self.context.table
+        if table is None:
+            return text
+        table.end_row(text, node.parent.name == 'thead')
+        return ''
 
-'''
+    def visit_tag_td(self, node):
+        text = yield from self.generic_visit(node)
+        table = self.context.table
+        if table is None:
+            return text
+        if node.parent.name != 'tr':
+            table.passthrough = True
+        table.add_cell(text, node.name == 'th', node.get('colspan'), node.get('rowspan'))
+        return ''
 
-    def visit_tag_code(self, node, *args, **kwargs):
-        text = self.generic_visit(node, *args, **kwargs)
-        if '\n' in text:
-            # multiline code
-            lang = node.get('class', ['text'])
-            lang = lang[0]
-            lang = lang.replace('language-', '')
-            ascii_content = f'''[source, {lang}]
-----
-{text}
-----
-'''
-            return ascii_content
-        else:
-            # inline
-            return f'`{text}`'
+    visit_tag_th = visit_tag_td
+
+    def visit_tag_caption(self, node):
+        text = yield from self.generic_visit(node)
+        table = self.context.table
+        if table is None:
+            return text
+        table.caption = self.text_cleanup(text)
+        return ''
 
-    def visit_tag_table(self, node, *args, **kwargs):
-        return f'++++\n{node.prettify()}\n++++\n\n'
+    visit_tag_thead = visit_tag_fall_through
+    visit_tag_tbody = visit_tag_fall_through
+    visit_tag_tfoot = visit_tag_fall_through
+    visit_tag_colgroup = visit_tag_ignore_content
+    visit_tag_col = visit_tag_ignore_content
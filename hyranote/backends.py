@@ -0,0 +1,362 @@
+"""
+Backends render blocks of the document model of `hyranote.document` to an
+output format. Fragments are walked with the asciidoc visitor functions,
+other formats override the markup they produce.
+"""
+import re
+
+from hyranote.asciidoc_visitor import AsciidocVisitor, TableState
+from hyranote.document import HEADING, IMAGE, Element
+
+# lines of a table cell which can't be represented in a markdown table
+_markdown_block_re = re.compile(r'^(?:[-*+] |\d+\. |```|> |#+ )', re.M)
+
+
+def _indent(text: str, prefix: str) -> str:
+    return ''.join(f'{prefix}{x}' if x.strip() else x for x in text.splitlines(True))
+
+
+class FragmentVisitor(object):
+    """
+    Mixin of html visitors walking fragments of the document model instead
+    of BeautifulSoup trees
+    """
+
+    def get_visitor(self, node):
+        if type(node) is str:
+            return self.visit_text
+        if node.name is None:
+            # reported when the fragment was built
+            return self.visit_tag_ignore_content
+        value = self._tag_visitors.get(node.name)
+        if value is None:
+            self.logger.tally('Cannot get visit method:', f'visit_tag_{node.name}')
+        return value
+
+    def visit_text(self, node):
+        return node
+
+    @staticmethod
+    def is_tag(node, name: str) -> bool:
+        return type(node) is Element and node.name == name
+
+    def extract_child(self, node, name: str):
+        # cite of blockquote and figcaption of figure, already taken out
+        return node.extra
+
+    def render(self, fragment) -> str:
+        """
+        Return markup of @ref.fragment, plain strings are returned as they are
+        """
+        if type(fragment) is str:
+            return fragment
+        return self.visit(fragment).strip()
+
+    @staticmethod
+    def task_marker(task: int) -> str:
+        if task == 1:
+            return '[ ] '
+        if task == 2:
+            return '[x] '
+        return ''
+
+
+class AsciidocBackend(FragmentVisitor, AsciidocVisitor):
+    name = 'adoc'
+    extension = '.asciidoc'
+
+    def render_header(self, title: str, author: str, date: str, levels: int) -> str:
+        metadata = f''':toc:
+:toclevels: {levels}
+:imagesdir: images
+:numbered:'''
+        if date is not None:
+            metadata = f'{date}\n{metadata}\n'
+        return f'''= {title}
+{author}
+{metadata}
+'''
+
+    def render_block(self, block) -> str:
+        title = self.render(block.title)
+        note = self.render(block.note)
+        if len(note) > 0:
+            note = note + '\n\n'
+        if block.kind == HEADING:
+            return f"\n{'=' * block.level} {title}\n\n{note}"
+        if block.kind == IMAGE:
+            return self._render_image_block(block.attachment, title)
+        return f"{'*' * block.level} {self.task_marker(block.task)}{title}\n{note}"
+
+    def _render_image_block(self, image_content, title):
+        title = title.strip()
+        if not title:
+            return f'''+
+image::{image_content}[pdfwidth=85%]
+'''
+        else:
+            return f'''+
+.{title.strip()}
+image::{image_content}[alt={title.strip()}, pdfwidth=85%]
+'''
+
+
+class MarkdownBackend(AsciidocBackend):
+    name = 'md'
+    extension = '.md'
+
+    def render_header(self, title: str, author: str, date: str, levels: int) -> str:
+        details = ''.join(f'{x}\n' for x in (author, date) if x)
+        return f'# {title}\n\n{details}\n' if details else f'# {title}\n\n'
+
+    # mind map items are nested at the content column of their parent, with
+    # another bullet than lists of notes so that both never merge
+    bullet = '*'
+
+    @staticmethod
+    def item_indent(level: int) -> str:
+        return '  ' * (level - 1)
+
+    @staticmethod
+    def content_indent(level: int) -> str:
+        """
+        Indent of blocks continuing the list item of depth @ref.level, none
+        below headings
+        """
+        return '  ' * level
+
+    def render_block(self, block) -> str:
+        title = self.render(block.title)
+        note = self.render(block.note)
+        if block.kind == HEADING:
+            if len(note) > 0:
+                note = note + '\n\n'
+            return f"\n{'#' * block.level} {title}\n\n{note}"
+        if block.kind == IMAGE:
+            # continues the list item of the parent node
+            return f'\n{self.content_indent(block.level - 1)}![{title.strip()}](images/{block.attachment})\n\n'
+        if len(note) > 0:
+            # a paragraph of the item, after a blank line at its content column
+            note = '\n' + _indent(note, self.content_indent(block.level)) + '\n\n'
+        return f"{self.item_indent(block.level)}{self.bullet} {self.task_marker(block.task)}{title}\n{note}"
+
+    def visit_tag_a(self, node):
+        href = node.get('href', '')
+        text = yield from self.generic_visit(node)
+        if not text:
+            return ''
+        if not href.startswith(('http://', 'https://')):
+            return text
+        if len(node.contents) == 1 and self.is_tag(node.contents[0], 'img'):
+            return text
+        return f'[{text}]({href})'
+
+    def visit_heading_node(level):
+        def visitor(self, node):
+            text = yield from self.generic_visit(node)
+            text = self.text_cleanup(text)
+            if not text:
+                return '\n\n'
+            return f'\n{"#" * (level + 1)} {text}\n\n'
+
+        return visitor
+
+    visit_tag_h1 = visit_heading_node(2)
+    visit_tag_h2 = visit_heading_node(2)
+    visit_tag_h3 = visit_heading_node(3)
+    visit_tag_h4 = visit_heading_node(4)
+
+    def visit_tag_em(self, node):
+        text = yield from self.generic_visit(node)
+        return self.tag_wrap_around(text, '_')
+
+    visit_tag_i = visit_tag_em
+
+    def visit_tag_blockquote(self, node):
+        cite = self.extract_child(node, 'cite')
+        text = yield from self.generic_visit(node)
+        lines = text.strip().split('\n')
+        if cite is not None:
+            lines += ['', f'-- {cite}']
+        return ''.join(f'> {x}\n' if x else '>\n' for x in lines) + '\n'
+
+    def visit_tag_hr(self, node):
+        return '\n---\n\n'
+
+    def visit_tag_br(self, node):
+        text = yield from self.generic_visit(node)
+        if self.context.pre:
+            return f'\n{text}'
+        if self.context.lists:
+            # line break within the list item
+            return f'  \n{"    " * len(self.context.lists)}{text}'
+        return f'\n\n{text}'
+
+    def wrapper_list(self, node, list_type):
+        text = yield from super(MarkdownBackend, self).wrapper_list(node, list_type)
+        if self.context.lists:
+            # nested list starts on its own line below the item's text
+            return f'\n{text}'
+        return text
+
+    def visit_tag_li(self, node):
+        text = yield from self.generic_visit(node)
+        text = text.strip()
+        if not text:
+            return ''
+        lists = self.context.lists
+        if len(lists) == 0:
+            # something wrong, ignore data
+            return ''
+        sep = '-' if lists[-1] == 'ul' else '1.'
+        return f'{"    " * (len(lists) - 1)}{sep} {text}\n'
+
+    def visit_tag_img(self, node):
+        src = node.get('src')
+        if src is None:
+            return ''
+        return f'![{node.get("alt", "")}]({src})'
+
+    def visit_tag_pre(self, node):
+        self.context.pre += 1
+        try:
+            text = yield from self.generic_visit(node)
+        finally:
+            self.context.pre -= 1
+        if text.startswith('```'):
+            # code block of a multiline code element
+            return f'{text}\n'
+        return f'```\n{text}\n```\n\n'
+
+    def visit_tag_code(self, node):
+        text = yield from self.generic_visit(node)
+        if '\n' in text:
+            lang = node.get('class', ['text'])[0].replace('language-', '')
+            return f'```{lang}\n{text}\n```\n'
+        return f'`{text}`'
+
+    def render_table(self, node, table: TableState) -> str:
+        width = table.columns()
+        cells = [[x[0].strip() for x in row] for row in table.rows]
+        if width is None or any(x[2] > 1 or x[3] > 1 for row in table.rows for x in row) or \
+                any(_markdown_block_re.search(x) for row in cells for x in row):
+            # tables with spans or blocks in cells are kept as html
+            return f'{node.prettify()}\n\n'
+        if not table.header:
+            cells.insert(0, [''] * width)
+        lines = [f'**{table.caption}**\n'] if table.caption else []
+        for i, row in enumerate(cells):
+            lines.append('| ' + ' | '.join(x.replace('|', '\\|').replace('\n', '<br>') for x in row) + ' |')
+            if i == 0:
+                lines.append('|' + ' --- |' * width)
+        return '\n'.join(lines) + '\n\n'
+
+
+class TextBackend(MarkdownBackend):
+    name = 'txt'
+    extension = '.txt'
+    bullet = '-'
+
+    @staticmethod
+    def item_indent(level: int) -> str:
+        return '    ' * (level - 1)
+
+    @classmethod
+    def content_indent(cls, level: int) -> str:
+        return f'{cls.item_indent(level)}  ' if level > 0 else ''
+
+    def render_header(self, title: str, author: str, date: str, levels: int) -> str:
+        details = ''.join(f'{x}\n' for x in (author, date) if x)
+        return f'{title}\n{"=" * len(title)}\n{details}\n'
+
+    def render_block(self, block) -> str:
+        title = self.render(block.title)
+        note = self.render(block.note)
+        if block.kind == HEADING:
+            if len(note) > 0:
+                note = note + '\n\n'
+            return f'\n{title}\n{"-" * len(title)}\n\n{note}'
+        if block.kind == IMAGE:
+            title = title.strip()
+            return f'{self.content_indent(block.level - 1)}[image {block.attachment}]{" " + title if title else ""}\n'
+        if len(note) > 0:
+            note = '\n' + _indent(note, self.content_indent(block.level)) + '\n\n'
+        return f"{self.item_indent(block.level)}{self.bullet} {self.task_marker(block.task)}{title}\n{note}"
+
+    def visit_tag_a(self, node):
+        href = node.get('href', '')
+        text = yield from self.generic_visit(node)
+        if not text or text == href or not href.startswith(('http://', 'https://')):
+            return text
+        if len(node.contents) == 1 and self.is_tag(node.contents[0], 'img'):
+            return text
+        return f'{text} ({href})'
+
+    def visit_heading_node(level):
+        def visitor(self, node):
+            text = yield from self.generic_visit(node)
+            text = self.text_cleanup(text)
+            if not text:
+                return '\n\n'
+            return f'\n{text}\n\n'
+
+        return visitor
+
+    visit_tag_h1 = visit_heading_node(2)
+    visit_tag_h2 = visit_heading_node(2)
+    visit_tag_h3 = visit_heading_node(3)
+    visit_tag_h4 = visit_heading_node(4)
+    visit_tag_h5 = visit_heading_node(5)
+    visit_tag_h6 = visit_heading_node(6)
+
+    def visit_plain(self, node):
+        return (yield from self.generic_visit(node))
+
+    visit_tag_strong = visit_plain
+    visit_tag_b = visit_plain
+    visit_tag_em = visit_plain
+    visit_tag_i = visit_plain
+
+    def visit_tag_blockquote(self, node):
+        cite = self.extract_child(node, 'cite')
+        text = yield from self.generic_visit(node)
+        lines = text.strip().split('\n')
+        if cite is not None:
+            lines += ['', f'-- {cite}']
+        return ''.join(f'    {x}\n' if x else '\n' for x in lines) + '\n'
+
+    def visit_tag_hr(self, node):
+        return '\n----\n\n'
+
+    def visit_tag_img(self, node):
+        src = node.get('src')
+        if src is None:
+            return ''
+        return f'[image {node.get("alt") or src}]'
+
+    def visit_tag_pre(self, node):
+        self.context.pre += 1
+        try:
+            text = yield from self.generic_visit(node)
+        finally:
+            self.context.pre -= 1
+        return f'{text.rstrip()}\n\n'
+
+    def visit_tag_code(self, node):
+        text = yield from self.generic_visit(node)
+        if '\n' in text and not self.context.pre:
+            return f'{text.rstrip()}\n\n'
+        return text
+
+    def render_table(self, node, table: TableState) -> str:
+        lines = [table.caption] if table.caption else []
+        for row in table.rows:
+            lines.append(' | '.join(x[0].strip().replace('\n', ' ') for x in row))
+        return '\n'.join(lines) + '\n\n'
+
+
+backends = {
+    'adoc': AsciidocBackend,
+    'md': MarkdownBackend,
+    'txt': TextBackend,
+}
@@ -0,0 +1,228 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+
+class ConversionCache(object):
+    """
+    Content-addressed cache for html to markup conversions.
+
+    Converted values are kept in a bounded in-memory LRU memo keyed by the html
+    text. When @ref.cache_dir is given, values are also persisted on disk keyed
+    by a hash of the html text and the converter version, so that a later run
+    only has to convert html fragments that actually changed. Hits only
+    update the recency of entries in memory, the file is rewritten when
+    entries are added.
+    """
+    file_name = 'markup-cache.json'
+
+    def __init__(self, version: str, max_size: int = 4096, cache_dir: str = None, max_disk_size: int = 200000):
+        self.version = version
+        self.max_size = max_size
+        self.max_disk_size = max_disk_size
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._memo = OrderedDict()
+        self._disk = OrderedDict()
+        self._added = {}
+        self._dirty = False
+        if cache_dir:
+            self._load()
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha1(f'{self.version}\0{text}'.encode('utf-8')).hexdigest()
+
+    def _cache_file_path(self) -> str:
+        return os.path.join(self.cache_dir, self.file_name)
+
+    def _load(self):
+        try:
+            with open(self._cache_file_path(), 'rt', encoding='utf-8') as fp:
+                entries = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if isinstance(entries, dict):
+            self._disk.update(entries)
+
+    def get(self, text: str):
+        """
+        Return converted value of @ref.text or `None` if it was not converted before
+        """
+        value = self._memo.get(text)
+        if value is not None:
+            self._memo.move_to_end(text)
+            self.hits += 1
+            return value
+
+        if self.cache_dir:
+            key = self._key(text)
+            value = self._disk.get(key)
+            if value is not None:
+                self._disk.move_to_end(key)
+                self._remember(text, value)
+                self.hits += 1
+                return value
+
+        self.misses += 1
+        return None
+
+    def put(self, text: str, value: str):
+        self._remember(text, value)
+        if self.cache_dir:
+            key = self._key(text)
+            if self._disk.get(key) != value:
+                self._dirty = True
+            self._disk[key] = value
+            self._added[key] = value
+
+    def _remember(self, text: str, value: str):
+        self._memo[text] = value
+        self._memo.move_to_end(text)
+        if len(self._memo) > self.max_size:
+            self._memo.popitem(last=False)
+
+    def take_added(self) -> dict:
+        """
+        Return and forget on-disk entries added since the last call, used to
+        collect conversions done by worker processes
+        """
+        added = self._added
+        self._added = {}
+        return added
+
+    def merge(self, entries: dict, stats: dict):
+        """
+        Merge on-disk entries and counters collected from another cache
+        """
+        if self.cache_dir and entries:
+            if any(self._disk.get(k) != v for k, v in entries.items()):
+                self._dirty = True
+            self._disk.update(entries)
+        self.hits += stats.get('hits', 0)
+        self.misses += stats.get('misses', 0)
+
+    def save(self):
+        """
+        Persist on-disk entries, the least recently used entries are dropped
+        when there are more than @ref.max_disk_size of them
+        """
+        if not self.cache_dir or not self._dirty:
+            return
+        while len(self._disk) > self.max_disk_size:
+            self._disk.popitem(last=False)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        file_path = self._cache_file_path()
+        tmp_path = f'{file_path}.tmp'
+        with open(tmp_path, 'wt', encoding='utf-8') as fp:
+            json.dump(self._disk, fp)
+        os.replace(tmp_path, file_path)
+        self._dirty = False
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'memory_entries': len(self._memo),
+            'disk_entries': len(self._disk),
+        }
+
+
+class SubtreeCache(object):
+    """
+    Sidecar cache of rendered subtrees keyed by subtree fingerprints, each
+    entry holds the rendered content and the attachments it references.
+
+    Entries are only valid for the same @ref.context, i.e. same generator
+    settings and converter version, otherwise the cache starts empty. Keys are
+    `<level>:<fingerprint>`, entries of subtrees no longer present in the mind
+    map are dropped on save, so the sidecar file stays proportional to the size
+    of the mind map.
+    """
+
+    # bump whenever the format of entries changes
+    version = 2
+
+    def __init__(self, file_path: str, context: str):
+        self.file_path = file_path
+        self.context = context
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.file_path, 'rt', encoding='utf-8') as fp:
+                data = json.load(fp)
+        except (OSError, ValueError):
+            return
+        if isinstance(data, dict) and data.get('version') == self.version and data.get('context') == self.context:
+            self._entries = data.get('entries', {})
+
+    def get(self, key: str):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key: str, content: str, attachments: list):
+        self._entries[key] = [content, attachments]
+
+    def save(self, fingerprints):
+        """
+        Save entries of subtrees whose fingerprint is in @ref.fingerprints
+        """
+        live = set(fingerprints)
+        entries = {k: v for k, v in self._entries.items() if k.partition(':')[2] in live}
+        tmp_path = f'{self.file_path}.tmp'
+        with open(tmp_path, 'wt', encoding='utf-8') as fp:
+            json.dump({'version': self.version, 'context': self.context, 'entries': entries}, fp)
+        os.replace(tmp_path, self.file_path)
+        self._entries = entries
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(self._entries),
+        }
+
+
+def fingerprint_tree(root: dict, pruned=()) -> dict:
+    """
+    Compute fingerprints of every subtree of the mind map node @ref.root,
+    the result maps `id()` of each node dict to the fingerprint of the subtree
+    rooted at that node. A fingerprint covers the node's title, note, task,
+    attachment and fingerprints of its children. Nodes whose `id()` is in
+    @ref.pruned are not rendered, only their title is covered.
+    """
+    fingerprints = {}
+    stack = [(root, False)]
+    while stack:
+        node, expanded = stack.pop()
+        if id(node) in pruned:
+            h = hashlib.sha1(b'pruned\0')
+            h.update(node.get('title', {}).get('text', '').encode('utf-8'))
+            fingerprints[id(node)] = h.hexdigest()
+            continue
+        subnodes = node.get('subnodes', [])
+        if not expanded:
+            stack.append((node, True))
+            stack.extend((x, False) for x in subnodes)
+            continue
+
+        h = hashlib.sha1()
+        for value in (node.get('title', {}).get('text', ''),
+                      node.get('note', {}).get('text', ''),
+                      node.get('task', {}).get('state', 0),
+                      node.get('attachment', {}).get('fileName', '')):
+            h.update(str(value).encode('utf-8'))
+            h.update(b'\0')
+        for x in subnodes:
+            h.update(fingerprints[id(x)].encode('ascii'))
+        fingerprints[id(node)] = h.hexdigest()
+    return fingerprints
@@ -1,33 +1,189 @@
 import argparse
-from hyranote.cmd_simple import simple_generate_contents
-from hyranote.cmd_dump import dump_contents
-from hyranote.cmd_generate import generate_contents
+import importlib
+
 from hyranote.logging import Logging
 
 
+class _Command(object):
+    """
+    Subcommand function @ref.name of @ref.module, the module and its
+    dependencies are only imported when the subcommand runs
+    """
+
+    def __init__(self, module: str, name: str):
+        self.module = module
+        self.name = name
+
+    def __call__(self, args):
+        return getattr(importlib.import_module(self.module), self.name)(args)
+
+
+dump_contents = _Command('hyranote.cmd_dump', 'dump_contents')
+generate_contents = _Command('hyranote.cmd_generate', 'generate_contents')
+simple_generate_contents = _Command('hyranote.cmd_simple', 'simple_generate_contents')
+batch_generate_contents = _Command('hyranote.cmd_batch', 'batch_generate_contents')
+serve_contents = _Command('hyranote.cmd_serve', 'serve_contents')
+cache_stats = _Command('hyranote.cmd_cache', 'cache_stats')
+cache_clear = _Command('hyranote.cmd_cache', 'cache_clear')
+
+# names of `hyranote.backends.backends`, kept here to not import them to parse arguments
+FORMATS = ['adoc', 'md', 'txt']
+
+
+def _formats(value: str) -> list:
+    formats = []
+    for x in value.split(','):
+        x = x.strip()
+        if x not in FORMATS:
+            raise argparse.ArgumentTypeError(f'invalid format {x!r}, choose among {", ".join(FORMATS)}')
+        if x not in formats:
+            formats.append(x)
+    return formats
+
+
+def _weeks(value: str) -> list:
+    """
+    Parse comma separated week numbers and ranges such as `1-13,40`
+    """
+    weeks = []
+    for x in value.split(','):
+        first, _, last = x.strip().partition('-')
+        try:
+            first = int(first)
+            last = int(last) if last else first
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'invalid weeks {x.strip()!r}, expect numbers such as 1-52 or 3,5')
+        if not 1 <= first <= last <= 53:
+            raise argparse.ArgumentTypeError(f'invalid weeks {x.strip()!r}, weeks are numbered 1 to 53')
+        weeks.extend(y for y in range(first, last + 1) if y not in weeks)
+    return weeks
+
+
+def _date(value: str):
+    import datetime
+
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'invalid date {value!r}, expect YYYY-MM-DD')
+
+
+def _add_render_options(parser: argparse.ArgumentParser, batch: bool = False):
+    """
+    Add the options of the commands rendering notes to @ref.parser, those of
+    the generate and simple commands unless @ref.batch
+    """
+    parser.add_argument('--author', type=str, help='Render author field', default='')
+    parser.add_argument('--verbose', type=int, help='Logging level: 1-INFO, 2-WARN, 3-ERROR', default=Logging.LOG_WARN)
+    parser.add_argument('--cache-dir', type=str, default=None,
+                        help='Folder to persist converted markup and parsed MindNode files between runs')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Reuse rendered output of unchanged subtrees from previous run')
+    parser.add_argument('--converter', choices=['soup', 'stream'], default='soup',
+                        help='Html converter: soup builds a BeautifulSoup tree, stream converts from parser events')
+    if batch:
+        parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes converting MindNode files')
+        parser.add_argument('--format', type=_formats, default=['adoc'],
+                            help='Comma separated output formats among adoc, md and txt')
+    else:
+        parser.add_argument('--jobs', type=int, default=1, help='Number of worker processes rendering mind maps')
+        parser.add_argument('--split-depth', type=int, default=None, metavar='DEPTH',
+                            help='With --jobs and a single mind map, render its subtrees from this depth, 1 for the '
+                                 'top-level branches, in the worker processes. Ignored with --incremental')
+        parser.add_argument('--format', type=_formats, default=['adoc'],
+                            help='Comma separated output formats among adoc, md and txt. With other formats than '
+                                 'adoc notes are parsed once for all formats, without --converter, --cache-dir '
+                                 'markup and --incremental')
+    parser.add_argument('--lazy', action='store_true',
+                        help='Parse only the parts of contents.xml which are rendered, for very large files')
+    if batch:
+        return
+    parser.add_argument('--watch', action='store_true',
+                        help='Keep running and render again when the MindNode file changes, implies --incremental')
+    parser.add_argument('--debounce', type=float, default=0.5,
+                        help='Seconds without changes to wait for before rendering again in watch mode')
+    parser.add_argument('--profile', nargs='?', const='-', metavar='REPORT',
+                        help='Write JSON report of time per stage and html handler, node counts and bytes written '
+                             'and copied to REPORT, standard error when omitted')
+
+
 def main():
     parser = argparse.ArgumentParser(description='Hyranote to generate weekly notes for you')
     dump_command = parser.add_subparsers(title="Dump contents")
     d_parser = dump_command.add_parser("dump", help='Dump content of MindNode file to json and exit')
     d_parser.add_argument('input', type=str, help='Input MindNode file')
+    d_parser.add_argument('output', nargs='?', type=str, help='Output file, - to write to standard output',
+                          default='contents.json')
+    d_parser.add_argument('--format', choices=['json', 'ndjson'], default='json',
+                          help='json dumps the whole document, ndjson writes one line per node')
+    d_parser.add_argument('--lazy', action='store_true',
+                          help='Parse contents.xml while dumping instead of loading it first, for very large files')
+    d_parser.add_argument('--cache-dir', type=str, help='Folder to keep parsed snapshots of MindNode files',
+                          default=None)
     d_parser.set_defaults(func=dump_contents)
 
     g_parser = dump_command.add_parser('generate', aliases=['g', 'gen'], help='Generate weekly notes from MindNode file')
     g_parser.add_argument('input', type=str, help='Input MindNode file')
-    g_parser.add_argument('output', nargs='?', type=str, help='Output folder', default='.')
+    g_parser.add_argument('output', nargs='?', type=str, help='Output folder, - to write to standard output',
+                          default='.')
     g_parser.add_argument('--prefix', type=str, help='Prefix value for output file name and title', default='')
-    g_parser.add_argument('--author', type=str, help='Render author field', default='')
-    g_parser.add_argument('--verbose', type=int, help='Logging level: 1-INFO, 2-WARN, 3-ERROR', default=Logging.LOG_WARN)
+    _add_render_options(g_parser)
+    w_group = g_parser.add_mutually_exclusive_group()
+    w_group.add_argument('--weeks', type=_weeks,
+                         help='Generate notes of these weeks of the current year, e.g. 1-52 or 10,12-14, from a '
+                              'single pass over the MindNode file. Notes of past and future weeks are dated their '
+                              'Thursday, those of the current week today')
+    w_group.add_argument('--quarter', type=int, choices=[1, 2, 3, 4],
+                         help='Generate notes of every week of this quarter of the current year')
+    w_group.add_argument('--since', type=_date, metavar='YYYY-MM-DD',
+                         help='Generate notes of every week from this date until the current week')
     g_parser.set_defaults(func=generate_contents)
 
     g_parser = dump_command.add_parser('simple', aliases=['s', 'sim'], help='Generate weekly notes from MindNode file in simplify format')
     g_parser.add_argument('input', type=str, help='Input MindNode file')
-    g_parser.add_argument('output', nargs='?', type=str, help='Output folder', default='.')
-    g_parser.add_argument('--author', type=str, help='Render author field', default='')
-    g_parser.add_argument('--verbose', type=int, help='Logging level: 1-INFO, 2-WARN, 3-ERROR', default=Logging.LOG_WARN)
+    g_parser.add_argument('output', nargs='?', type=str, help='Output folder, - to write to standard output',
+                          default='.')
+    _add_render_options(g_parser)
     g_parser.set_defaults(func=simple_generate_contents)
 
+    b_parser = dump_command.add_parser('batch', aliases=['b'],
+                                       help='Generate notes in simplify format from many MindNode files')
+    b_parser.add_argument('inputs', nargs='*', type=str, help='Glob patterns of input MindNode files')
+    b_parser.add_argument('--manifest', type=str, help='File listing input MindNode files, one per line')
+    b_parser.add_argument('--output', type=str, help='Output folder', default='.')
+    _add_render_options(b_parser, batch=True)
+    b_parser.set_defaults(func=batch_generate_contents)
+
+    v_parser = dump_command.add_parser('serve', help='Convert html fragments and MindNode files on request over local '
+                                                     'HTTP, keeping caches warm between requests')
+    v_parser.add_argument('--host', type=str, default='127.0.0.1',
+                          help='Address to listen on, the Host header of requests must name it or localhost')
+    v_parser.add_argument('--port', type=int, default=8765, help='Port to listen on, 0 picks a free one')
+    v_parser.add_argument('--socket', type=str, default=None, help='Listen on this Unix socket instead of a port')
+    v_parser.add_argument('--verbose', type=int, help='Logging level: 1-INFO, 2-WARN, 3-ERROR', default=Logging.LOG_WARN)
+    v_parser.add_argument('--cache-dir', type=str, default=None,
+                          help='Folder to persist converted markup and parsed MindNode files between runs')
+    v_parser.add_argument('--converter', choices=['soup', 'stream'], default='soup',
+                          help='Html converter: soup builds a BeautifulSoup tree, stream converts from parser events')
+    v_parser.add_argument('--documents', type=int, default=8, help='Number of parsed MindNode files kept in memory')
+    v_parser.set_defaults(func=serve_contents)
+
+    c_parser = dump_command.add_parser('cache', help='Manage snapshots of parsed MindNode files and markup cache')
+    cache_command = c_parser.add_subparsers(title='Cache actions', dest='action', required=True)
+    for name, func, help_text in [('stats', cache_stats, 'Show size of cached data'),
+                                  ('clear', cache_clear, 'Remove cached data')]:
+        a_parser = cache_command.add_parser(name, help=help_text)
+        a_parser.add_argument('--cache-dir', type=str, required=True, help='Cache folder given to other commands')
+        a_parser.set_defaults(func=func)
+
     args = parser.parse_args()
+    # dump has a single --format string, the other commands a list of formats
+    formats = getattr(args, 'format', None)
+    if getattr(args, 'output', None) == '-' and isinstance(formats, list) and len(formats) > 1:
+        parser.error('only a single --format can be written to standard output')
+    if getattr(args, 'output', None) == '-' and \
+            (len(getattr(args, 'weeks', None) or []) > 1 or getattr(args, 'quarter', None) or getattr(args, 'since', None)):
+        parser.error('only notes of a single week can be written to standard output')
     args.func(args)
 
 
@@ -0,0 +1,97 @@
+import glob
+import io
+import os
+import sys
+import time
+
+from hyranote.cache import ConversionCache
+from hyranote.cmd_simple import simple_generate_bundle
+from hyranote.hyranote import converters
+from hyranote.logging import Logging
+from hyranote.parallel import get_worker_cache, init_worker_cache
+
+
+def expand_inputs(patterns, manifest, logger: Logging) -> list:
+    """
+    Return MindNode files matching glob @ref.patterns and listed in the
+    @ref.manifest file (one path per line, `#` starts a comment), in order
+    and without duplicates
+    """
+    if manifest:
+        patterns = list(patterns)
+        with open(os.path.expanduser(manifest), 'rt') as fp:
+            for line in fp:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    patterns.append(line)
+
+    inputs = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(os.path.expanduser(pattern)))
+        if not matches:
+            logger.warn('No MindNode file matches', pattern)
+        for x in matches:
+            if x not in inputs:
+                inputs.append(x)
+    return inputs
+
+
+def _convert_bundle(args, input_path, cache, log_stream, logger):
+    start = time.perf_counter()
+    try:
+        simple_generate_bundle(args, input_path, cache, log_stream=log_stream, logger=logger)
+        error = None
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    return input_path, time.perf_counter() - start, error
+
+
+def _batch_worker(task):
+    args, input_path = task
+    cache = get_worker_cache()
+    log = io.StringIO()
+    # warnings are counted here and reported by the parent once for all files
+    logger = Logging(args.verbose, log)
+    hits, misses = cache.hits, cache.misses
+    result = _convert_bundle(args, input_path, cache, log, logger)
+    stats = {'hits': cache.hits - hits, 'misses': cache.misses - misses}
+    return result, log.getvalue(), logger.tallies, cache.take_added(), stats
+
+
+def batch_generate_contents(args):
+    logger = Logging(args.verbose)
+    inputs = expand_inputs(args.inputs, args.manifest, logger)
+    cache = ConversionCache(converters[args.converter].version, cache_dir=args.cache_dir)
+
+    results = []
+    if args.jobs <= 1 or len(inputs) <= 1:
+        for input_path in inputs:
+            results.append(_convert_bundle(args, input_path, cache, None, logger))
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        tasks = [(args, input_path) for input_path in inputs]
+        with ProcessPoolExecutor(max_workers=args.jobs, initializer=init_worker_cache,
+                                 initargs=(cache.version, cache.cache_dir)) as executor:
+            for result, log, tallies, added, stats in executor.map(_batch_worker, tasks):
+                if log:
+                    print(log, end='')
+                logger.merge_tallies(tallies)
+                cache.merge(added, stats)
+                results.append(result)
+    logger.report_tallies()
+    cache.save()
+    logger.info('markup cache', cache.stats())
+
+    failures = 0
+    total = 0.0
+    for input_path, elapsed, error in results:
+        total += elapsed
+        if error is None:
+            print(f'{logger.green("ok  ")} {elapsed:8.3f}s {input_path}')
+        else:
+            failures += 1
+            print(f'{logger.red("FAIL")} {elapsed:8.3f}s {input_path}: {error}')
+    print(f'{len(results)} files, {len(results) - failures} converted, {failures} failed, {total:.3f}s')
+    if failures:
+        sys.exit(1)
@@ -0,0 +1,27 @@
+import os
+
+from hyranote.cache import ConversionCache
+from hyranote.snapshot import clear_snapshots, snapshot_stats
+
+
+def _markup_cache_path(args):
+    if not args.cache_dir:
+        return None
+    return os.path.join(args.cache_dir, ConversionCache.file_name)
+
+
+def cache_stats(args):
+    stats = snapshot_stats(args.cache_dir)
+    print(f'snapshots: {stats["snapshots"]} ({stats["stale"]} stale), {stats["bytes"]} bytes in {stats["folder"]}')
+    markup_path = _markup_cache_path(args)
+    if markup_path and os.path.exists(markup_path):
+        print(f'markup cache: {os.path.getsize(markup_path)} bytes in {markup_path}')
+
+
+def cache_clear(args):
+    removed = clear_snapshots(args.cache_dir)
+    print(f'removed {removed} snapshots')
+    markup_path = _markup_cache_path(args)
+    if markup_path and os.path.exists(markup_path):
+        os.remove(markup_path)
+        print(f'removed markup cache {markup_path}')
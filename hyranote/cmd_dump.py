@@ -1,13 +1,68 @@
+import json
 import os
-import plistlib
 
+from hyranote.plist_stream import LazySubnodes, load_lazy_contents
+from hyranote.sinks import FileSink, StdoutSink
+from hyranote.snapshot import load_contents
+
+
+def _detach_subnodes(o):
+    if isinstance(o, LazySubnodes):
+        return o.detach()
+    raise TypeError(f'Object of type {type(o).__name__} is not JSON serializable')
+
+
+def _get_subnodes(node: dict) -> list:
+    subnodes = node.get('subnodes', [])
+    if isinstance(subnodes, LazySubnodes):
+        return subnodes.detach()
+    return subnodes
 
-def dump_contents(args):
-    import json
 
+def iter_flat_nodes(data: dict):
+    """
+    Yield a flat record per node of every mind map in @ref.data in document
+    order, `path` is the list of child positions from the main node
+    """
+    for map_index, mind_map in enumerate(data['canvas']['mindMaps']):
+        stack = [(mind_map['mainNode'], [])]
+        while stack:
+            node, path = stack.pop()
+            subnodes = _get_subnodes(node)
+            stack.extend((x, path + [i]) for i, x in reversed(list(enumerate(subnodes))))
+            yield {
+                'map': map_index,
+                'path': path,
+                'depth': len(path),
+                'title': node.get('title', {}).get('text', ''),
+                'task': node.get('task', {}).get('state'),
+                'attachment': node.get('attachment', {}).get('fileName'),
+            }
+
+
+def iter_json(data: dict, fmt: str):
+    """
+    Yield chunks of @ref.data dumped in @ref.fmt format
+    """
+    if fmt == 'ndjson':
+        for record in iter_flat_nodes(data):
+            yield json.dumps(record)
+            yield '\n'
+    else:
+        yield from json.JSONEncoder(indent=2, sort_keys=True, default=_detach_subnodes).iterencode(data)
+
+
+def dump_contents(args):
     input_dir = os.path.expanduser(args.input)
-    with open(os.path.join(input_dir, 'contents.xml'), 'rb') as fp:
-        data = plistlib.load(fp)
+    if args.lazy:
+        data = load_lazy_contents(input_dir)
+    else:
+        data = load_contents(input_dir, args.cache_dir)
 
-    with open('contents.json', 'wt') as fh:
-        json.dump(data, fh, indent=2, sort_keys=True)
+    if args.output == '-':
+        sink = StdoutSink()
+    else:
+        sink = FileSink(args.output)
+    with sink:
+        for chunk in iter_json(data, args.format):
+            sink.write(chunk)
@@ -1,37 +1,171 @@
 import datetime
 import os
-import plistlib
+import sys
 
-from hyranote.hutil import copy_resources
-from hyranote.hyranote import Generator
+from hyranote.cache import ConversionCache
+from hyranote.hutil import sync_resources
+from hyranote.hyranote import Generator, WeeklyArchive, converters
+from hyranote.logging import Logging
+from hyranote.parallel import render_mind_maps
+from hyranote.pipeline import IOPipeline
+from hyranote.plist_stream import load_lazy_contents
+from hyranote.profiling import Profiler, profile_stage
+from hyranote.snapshot import load_contents
+from hyranote.watch import watch_bundle
 
 
-def get_current_week():
-    my_date = datetime.date.today()
+def get_week(my_date: datetime.date):
+    """
+    Return previous week, week number and quarter of @ref.my_date
+    """
     year, week_num, day_of_week = my_date.isocalendar()
     prev_date = my_date - datetime.timedelta(days=7)
     _, prev_week, _ = prev_date.isocalendar()
     return prev_week, week_num, int((my_date.month+2) / 3)
 
 
-def generate_contents(args):
+def get_current_week():
+    return get_week(datetime.date.today())
+
+
+def get_report_dates(args, logger: Logging = None) -> list:
+    """
+    Return a date within each week selected by --weeks, --quarter or --since,
+    today without them. Weeks are represented by their Thursday, which tells
+    the ISO year of a week and here its quarter, except the current week
+    which is represented by today like a run without them. A week number is
+    rendered once, for its latest week, weeks of a --since range longer than
+    a year which are dropped for that are warned about with @ref.logger.
+    """
+    today = datetime.date.today()
+    year = today.isocalendar()[0]
+    # Thursday of the current week
+    until = today + datetime.timedelta(days=3 - today.weekday())
+    if args.weeks:
+        last_week = datetime.date(year, 12, 28).isocalendar()[1]
+        dates = [datetime.date.fromisocalendar(year, x, 4) for x in args.weeks if x <= last_week]
+    elif args.quarter:
+        day = datetime.date.fromisocalendar(year, 1, 4)
+        dates = []
+        while day.isocalendar()[0] == year:
+            if int((day.month+2) / 3) == args.quarter:
+                dates.append(day)
+            day += datetime.timedelta(days=7)
+    elif args.since:
+        day = args.since + datetime.timedelta(days=3 - args.since.weekday())
+        dates = []
+        while day <= until:
+            dates.append(day)
+            day += datetime.timedelta(days=7)
+    else:
+        return [today]
+    weeks = {}
+    dropped = []
+    for x in dates:
+        week = x.isocalendar()[1]
+        if week in weeks:
+            dropped.append(weeks[week])
+        weeks[week] = today if x == until else x
+    if dropped and args.since and logger is not None:
+        logger.warn('--since spans more than a year, notes of the weeks of',
+                    ', '.join(x.isoformat() for x in dropped),
+                    'are not generated as later weeks with the same numbers replace them')
+    return sorted(weeks.values()) if args.since else list(weeks.values())
+
+
+def render_bundle(args, cache, log_stream=None, subtree_caches=None, profiler=None, pipeline=None,
+                  logger=None) -> set:
+    """
+    Render weekly notes of all mind maps of the input MindNode file, return
+    names of referenced attachments. With @ref.pipeline attachments are
+    synced and output files written in the background, counted warnings
+    are merged into @ref.logger.
+    """
     input_dir = os.path.expanduser(args.input)
-    copy_resources(input_dir, os.path.join(args.output, 'images'))
-    with open(os.path.join(input_dir, 'contents.xml'), 'rb') as fp:
-        data = plistlib.load(fp)
+    to_stdout = args.output == '-'
+    if not to_stdout:
+        os.makedirs(args.output, exist_ok=True)
+    with profile_stage(profiler, 'load'):
+        if args.lazy:
+            data = load_lazy_contents(input_dir)
+        else:
+            data = load_contents(input_dir, args.cache_dir)
 
     canvas = data['canvas']
     mind_maps = canvas['mindMaps']
-    for main_node in mind_maps:
-        prev_week, week_num, quarter = get_current_week()
-        generator = Generator(main_node,
-                              {
-                                  'previous_week': prev_week,
-                                  'current_week': week_num,
-                                  'current_quarter': quarter,
-                                  'output_dir': args.output,
-                                  'prefix': args.prefix,
-                                  'author': args.author,
-                                  'logging': args.verbose,
-                              })
-        generator.generate()
+    if logger is None:
+        logger = Logging(args.verbose, log_stream)
+    dates = get_report_dates(args, logger)
+    if not dates:
+        logger.warn('no week to generate notes of in', datetime.date.today().year)
+        return set()
+    weeks = [get_week(x) + (x,) for x in dates]
+    # several weeks are rendered from a single walk of each mind map
+    generator_class = WeeklyArchive if len(weeks) > 1 else Generator
+    tasks = []
+    for index, main_node in enumerate(mind_maps):
+        prev_week, week_num, quarter, date = weeks[0]
+        tasks.append((main_node,
+                      {
+                          'previous_week': prev_week,
+                          'current_week': week_num,
+                          'current_quarter': quarter,
+                          'date': date,
+                          'weeks': weeks,
+                          'output_dir': args.output,
+                          'prefix': args.prefix,
+                          'author': args.author,
+                          'logging': args.verbose,
+                          'incremental': args.incremental and not to_stdout,
+                          'converter': args.converter,
+                          'formats': args.format,
+                          'split_depth': args.split_depth,
+                          'map_index': index + 1 if len(mind_maps) > 1 else None,
+                      }))
+    with profile_stage(profiler, 'render'):
+        return render_mind_maps(generator_class, tasks, cache, args.jobs, to_stdout, log_stream, subtree_caches, profiler,
+                                pipeline, logger)
+
+
+def generate_contents(args):
+    input_dir = os.path.expanduser(args.input)
+    to_stdout = args.output == '-'
+    cache = ConversionCache(converters[args.converter].version, cache_dir=args.cache_dir)
+    log_stream = sys.stderr if to_stdout else None
+    logger = Logging(args.verbose, log_stream)
+    subtree_caches = {}
+    profiler = Profiler() if args.profile else None
+
+    def render(pipeline=None):
+        attachments = render_bundle(args, cache, log_stream, subtree_caches, profiler, pipeline, logger)
+        logger.report_tallies()
+        cache.save()
+        logger.info('markup cache', cache.stats())
+        return attachments
+
+    def report(stats):
+        if profiler is not None:
+            profiler.add_bytes('copied', stats['bytes'])
+        logger.info('resources', stats)
+
+    def sync(attachments):
+        if not to_stdout:
+            with profile_stage(profiler, 'sync_resources'):
+                stats = sync_resources(input_dir, os.path.join(args.output, 'images'), attachments)
+            report(stats)
+
+    try:
+        if args.watch:
+            # only subtrees which changed since the previous run are rendered again
+            args.incremental = True
+            watch_bundle(input_dir, render, sync, args.debounce, log_stream)
+        elif to_stdout:
+            render()
+        else:
+            # attachments are copied and outputs written while rendering goes on
+            with IOPipeline(input_dir, os.path.join(args.output, 'images'), profiler) as pipeline:
+                render(pipeline)
+            report(pipeline.stats)
+    finally:
+        if profiler is not None:
+            profiler.write(args.profile)
@@ -0,0 +1,26 @@
+import signal
+import sys
+
+from hyranote.logging import Logging
+from hyranote.service import ConversionService, create_server
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve_contents(args):
+    service = ConversionService(args.converter, args.cache_dir, args.documents, args.verbose, sys.stderr)
+    server = create_server(service, args.host, args.port, args.socket)
+    address = args.socket or f'http://{args.host}:{server.server_address[1]}'
+    # terminated like interrupted, so the markup cache gets saved
+    signal.signal(signal.SIGTERM, _stop)
+    print(f'serving on {address}, press Ctrl-C to stop', file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        Logging(args.verbose, sys.stderr).info('markup cache', service.cache.stats())
@@ -1,24 +1,114 @@
 import os
-import plistlib
+import sys
 
-from hyranote.hyranote import SimpleGenerator
-from hyranote.hutil import copy_resources
+from hyranote.cache import ConversionCache
+from hyranote.hyranote import SimpleGenerator, converters
+from hyranote.hutil import sync_resources
+from hyranote.logging import Logging
+from hyranote.parallel import render_mind_maps
+from hyranote.pipeline import IOPipeline
+from hyranote.plist_stream import load_lazy_contents
+from hyranote.profiling import Profiler, profile_stage
+from hyranote.snapshot import load_contents
+from hyranote.watch import watch_bundle
 
 
-def simple_generate_contents(args):
-    input_dir = os.path.expanduser(args.input)
-    copy_resources(input_dir, os.path.join(args.output, 'images'))
-    with open(os.path.join(input_dir, 'contents.xml'), 'rb') as fp:
-        data = plistlib.load(fp)
+def simple_render_bundle(args, input_path, cache, jobs=1, log_stream=None, subtree_caches=None, profiler=None,
+                         pipeline=None, logger=None) -> set:
+    """
+    Render all mind maps of MindNode file @ref.input_path with options of the
+    simple command, return names of referenced attachments. With
+    @ref.pipeline attachments are synced and output files written in the
+    background, counted warnings are merged into @ref.logger.
+    """
+    input_dir = os.path.expanduser(input_path)
+    to_stdout = args.output == '-'
+    if not to_stdout:
+        os.makedirs(args.output, exist_ok=True)
+    with profile_stage(profiler, 'load'):
+        if args.lazy:
+            data = load_lazy_contents(input_dir)
+        else:
+            data = load_contents(input_dir, args.cache_dir)
 
     canvas = data['canvas']
     mind_maps = canvas['mindMaps']
-    for main_node in mind_maps:
-        generator = SimpleGenerator(main_node,
-                              {
-                                  'input': args.input,
-                                  'output_dir': args.output,
-                                  'author': args.author,
-                                  'logging': args.verbose,
-                              })
-        generator.generate()
+    tasks = []
+    for index, main_node in enumerate(mind_maps):
+        tasks.append((main_node,
+                      {
+                          'input': input_path,
+                          'output_dir': args.output,
+                          'author': args.author,
+                          'logging': args.verbose,
+                          'incremental': args.incremental and not to_stdout,
+                          'converter': args.converter,
+                          'formats': args.format,
+                          'split_depth': getattr(args, 'split_depth', None),
+                          'map_index': index + 1 if len(mind_maps) > 1 else None,
+                      }))
+    with profile_stage(profiler, 'render'):
+        return render_mind_maps(SimpleGenerator, tasks, cache, jobs, to_stdout, log_stream, subtree_caches, profiler,
+                                pipeline, logger)
+
+
+def simple_report_sync(args, stats, log_stream=None, profiler=None):
+    if profiler is not None:
+        profiler.add_bytes('copied', stats['bytes'])
+    Logging(args.verbose, log_stream).info('resources', stats)
+
+
+def simple_sync_bundle(args, input_path, attachments, log_stream=None, profiler=None):
+    if args.output != '-':
+        with profile_stage(profiler, 'sync_resources'):
+            stats = sync_resources(os.path.expanduser(input_path), os.path.join(args.output, 'images'), attachments)
+        simple_report_sync(args, stats, log_stream, profiler)
+
+
+def simple_generate_bundle(args, input_path, cache, jobs=1, log_stream=None, subtree_caches=None, profiler=None,
+                           logger=None):
+    """
+    Render all mind maps of MindNode file @ref.input_path and copy the
+    attachments they reference, copies and output writes overlap rendering
+    """
+    if args.output == '-':
+        return simple_render_bundle(args, input_path, cache, jobs, log_stream, subtree_caches, profiler,
+                                    logger=logger)
+    with IOPipeline(os.path.expanduser(input_path), os.path.join(args.output, 'images'), profiler) as pipeline:
+        attachments = simple_render_bundle(args, input_path, cache, jobs, log_stream, subtree_caches, profiler,
+                                           pipeline, logger)
+    simple_report_sync(args, pipeline.stats, log_stream, profiler)
+    return attachments
+
+
+def simple_generate_contents(args):
+    cache = ConversionCache(converters[args.converter].version, cache_dir=args.cache_dir)
+    log_stream = sys.stderr if args.output == '-' else None
+    logger = Logging(args.verbose, log_stream)
+    subtree_caches = {}
+    profiler = Profiler() if args.profile else None
+
+    def render():
+        attachments = simple_render_bundle(args, args.input, cache, args.jobs, log_stream, subtree_caches, profiler,
+                                           logger=logger)
+        logger.report_tallies()
+        cache.save()
+        logger.info('markup cache', cache.stats())
+        return attachments
+
+    def sync(attachments):
+        simple_sync_bundle(args, args.input, attachments, log_stream, profiler)
+
+    try:
+        if args.watch:
+            # only subtrees which changed since the previous run are rendered again
+            args.incremental = True
+            watch_bundle(os.path.expanduser(args.input), render, sync, args.debounce, log_stream)
+        else:
+            simple_generate_bundle(args, args.input, cache, args.jobs, log_stream, subtree_caches, profiler, logger)
+            logger.report_tallies()
+            cache.save()
+            logger.info('markup cache', cache.stats())
+    finally:
+        if profiler is not None:
+            profiler.write(args.profile)
@@ -0,0 +1,223 @@
+"""
+Intermediate document model rendered by the backends of `hyranote.backends`.
+
+A document is a sequence of `Block`, one per rendered mind map node, whose
+title and note are html fragments parsed once into a tree of `Element` and
+strings, so several output formats are rendered without parsing again.
+"""
+from bs4 import Tag
+
+from hyranote.asciidoc_visitor import AsciidocVisitor, node_text
+from hyranote.logging import Logging
+from hyranote.visitor import get_ignored_tags, is_text
+
+# kinds of blocks
+HEADING = 'heading'
+IMAGE = 'image'
+ITEM = 'item'
+
+# elements closed right away by the html parser, serialized without end tag
+_void_elements = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+                  'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+                  'nextid', 'spacer'}
+# elements serialized as they are by `Element.prettify`
+_preformatted_elements = {'pre', 'textarea'}
+# markup around nodes which are neither elements nor text, by their type
+_node_markup = {
+    'Comment': ('<!--', '-->'),
+    'CData': ('<![CDATA[', ']]>'),
+    'Declaration': ('<?', '?>'),
+    'Doctype': ('<!DOCTYPE ', '>\n'),
+    'ProcessingInstruction': ('<?', '>'),
+}
+_markup_escapes = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
+
+
+def _quote_attribute(value) -> str:
+    if isinstance(value, list):
+        value = ' '.join(value)
+    value = value.translate(_markup_escapes)
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return '"{}"'.format(value.replace('"', '&quot;'))
+
+
+class Block(object):
+    """
+    Rendered mind map node: a heading of @ref.level, an image attachment or
+    a list item at depth @ref.level with an optional @ref.task state.
+    @ref.title and @ref.note are fragments, plain strings are already
+    converted.
+    """
+    __slots__ = ('kind', 'level', 'title', 'note', 'task', 'attachment')
+
+    def __init__(self, kind: str, level: int, title, note='', task: int = 0, attachment: str = None):
+        self.kind = kind
+        self.level = level
+        self.title = title
+        self.note = note
+        self.task = task
+        self.attachment = attachment
+
+
+class Element(object):
+    """
+    Html element of a fragment, it provides the part of bs4's `Tag` used by
+    visitor functions. Nodes which are neither elements nor text, e.g.
+    comments, are kept with `None` as @ref.name and their type and text as
+    @ref.extra. A blockquote's @ref.extra holds the text of its cite and a
+    figure's the text of its figcaption, both are taken out of the content.
+    """
+    __slots__ = ('name', 'attrs', 'parent', 'contents', 'extra')
+
+    def __init__(self, name, attrs: dict, parent, extra=None):
+        self.name = name
+        self.attrs = attrs
+        self.parent = parent
+        self.contents = []
+        self.extra = extra
+
+    def get(self, key: str, default=None):
+        return self.attrs.get(key, default)
+
+    def find(self, name: str):
+        """
+        Return the first descendant element @ref.name in document order
+        """
+        stack = list(reversed(self.contents))
+        while stack:
+            node = stack.pop()
+            if type(node) is not Element:
+                continue
+            if node.name == name:
+                return node
+            stack.extend(reversed(node.contents))
+        return None
+
+    def extract(self):
+        """
+        Take the element out of its parent
+        """
+        contents = self.parent.contents
+        for i, x in enumerate(contents):
+            if x is self:
+                del contents[i]
+                break
+        self.parent = None
+
+    def prettify(self) -> str:
+        """
+        Return the element serialized like bs4's `Tag.prettify`: each tag,
+        string and comment on its own line indented by its depth, except
+        within preformatted elements
+        """
+        pieces = []
+        level = 0
+        # preformatted element whose content is written as it is
+        literal = None
+        stack = [('start', self)]
+        while stack:
+            kind, node = stack.pop()
+            indent_before = indent_after = literal is None
+            opened = False
+            if kind == 'start':
+                attrs = ''.join(f' {k}={_quote_attribute(v)}' for k, v in sorted(node.attrs.items()))
+                if not node.contents and node.name in _void_elements:
+                    piece = f'<{node.name}{attrs}/>'
+                else:
+                    piece = f'<{node.name}{attrs}>'
+                    if literal is None and node.name in _preformatted_elements:
+                        indent_after = False
+                        literal = node
+                    opened = True
+                    stack.append(('end', node))
+                    # content of script and style is not escaped
+                    text_kind = 'raw' if node.name in ('script', 'style') else 'text'
+                    for x in reversed(node.contents):
+                        if type(x) is str:
+                            stack.append((text_kind, x))
+                        else:
+                            stack.append(('start' if x.name is not None else 'node', x))
+            elif kind == 'end':
+                piece = f'</{node.name}>'
+                level -= 1
+                if node is literal:
+                    indent_before = False
+                    indent_after = True
+                    literal = None
+            else:
+                if kind == 'text':
+                    piece = node.translate(_markup_escapes)
+                elif kind == 'raw':
+                    piece = node
+                else:
+                    prefix, suffix = _node_markup.get(node.extra[0], ('', ''))
+                    piece = f'{prefix}{node.extra[1]}{suffix}'
+                if indent_before or indent_after:
+                    piece = piece.strip()
+            if piece and (indent_before or indent_after):
+                if indent_before and level:
+                    piece = ' ' * level + piece
+                if indent_after:
+                    piece += '\n'
+            if opened:
+                level += 1
+            pieces.append(piece)
+        return ''.join(pieces)
+
+
+def visited_children(element: Element) -> list:
+    """
+    Return the children of @ref.element the asciidoc visitor walks, it is
+    called once, when the element is visited. Like the visitor, a blockquote
+    first takes out its first cite and a figure its first figcaption, their
+    text is kept as @ref.extra, and a medium figure of class paragraph-image
+    only shows its first noscript.
+    """
+    name = element.name
+    if name != 'blockquote' and name != 'figure':
+        return element.contents
+    child = element.find('cite' if name == 'blockquote' else 'figcaption')
+    if child is not None:
+        child.extract()
+        element.extra = node_text(child)
+    if name == 'figure' and 'paragraph-image' in element.get('class', []):
+        noscript = element.find('noscript')
+        if noscript is not None:
+            return noscript.contents
+    return element.contents
+
+
+def build_fragment(root: Tag, logger: Logging) -> Element:
+    """
+    Return the fragment of the html tree @ref.root. Cites and figcaptions are
+    taken out in the order the asciidoc visitor walks the tree, see
+    `visited_children`.
+    """
+    fragment = Element(root.name, root.attrs, None)
+    stack = [(root, fragment)]
+    while stack:
+        node, element = stack.pop()
+        contents = element.contents
+        for child in node.contents:
+            child_type = type(child)
+            if child_type is Tag:
+                x = Element(child.name, child.attrs, element)
+                contents.append(x)
+                stack.append((child, x))
+            elif is_text(child):
+                contents.append(str(child))
+            else:
+                logger.tally('UNKNOWN Node Type:', child_type.__name__)
+                contents.append(Element(None, {}, element, (child_type.__name__, str(child))))
+
+    ignored = get_ignored_tags(AsciidocVisitor)
+    stack = [fragment]
+    while stack:
+        element = stack.pop()
+        if element.name in ignored:
+            continue
+        stack.extend(x for x in visited_children(element) if type(x) is Element and x.name is not None)
+    return fragment
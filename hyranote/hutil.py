@@ -1,7 +1,154 @@
+import hashlib
 import os
 import shutil
 
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
 
-def copy_resources(input_dir, dst):
-    resources = os.path.join(input_dir, 'resources')
-    shutil.copytree(resources, dst, dirs_exist_ok=True)
+# ioctl request to clone a file on copy-on-write file systems (Linux FICLONE)
+_FICLONE = 0x40049409
+
+
+def file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _is_unchanged(src: str, dst: str, src_stat: os.stat_result) -> bool:
+    try:
+        dst_stat = os.stat(dst)
+    except OSError:
+        return False
+    if dst_stat.st_size != src_stat.st_size:
+        return False
+    if dst_stat.st_mtime_ns == src_stat.st_mtime_ns:
+        return True
+    if file_digest(src) != file_digest(dst):
+        return False
+    # same content, only refresh mtime so the next run skips hashing
+    os.utime(dst, ns=(src_stat.st_atime_ns, src_stat.st_mtime_ns))
+    return True
+
+
+def _clone_file(src: str, dst: str) -> bool:
+    """
+    Share data blocks of @ref.src with @ref.dst, first as a hardlink then as a
+    reflink. Return `False` when neither is supported.
+    """
+    try:
+        os.link(src, dst)
+        return True
+    except OSError:
+        pass
+    if fcntl is None:
+        return False
+    try:
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def _is_within(path: str, folder: str) -> bool:
+    folder = os.path.realpath(folder)
+    return os.path.realpath(path).startswith(folder + os.sep)
+
+
+class ResourceSync(object):
+    """
+    Copy resources of MindNode file @ref.input_dir into folder @ref.dst one
+    at a time, counters of the sync are kept in @ref.stats. Files whose size,
+    mtime and content are unchanged are skipped, new files are hardlinked or
+    reflinked when possible and files with identical content are copied once
+    then linked to each other.
+    """
+
+    def __init__(self, input_dir, dst):
+        self.resources = os.path.join(input_dir, 'resources')
+        self.dst = dst
+        self.stats = {'skipped': 0, 'linked': 0, 'copied': 0, 'deduplicated': 0, 'missing': 0, 'bytes': 0}
+        # files copied by this sync by size, hashes are computed only for sizes
+        # shared by several files
+        self._copied = {}
+        self._digests = {}
+
+    def _digest_of(self, path):
+        if path not in self._digests:
+            self._digests[path] = file_digest(path)
+        return self._digests[path]
+
+    def add(self, name):
+        """
+        Copy resource @ref.name unless it is unchanged
+        """
+        stats = self.stats
+        name = os.path.normpath(name)
+        if os.path.isabs(name) or name == os.pardir or name.startswith(os.pardir + os.sep):
+            # file names come from contents.xml, never leave resources or dst
+            stats['missing'] += 1
+            return
+        src = os.path.join(self.resources, name)
+        target = os.path.join(self.dst, name)
+        if not _is_within(src, self.resources):
+            # linked outside of resources
+            stats['missing'] += 1
+            return
+        try:
+            src_stat = os.stat(src)
+        except OSError:
+            stats['missing'] += 1
+            return
+        if _is_unchanged(src, target, src_stat):
+            stats['skipped'] += 1
+            return
+
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp_target = f'{target}.tmp'
+        if os.path.exists(tmp_target):
+            os.remove(tmp_target)
+        if _clone_file(src, tmp_target):
+            os.replace(tmp_target, target)
+            stats['linked'] += 1
+            return
+
+        same_size = self._copied.setdefault(src_stat.st_size, [])
+        duplicate = None
+        if same_size:
+            digest = self._digest_of(src)
+            duplicate = next((x for x in same_size if self._digest_of(x) == digest), None)
+        if duplicate is not None:
+            try:
+                os.link(duplicate, tmp_target)
+                os.replace(tmp_target, target)
+                stats['deduplicated'] += 1
+                return
+            except OSError:
+                pass
+
+        shutil.copy2(src, tmp_target)
+        os.replace(tmp_target, target)
+        stats['copied'] += 1
+        stats['bytes'] += src_stat.st_size
+        if src in self._digests:
+            self._digests[target] = self._digests[src]
+        same_size.append(target)
+
+
+def sync_resources(input_dir, dst, names) -> dict:
+    """
+    Copy resources @ref.names of MindNode file into folder @ref.dst with
+    `ResourceSync`. Return counters of the sync.
+    """
+    sync = ResourceSync(input_dir, dst)
+    for name in sorted(names):
+        sync.add(name)
+    return sync.stats
@@ -1,12 +1,46 @@
 import datetime
 import os
-import re
+from collections import OrderedDict
 from pathlib import Path
 
 from bs4 import BeautifulSoup
 
-from hyranote.asciidoc_visitor import AsciidocVisitor
+from hyranote.asciidoc_stream import AsciidocStreamConverter
+from hyranote.asciidoc_visitor import AsciidocVisitor, convert_plain_fragment
+from hyranote.backends import AsciidocBackend, backends
+from hyranote.cache import ConversionCache, SubtreeCache, fingerprint_tree
+from hyranote.document import HEADING, IMAGE, ITEM, Block, build_fragment
+from hyranote.labels import LabelIndex, quarter_re, week_re
 from hyranote.logging import Logging
+from hyranote.sinks import FileSink
+
+# html to markup converters selectable with the `converter` config
+converters = {
+    'soup': AsciidocVisitor,
+    'stream': AsciidocStreamConverter,
+}
+
+# configs which only make sense in the process holding them, left out of
+# configs sent to worker processes
+_local_configs = {'log_stream', 'cache', 'subtree_caches', 'profiler', 'pipeline', 'jobs'}
+
+
+def _subtree_sizes(root) -> dict:
+    """
+    Return characters of html titles and notes of each subtree, plus one per
+    node, by `id()` of its root node
+    """
+    order = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        order.append(node)
+        stack.extend(node.get('subnodes', []))
+    sizes = {}
+    for node in reversed(order):
+        size = 1 + len(node.get('title', {}).get('text', '')) + len(node.get('note', {}).get('text', ''))
+        sizes[id(node)] = size + sum(sizes[id(x)] for x in node.get('subnodes', []))
+    return sizes
 
 
 class BaseGenerator(object):
@@ -15,13 +49,197 @@ class BaseGenerator(object):
 
     def __init__(self, data, configs):
         self.data = data
+        self.configs = configs
         self.output_dir = configs.get('output_dir')
         self.author = configs.get('author')
-        self.logger = Logging(configs.get('logging', Logging.LOG_WARN))
+        self.logger = Logging(configs.get('logging', Logging.LOG_WARN), configs.get('log_stream'))
         self.visitor = AsciidocVisitor(self.logger)
+        converter = converters[configs.get('converter', 'soup')]
+        self.converter_version = converter.version
+        self.stream_converter = None
+        if converter is AsciidocStreamConverter:
+            self.stream_converter = AsciidocStreamConverter(self.logger)
+        self.cache = configs.get('cache') or ConversionCache(self.converter_version)
+        self.backends = [backends[x](self.logger) for x in configs.get('formats') or ['adoc']]
+        # with other formats than asciidoc, notes are parsed once into fragments
+        # which every backend renders, see `generate`
+        self.fragments = None
+        if [x.name for x in self.backends] != ['adoc']:
+            self.fragments = OrderedDict()
+            self.markup_backend = next((x for x in self.backends if x.name == 'adoc'), None) or \
+                AsciidocBackend(self.logger)
+        # rendered subtrees are cached as asciidoc markup
+        self.incremental = configs.get('incremental', False) and self.fragments is None
+        # 1-based position of the mind map when the document has several of them
+        self.map_index = configs.get('map_index')
+        self.subtree_cache = None
+        # subtree caches by sidecar path, kept by long running processes
+        self.subtree_caches = configs.get('subtree_caches', {})
+        self.fingerprints = {}
+        # attachments referenced by rendered content, only those are copied
+        self.attachments = set()
+        self._attachment_scopes = []
+        # background I/O of the run, attachments are synced as they are found
+        self.pipeline = configs.get('pipeline')
+        # subtrees from this depth, 1 for the top-level branches, are rendered
+        # by @ref.jobs worker processes
+        self.jobs = configs.get('jobs', 1)
+        self.split_depth = configs.get('split_depth')
+        self.profiler = configs.get('profiler')
+        if self.profiler is not None:
+            self._instrument()
+        # nodes skipped without converting their title, `id()` of the node
+        # mapped to the log message of skipping it
+        self.pruned_nodes = {}
+
+    def _instrument(self):
+        """
+        Record html parsing, conversion and visitor handlers with the profiler
+        """
+        self.profiler.instrument(self.visitor)
+        if self.stream_converter is not None:
+            self.profiler.instrument(self.stream_converter)
+        if self.fragments is not None:
+            for x in {*self.backends, self.markup_backend}:
+                self.profiler.instrument(x)
+        self._parse_html = self.profiler.timed('parse', self._parse_html)
+        self._convert_html = self.profiler.timed('convert', self._convert_html)
+
+    def _accept_node(self, node: dict, title: str) -> bool:
+        """
+        Return `False` to skip rendering the node and its children
+        """
+        if title.startswith('[S]'):
+            # Skip this node and its children
+            return False
+        return True
 
-    def _visit_node(self, node, fp, node_level=1):
-        pass
+    def _iter_node(self, node, node_level=1):
+        """
+        Yield rendered chunks of subtree rooted at @ref.node in document order.
+        The tree is walked with an explicit stack so deep outlines don't hit
+        the recursion limit. In incremental mode the rendered content of
+        heading subtrees is spliced from the sidecar cache when the subtree's
+        fingerprint is unchanged, otherwise it is captured to be cached.
+        """
+        captures = []
+        stack = [(node, node_level)]
+        while stack:
+            node, node_level = stack.pop()
+            if node_level is None:
+                # end of a captured subtree, @ref.node holds its cache key
+                content = ''.join(captures.pop())
+                attachments = self._attachment_scopes.pop()
+                self.subtree_cache.put(node, content, sorted(attachments))
+                if self._attachment_scopes:
+                    self._attachment_scopes[-1].update(attachments)
+            else:
+                if id(node) in self.pruned_nodes:
+                    self.logger.info(*self.pruned_nodes[id(node)])
+                    continue
+                content = None
+                if self.subtree_cache is not None and 1 < node_level <= self.max_heading_level:
+                    key = f'{node_level}:{self.fingerprints[id(node)]}'
+                    entry = self.subtree_cache.get(key)
+                    if entry is None:
+                        captures.append([])
+                        self._attachment_scopes.append(set())
+                        stack.append((key, None))
+                    else:
+                        content, attachments = entry
+                        for x in attachments:
+                            self._add_attachment(x)
+
+                if content is None:
+                    title = node.get('title', {}).get('text', '')
+                    title = self._convert_to_markup(title)
+                    if not self._accept_node(node, title):
+                        continue
+
+                    subnodes = node.get('subnodes', [])
+                    stack.extend((x, node_level + 1) for x in reversed(subnodes))
+                    if node_level <= 1:
+                        continue
+                    content = self._render_node_content(node, node_level, title)
+
+            if captures:
+                captures[-1].append(content)
+            else:
+                yield content
+
+    def _iter_split_node(self, root):
+        """
+        Yield rendered chunks of the tree rooted at @ref.root like
+        `_iter_node`, subtrees from level @ref.split_depth + 1 are rendered
+        by worker processes and spliced back in document order. Subtrees
+        larger than a quarter of a worker's share of the tree are split
+        further down so that a giant branch doesn't leave other workers idle,
+        and the largest subtrees are started first.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        from hyranote.parallel import init_worker_cache, render_subtree
+
+        sizes = _subtree_sizes(root)
+        limit = sizes[id(root)] / (self.jobs * 4)
+        split_level = self.split_depth + 1
+        configs = {k: v for k, v in self.configs.items() if k not in _local_configs}
+        # rendered chunks and `(node, node_level)` of subtrees sent to workers
+        items = []
+        stack = [(root, 1)]
+        while stack:
+            node, node_level = stack.pop()
+            if id(node) in self.pruned_nodes:
+                self.logger.info(*self.pruned_nodes[id(node)])
+                continue
+            subnodes = node.get('subnodes', [])
+            if node_level >= split_level and (sizes[id(node)] <= limit or not subnodes):
+                items.append((node, node_level))
+                continue
+            title = self._convert_to_markup(node.get('title', {}).get('text', ''))
+            if not self._accept_node(node, title):
+                continue
+            stack.extend((x, node_level + 1) for x in reversed(subnodes))
+            if node_level > 1:
+                items.append(self._render_node_content(node, node_level, title))
+
+        tasks = sorted((x for x in items if type(x) is tuple), key=lambda x: sizes[id(x[0])], reverse=True)
+        executor = ProcessPoolExecutor(max_workers=self.jobs, initializer=init_worker_cache,
+                                       initargs=(self.cache.version, self.cache.cache_dir))
+        try:
+            futures = {}
+            for node, node_level in tasks:
+                futures[id(node)] = executor.submit(render_subtree, (type(self), configs, node, node_level,
+                                                                      self.profiler is not None))
+            for item in items:
+                if type(item) is tuple:
+                    yield from self._merge_subtree(futures[id(item[0])].result())
+                else:
+                    yield item
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _merge_subtree(self, result) -> list:
+        """
+        Take in the state of rendering a subtree in a worker process, return
+        its rendered chunks
+        """
+        chunks, log, attachments, tallies, added, stats, report = result
+        if log:
+            print(log, end='', file=self.logger.stream)
+        self.logger.merge_tallies(tallies)
+        self.cache.merge(added, stats)
+        for x in attachments:
+            self._add_attachment(x)
+        if report is not None:
+            self.profiler.merge(report)
+        return chunks
+
+    def _get_incremental_context(self) -> str:
+        """
+        Settings which affect rendered content of a subtree beside its own data
+        """
+        return f'{type(self).__name__}:{self.converter_version}:{self.max_heading_level}:{self.image_suffixes}'
 
     def _convert_to_markup(self, text: str) -> str:
         """
@@ -31,40 +249,93 @@ class BaseGenerator(object):
         if not text:
             return ''
 
-        doc = BeautifulSoup(f'<div>{text}</div>', features='html.parser')
-        value = self.visitor.visit(doc.find())
-        value = value.strip()
+        value = convert_plain_fragment(text)
+        if value is not None:
+            return value
+
+        if self.fragments is not None:
+            return self.markup_backend.render(self._get_fragment(text))
+
+        value = self.cache.get(text)
+        if value is not None:
+            return value
+
+        value = self._convert_html(text).strip()
+        self.cache.put(text, value)
         return value
 
-    def _render_node_content(self, node: dict, node_level: int, title: str) -> str:
+    def _convert_html(self, text: str) -> str:
+        if self.stream_converter is not None:
+            return self.stream_converter.convert(text)
+        doc = self._parse_html(text)
+        return self.visitor.visit(doc.find())
+
+    def _parse_html(self, text: str):
+        return BeautifulSoup(f'<div>{text}</div>', features='html.parser')
+
+    def _get_fragment(self, text: str):
         """
-        Render node's content to asciidoc markup
-        + render node's title as heading if @ref.node_level <= self.max_heading_level
-          otherwise it will be rendered as bullet point
-        + support render image content
-        + support render task type content
+        Return html @ref.text parsed into a fragment of the document model,
+        plain text is returned as a string
+        """
+        if not text:
+            return ''
+        value = convert_plain_fragment(text)
+        if value is not None:
+            return value
+        value = self.fragments.get(text)
+        if value is not None:
+            self.fragments.move_to_end(text)
+            return value
+        value = build_fragment(self._parse_html(text).find(), self.logger)
+        self.fragments[text] = value
+        if len(self.fragments) > self.cache.max_size:
+            self.fragments.popitem(last=False)
+        return value
+
+    def _render_node_content(self, node: dict, node_level: int, title: str):
+        """
+        Resolve node's content to a block of the document model
+        + node's title is a heading if @ref.node_level <= self.max_heading_level
+          otherwise it is a bullet point
+        + support image content
+        + support task type content
+        The block is rendered to asciidoc markup, unless several formats are
+        rendered: the block is then returned for `generate` to render it
+        with every backend.
         """
         note = node.get('note', {}).get('text', '')
-        note = self._convert_to_markup(note)
-        if len(note) > 0:
-            note = note + '\n\n'
+        if self.fragments is not None:
+            title = self._get_fragment(node.get('title', {}).get('text', ''))
+            note = self._get_fragment(note)
+        else:
+            note = self._convert_to_markup(note)
         if node_level <= self.max_heading_level:
-            content = f"\n{'=' * node_level} {title}\n\n{note}"
-            return content
-
-        attachment_name = self._get_attachment_name(node)
-        if attachment_name:
-            content = self._render_image_block(attachment_name, title)
-            return content
-
-        task_state = node.get('task', {}).get('state', 0)
-        if task_state == 1:
-            title = '[ ] ' + title
-        if task_state == 2:
-            title = '[x] ' + title
-        bullet_level = '*' * (node_level - self.max_heading_level)
-        content = f"{bullet_level} {title}\n{note}"
-        return content
+            if self.profiler is not None:
+                self.profiler.count('render', 'heading')
+            block = Block(HEADING, node_level, title, note)
+        else:
+            attachment_name = self._get_attachment_name(node)
+            if attachment_name:
+                self._add_attachment(attachment_name)
+                if self.profiler is not None:
+                    self.profiler.count('render', 'image')
+                block = Block(IMAGE, node_level - self.max_heading_level, title, attachment=attachment_name)
+            else:
+                task_state = node.get('task', {}).get('state', 0)
+                if self.profiler is not None:
+                    self.profiler.count('render', 'task' if task_state in (1, 2) else 'bullet')
+                block = Block(ITEM, node_level - self.max_heading_level, title, note, task_state)
+        if self.fragments is not None:
+            return block
+        return self.backends[0].render_block(block)
+
+    def _add_attachment(self, name):
+        self.attachments.add(name)
+        if self.pipeline is not None:
+            self.pipeline.sync(name)
+        if self._attachment_scopes:
+            self._attachment_scopes[-1].add(name)
 
     def _get_attachment_name(self, node):
         attachment_file_name = node.get('attachment', {}).get('fileName', '')
@@ -76,42 +347,106 @@ class BaseGenerator(object):
 
         return default_name
 
-    def _render_image_block(self, image_content, title):
-        title = title.strip()
-        if not title:
-            return f'''+
-image::{image_content}[pdfwidth=85%]
-'''
-        else:
-            return f'''+
-.{title.strip()}
-image::{image_content}[alt={title.strip()}, pdfwidth=85%]
-'''
-
-    def _generate_metadata(self, title, metadata, fp):
-        fp.write(f'''= {title}
-{self.author}
-{metadata}
-''')
-
-    def _get_output_file_path(self) -> str:
+    def _render_header(self, backend) -> str:
+        return backend.render_header(self._get_output_title(backend), self.author, self._get_output_date(),
+                                     self.max_heading_level)
+
+    def _get_output_file_path(self, extension: str = '.asciidoc') -> str:
         pass
 
-    def _get_output_title(self) -> str:
+    def _open_output(self, path: str, buffer_size: int = 1 << 20) -> FileSink:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        return FileSink(path, buffer_size, self.pipeline)
+
+    def _get_output_suffix(self) -> str:
+        """
+        Distinguish output files of mind maps on the same canvas
+        """
+        if self.map_index is None:
+            return ''
+        return f'_{self.map_index}'
+
+    def _get_output_title(self, backend) -> str:
+        """
+        Title of the document rendered by @ref.backend
+        """
         pass
 
-    def _get_output_metadata(self) -> str:
-        return f''':toc:
-:toclevels: {self.max_heading_level}
-:imagesdir: images
-:numbered:'''
+    def _get_output_date(self):
+        """
+        Date shown below the title, `None` to show none
+        """
+        return None
+
+    def render(self):
+        """
+        Yield rendered asciidoc chunks of the whole document in document order,
+        blocks of the document model without header when rendering several
+        formats
+        """
+        mn = self.data['mainNode']
+        if self.incremental:
+            output_dir, output_name = os.path.split(self._get_output_file_path())
+            file_path = os.path.join(output_dir, f'.{output_name}.hyracache')
+            context = self._get_incremental_context()
+            self.subtree_cache = self.subtree_caches.get(file_path)
+            if self.subtree_cache is None or self.subtree_cache.context != context:
+                self.subtree_cache = SubtreeCache(file_path, context)
+                self.subtree_caches[file_path] = self.subtree_cache
+            self.fingerprints = fingerprint_tree(mn, self.pruned_nodes)
+        if self.fragments is None:
+            yield self._render_header(self.backends[0])
+        if self.split_depth and self.jobs > 1 and self.subtree_cache is None:
+            yield from self._iter_split_node(mn)
+        else:
+            yield from self._iter_node(mn)
+        if self.subtree_cache is not None:
+            self.subtree_cache.save(self.fingerprints.values())
+            self.logger.info('subtree cache', self.subtree_cache.stats())
+
+    def generate(self, sink=None):
+        """
+        Render the document into @ref.sink, by default into the output file
+        """
+        if self.fragments is not None:
+            return self._generate_formats(sink)
+        if sink is None:
+            sink = self._open_output(self._get_output_file_path())
+        with sink:
+            if self.profiler is None:
+                for chunk in self.render():
+                    sink.write(chunk)
+                return
+            write = self.profiler.timed('write', sink.write)
+            for chunk in self.render():
+                write(chunk)
+                self.profiler.add_bytes('written', len(chunk.encode('utf-8')))
+            self.profiler.timed('write', sink.flush)()
 
-    def generate(self):
-        output_file_path = self._get_output_file_path()
-        with open(output_file_path, 'wt') as fp:
-            self._generate_metadata(self._get_output_title(), self._get_output_metadata(), fp)
-            mn = self.data['mainNode']
-            self._visit_node(mn, fp)
+    def _generate_formats(self, sink=None):
+        """
+        Render the document model once into one output file per backend, into
+        @ref.sink when there is a single backend
+        """
+        if sink is not None:
+            if len(self.backends) > 1:
+                raise ValueError('only a single format can be rendered into a sink')
+            sinks = [sink]
+        else:
+            sinks = [self._open_output(self._get_output_file_path(x.extension)) for x in self.backends]
+        outputs = list(zip(self.backends, sinks))
+        try:
+            for backend, x in outputs:
+                x.write(self._render_header(backend))
+            for block in self.render():
+                for backend, x in outputs:
+                    chunk = backend.render_block(block)
+                    x.write(chunk)
+                    if self.profiler is not None:
+                        self.profiler.add_bytes('written', len(chunk.encode('utf-8')))
+        finally:
+            for x in sinks:
+                x.close()
 
 
 class Generator(BaseGenerator):
@@ -125,50 +460,150 @@ class Generator(BaseGenerator):
         self.weeks = [f'W{prev_week}', f'W{self.current_week}']
         self.quarter = f'Q{configs.get("current_quarter")}'
         self.prefix = configs.get('prefix')
+        # date shown in the header, a date within the week by default today
+        self.date = configs.get('date') or datetime.date.today()
         self.visitor = AsciidocVisitor(self.logger)
 
         self.logger.info(self.weeks, self.quarter)
 
-    def _visit_node(self, node, fp, node_level=1):
-        title = node.get('title', {}).get('text', '')
-        title = self._convert_to_markup(title)
-        if title.startswith('[S]'):
-            # Skip this node and its children
-            return
-        m = re.search(r'^W\d+', title)
+    def _get_incremental_context(self) -> str:
+        context = super(Generator, self)._get_incremental_context()
+        return f'{context}:{self.weeks}:{self.quarter}'
+
+    def _accept_node(self, node: dict, title: str) -> bool:
+        if not super(Generator, self)._accept_node(node, title):
+            return False
+        m = week_re.search(title)
         if m is not None:
             week_num = m.group(0)
             if week_num not in self.weeks:
                 self.logger.info('skip', title)
-                return
-        m = re.search(r'^Q\d', title)
+                return False
+        m = quarter_re.search(title)
         if m is not None:
             quarter = m.group(0)
             if quarter != self.quarter:
                 self.logger.info('skip quarter', title)
-                return
+                return False
+        return True
 
-        if node_level > 1:
-            content = self._render_node_content(node, node_level, title)
-            fp.write(content)
+    def render(self):
+        # out-of-range week and quarter branches are known from raw titles
+        self.label_index = LabelIndex(self.data['mainNode'], self._convert_to_markup)
+        self.pruned_nodes = self.label_index.pruned(self.weeks, self.quarter)
+        yield from super(Generator, self).render()
 
-        subnodes = node.get('subnodes', [])
-        for x in subnodes:
-            self._visit_node(x, fp, node_level + 1)
-
-    def _get_output_file_path(self):
-        file_name = '_'.join([self.prefix, 'Notes', f'W{self.current_week}.asciidoc'])
+    def _get_output_file_path(self, extension: str = '.asciidoc'):
+        file_name = '_'.join([self.prefix, 'Notes', f'W{self.current_week}{self._get_output_suffix()}{extension}'])
         file_path = os.path.join(self.output_dir, file_name)
         return file_path
 
-    def _get_output_title(self) -> str:
+    def _get_output_title(self, backend) -> str:
         return f'{self.prefix} Notes: W{self.current_week}'
 
-    def _get_output_metadata(self) -> str:
-        my_date = datetime.date.today()
-        return f'''{my_date.strftime('%Y-%m-%d')}
-{super(Generator, self)._get_output_metadata()}
-'''
+    def _get_output_date(self):
+        return self.date.strftime('%Y-%m-%d')
+
+
+class WeeklyArchive(object):
+    """
+    Render weekly notes of several weeks from a single walk of the mind map.
+    @ref.configs are those of `Generator` with `weeks`, a list of
+    `(previous_week, current_week, current_quarter, date)`, instead of a
+    single week.
+
+    Nodes are converted once and written to the notes of every week whose
+    week and quarter labels accept them, so rendering a whole year costs
+    about a single walk plus writing the outputs. Incremental mode is not
+    supported.
+    """
+
+    def __init__(self, data, configs):
+        self.data = data
+        configs = dict(configs, incremental=False)
+        self.generators = []
+        for previous_week, current_week, current_quarter, date in configs['weeks']:
+            # only the first generator converts content, the others give
+            # output paths, headers and labels of their week
+            self.generators.append(Generator(data, dict(configs, previous_week=previous_week,
+                                                        current_week=current_week,
+                                                        current_quarter=current_quarter, date=date,
+                                                        profiler=None if self.generators else configs.get('profiler'))))
+        self.main = self.generators[0]
+        self.logger = self.main.logger
+
+    @property
+    def attachments(self) -> set:
+        return self.main.attachments
+
+    def _filter_weeks(self, title: str, weeks: tuple) -> tuple:
+        """
+        Return indexes among @ref.weeks of generators accepting a node titled
+        @ref.title, like `Generator._accept_node`
+        """
+        m = week_re.search(title)
+        if m is not None:
+            weeks = tuple(i for i in weeks if m.group(0) in self.generators[i].weeks)
+        m = quarter_re.search(title)
+        if m is not None:
+            weeks = tuple(i for i in weeks if self.generators[i].quarter == m.group(0))
+        return weeks
+
+    def render(self):
+        """
+        Yield rendered chunks in document order along with indexes of the
+        generators they belong to
+        """
+        main = self.main
+        root = self.data['mainNode']
+        index = LabelIndex(root, main._convert_to_markup)
+        pruned = index.pruned_all([(x.weeks, x.quarter) for x in self.generators])
+        stack = [(root, 1, tuple(range(len(self.generators))))]
+        while stack:
+            node, node_level, weeks = stack.pop()
+            if id(node) in pruned:
+                self.logger.info(*pruned[id(node)])
+                continue
+            title = main._convert_to_markup(node.get('title', {}).get('text', ''))
+            if not super(Generator, main)._accept_node(node, title):
+                continue
+            weeks = self._filter_weeks(title, weeks)
+            if not weeks:
+                self.logger.info('skip', title)
+                continue
+
+            stack.extend((x, node_level + 1, weeks) for x in reversed(node.get('subnodes', [])))
+            if node_level <= 1:
+                continue
+            yield main._render_node_content(node, node_level, title), weeks
+
+    def generate(self, sink=None):
+        """
+        Render notes of every week into their output files at the same time
+        """
+        if sink is not None:
+            raise ValueError('notes of several weeks can only be written to files')
+        backends = self.main.backends
+        # smaller buffers, there is an open file per week and format
+        outputs = [[self.main._open_output(x._get_output_file_path(b.extension), 1 << 16) for b in backends]
+                   for x in self.generators]
+        profiler = self.main.profiler
+        try:
+            for generator, sinks in zip(self.generators, outputs):
+                for backend, x in zip(backends, sinks):
+                    x.write(generator._render_header(backend))
+            for content, weeks in self.render():
+                for j, backend in enumerate(backends):
+                    # blocks of the document model when rendering several formats
+                    chunk = content if type(content) is str else backend.render_block(content)
+                    for i in weeks:
+                        outputs[i][j].write(chunk)
+                    if profiler is not None:
+                        profiler.add_bytes('written', len(chunk.encode('utf-8')) * len(weeks))
+        finally:
+            for sinks in outputs:
+                for x in sinks:
+                    x.close()
 
 
 class SimpleGenerator(BaseGenerator):
@@ -179,29 +614,17 @@ class SimpleGenerator(BaseGenerator):
         super(SimpleGenerator, self).__init__(data, configs)
         self.output_basename = os.path.splitext(os.path.basename(configs.get('input')))[0]
 
-    def _visit_node(self, node, fp, node_level=1):
-        title = node.get('title', {}).get('text', '')
-        title = self._convert_to_markup(title)
-        if title.startswith('[S]'):
-            # Skip this node and its children
-            return
-
-        if node_level > 1:
-            content = self._render_node_content(node, node_level, title)
-            fp.write(content)
-
-        subnodes = node.get('subnodes', [])
-        for x in subnodes:
-            self._visit_node(x, fp, node_level + 1)
-
-    def _get_output_file_path(self):
-        file_name = f'{self.output_basename}.asciidoc'
+    def _get_output_file_path(self, extension: str = '.asciidoc'):
+        file_name = f'{self.output_basename}{self._get_output_suffix()}{extension}'
         file_path = os.path.join(self.output_dir, file_name)
         return file_path
 
-    def _get_output_title(self) -> str:
+    def _get_output_title(self, backend) -> str:
         mn = self.data['mainNode']
         title = mn.get('title', {}).get('text', '')
+        if self.fragments is not None:
+            # with the inline markup of @ref.backend
+            return backend.render(self._get_fragment(title))
         title = self._convert_to_markup(title)
         return title
 
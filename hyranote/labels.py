@@ -0,0 +1,109 @@
+import re
+
+from hyranote.asciidoc_visitor import convert_plain_fragment
+
+week_re = re.compile(r'^W\d+')
+quarter_re = re.compile(r'^Q\d')
+_tag_re = re.compile(r'<[^>]*>')
+
+
+class LabelIndex(object):
+    """
+    Index of week and quarter labelled subtrees of a mind map built from raw
+    title text.
+
+    Labels are the `W<n>` and `Q<n>` prefixes of converted titles. Plain titles
+    are read without parsing, titles with markup are only converted with
+    @ref.convert when their visible text may start with a label. The walk does
+    not descend into week subtrees, so building the index costs the size of the
+    map outside of weeks rather than the size of its history, weeks inside a
+    quarter are only indexed when that quarter is looked up.
+    """
+
+    def __init__(self, root: dict, convert):
+        self.convert = convert
+        # (quarter, week) -> list of (node, title) of labelled subtree roots,
+        # quarter nodes are stored with `None` week
+        self.subtrees = {}
+        self._expanded = set()
+        self._build(root)
+
+    def _get_label_title(self, text: str):
+        """
+        Return converted title if it may carry a label, `None` otherwise
+        """
+        if not text:
+            return None
+        title = convert_plain_fragment(text)
+        if title is None:
+            visible = _tag_re.sub('', text).lstrip()
+            if visible[:1] not in ('W', 'Q', '&'):
+                return None
+            title = self.convert(text)
+        if title[:1] not in ('W', 'Q'):
+            return None
+        return title
+
+    def _build(self, root: dict, quarter=None):
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            title = self._get_label_title(node.get('title', {}).get('text', ''))
+            if title is not None:
+                m = week_re.search(title)
+                if m is not None:
+                    self.subtrees.setdefault((quarter, m.group(0)), []).append((node, title))
+                    continue
+                m = quarter_re.search(title)
+                if m is not None and quarter is None:
+                    # weeks of a quarter are only indexed once it is selected
+                    self.subtrees.setdefault((m.group(0), None), []).append((node, title))
+                    continue
+            stack.extend(node.get('subnodes', []))
+
+    def _expand_quarter(self, quarter):
+        if quarter in self._expanded:
+            return
+        self._expanded.add(quarter)
+        for node, _ in self.subtrees.get((quarter, None), []):
+            for x in node.get('subnodes', []):
+                self._build(x, quarter)
+
+    def get(self, quarter, week) -> list:
+        """
+        Return labelled subtree roots of @ref.week within @ref.quarter
+        """
+        if quarter is not None:
+            self._expand_quarter(quarter)
+        return [node for node, _ in self.subtrees.get((quarter, week), [])]
+
+    def pruned(self, weeks, quarter) -> dict:
+        """
+        Return labelled nodes outside of @ref.weeks and @ref.quarter, mapped
+        from `id()` of the node to the log message of skipping it
+        """
+        self._expand_quarter(quarter)
+        nodes = {}
+        for (node_quarter, week), items in self.subtrees.items():
+            if week is None:
+                if node_quarter == quarter:
+                    continue
+                message = 'skip quarter'
+            elif week in weeks:
+                continue
+            else:
+                message = 'skip'
+            for node, title in items:
+                nodes[id(node)] = (message, title)
+        return nodes
+
+    def pruned_all(self, selections) -> dict:
+        """
+        Return labelled nodes which none of @ref.selections, a list of
+        `(weeks, quarter)`, renders, like `pruned`
+        """
+        nodes = None
+        for weeks, quarter in selections:
+            x = self.pruned(weeks, quarter)
+            nodes = x if nodes is None else {k: v for k, v in nodes.items() if k in x}
+        return nodes or {}
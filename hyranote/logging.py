@@ -9,8 +9,10 @@ def _wrap_with_color_code(code: str):
 
 
 class Logging(object):
-    def __init__(self, level: int):
+    def __init__(self, level: int, stream=None):
         self.log_level = level
+        self.stream = stream
+        self.tallies = {}
 
     LOG_INFO = 1
     LOG_WARN = 2
@@ -26,13 +28,37 @@ class Logging(object):
 
     def error(self, msg, *args, **kwargs):
         if self.log_level <= self.LOG_ERROR:
-            print(self.red("[ERROR]"), msg, *args, **kwargs)
+            print(self.red("[ERROR]"), msg, *args, file=self.stream, **kwargs)
 
     def warn(self, msg, *args, **kwargs):
         if self.log_level <= self.LOG_WARN:
-            print(self.yellow("[WARN]"), msg, *args, **kwargs)
+            print(self.yellow("[WARN]"), msg, *args, file=self.stream, **kwargs)
 
     def info(self, msg, *args, **kwargs):
         if self.log_level <= self.LOG_INFO:
-            print(self.green("[INFO]"), msg, *args, **kwargs)
+            print(self.green("[INFO]"), msg, *args, file=self.stream, **kwargs)
 
+    def tally(self, msg, key):
+        """
+        Count a repeated warning instead of printing it, counted warnings are
+        printed once by `report_tallies`
+        """
+        if self.log_level > self.LOG_WARN:
+            return
+        counts = self.tallies.setdefault(msg, {})
+        counts[key] = counts.get(key, 0) + 1
+
+    def merge_tallies(self, tallies: dict):
+        """
+        Add warnings counted by another logger, e.g. of a worker process
+        """
+        for msg, counts in tallies.items():
+            mine = self.tallies.setdefault(msg, {})
+            for key, count in counts.items():
+                mine[key] = mine.get(key, 0) + count
+
+    def report_tallies(self):
+        for msg, counts in self.tallies.items():
+            summary = ', '.join(f'{key} ({count})' for key, count in sorted(counts.items()))
+            self.warn(msg, summary)
+        self.tallies = {}
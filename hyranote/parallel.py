@@ -0,0 +1,117 @@
+import io
+
+from hyranote.cache import ConversionCache
+from hyranote.profiling import Profiler
+from hyranote.sinks import MemorySink, StdoutSink
+
+# conversion cache of a worker process, kept warm across mind maps
+_worker_cache = None
+
+
+def init_worker_cache(cache_version, cache_dir):
+    """
+    Initializer of worker processes, loads the conversion cache once per worker
+    """
+    global _worker_cache
+    _worker_cache = ConversionCache(cache_version, cache_dir=cache_dir)
+
+
+def get_worker_cache() -> ConversionCache:
+    return _worker_cache
+
+
+def _render_worker(task):
+    """
+    Render one mind map in a worker process. Log messages and, when writing
+    to standard output, the rendered document are returned to the parent so
+    they can be emitted in the order of the mind maps.
+    """
+    generator_class, main_node, configs, to_stdout, profile = task
+    log = io.StringIO()
+    hits, misses = _worker_cache.hits, _worker_cache.misses
+    profiler = Profiler() if profile else None
+    generator = generator_class(main_node, dict(configs, log_stream=log, cache=_worker_cache, profiler=profiler))
+    sink = MemorySink() if to_stdout else None
+    generator.generate(sink)
+    content = sink.getvalue() if to_stdout else None
+    stats = {'hits': _worker_cache.hits - hits, 'misses': _worker_cache.misses - misses}
+    report = profiler.report() if profiler is not None else None
+    return (log.getvalue(), content, generator.attachments, generator.logger.tallies, _worker_cache.take_added(),
+            stats, report)
+
+
+def render_subtree(task):
+    """
+    Render a subtree of a mind map in a worker process, for
+    `BaseGenerator._iter_split_node`. Rendered chunks are returned joined
+    unless they are blocks of the document model, along with log messages,
+    attachments, counted warnings, new conversions and the profiler report.
+    """
+    generator_class, configs, node, node_level, profile = task
+    log = io.StringIO()
+    hits, misses = _worker_cache.hits, _worker_cache.misses
+    profiler = Profiler() if profile else None
+    generator = generator_class({'mainNode': node}, dict(configs, log_stream=log, cache=_worker_cache,
+                                                         profiler=profiler))
+    # messages of creating the generator were printed by the parent already
+    log.seek(0)
+    log.truncate()
+    chunks = list(generator._iter_node(node, node_level))
+    if generator.fragments is None:
+        chunks = [''.join(chunks)]
+    stats = {'hits': _worker_cache.hits - hits, 'misses': _worker_cache.misses - misses}
+    report = profiler.report() if profiler is not None else None
+    return (chunks, log.getvalue(), sorted(generator.attachments), generator.logger.tallies,
+            _worker_cache.take_added(), stats, report)
+
+
+def render_mind_maps(generator_class, tasks, cache, jobs=1, to_stdout=False, log_stream=None, subtree_caches=None,
+                     profiler=None, pipeline=None, logger=None):
+    """
+    Render mind maps described by @ref.tasks, a list of `(main_node, configs)`.
+    With @ref.jobs > 1 each mind map is rendered in a worker process, outputs
+    and log messages are still emitted in the order of @ref.tasks and
+    conversions done by workers are merged into @ref.cache. Incremental
+    @ref.subtree_caches are only kept when rendering in this process, reports
+    of workers are merged into @ref.profiler. A single mind map rendered
+    with @ref.jobs > 1 has its subtrees rendered by worker processes when
+    its configs give a `split_depth`. Attachments are synced by
+    @ref.pipeline as soon as a mind map referencing them is rendered, output
+    files of this process are written by it. Warnings counted while
+    rendering are merged into @ref.logger, to be reported once per run.
+    Return names of attachments referenced by the rendered documents.
+    """
+    attachments = set()
+    if jobs <= 1 or len(tasks) <= 1:
+        for main_node, configs in tasks:
+            generator = generator_class(main_node, dict(configs, log_stream=log_stream, cache=cache,
+                                                        subtree_caches=subtree_caches if subtree_caches is not None else {},
+                                                        profiler=profiler, pipeline=pipeline, jobs=jobs))
+            generator.generate(StdoutSink() if to_stdout else None)
+            attachments.update(generator.attachments)
+            if logger is not None:
+                logger.merge_tallies(generator.logger.tallies)
+        return attachments
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    worker_tasks = [(generator_class, main_node, configs, to_stdout, profiler is not None)
+                    for main_node, configs in tasks]
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker_cache,
+                             initargs=(cache.version, cache.cache_dir)) as executor:
+        for log, content, names, tallies, added, stats, report in executor.map(_render_worker, worker_tasks):
+            if log:
+                print(log, end='', file=log_stream)
+            if content is not None:
+                with StdoutSink() as sink:
+                    sink.write(content)
+            cache.merge(added, stats)
+            attachments.update(names)
+            if logger is not None:
+                logger.merge_tallies(tallies)
+            if pipeline is not None:
+                for x in sorted(names):
+                    pipeline.sync(x)
+            if report is not None:
+                profiler.merge(report)
+    return attachments
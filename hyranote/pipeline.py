@@ -0,0 +1,112 @@
+"""
+Background I/O of a run: resources are synced and output files are written
+by threads while the main thread loads and renders mind maps.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from hyranote.hutil import ResourceSync
+from hyranote.profiling import profile_stage
+
+
+class IOPipeline(object):
+    """
+    Run I/O of a run in background threads. Attachments given to `sync` are
+    copied from the MindNode file @ref.input_dir into @ref.images_dir by a
+    thread as soon as rendered content references them, blocks given to
+    `write` are written in order by another thread. At most
+    @ref.max_blocks blocks wait to be written so memory stays bounded when
+    rendering outpaces the disk.
+
+    The first error of a background task is raised by the next call from the
+    main thread, at the latest by `close`. Used as a context manager, copies
+    not started yet are cancelled when the body raises, while writes are
+    completed so that output files get closed.
+    """
+
+    def __init__(self, input_dir: str, images_dir: str, profiler=None, max_blocks: int = 8):
+        # output folder of the run, @ref.images_dir is only created by a copy
+        os.makedirs(os.path.dirname(os.path.abspath(images_dir)), exist_ok=True)
+        self.resources = ResourceSync(input_dir, images_dir)
+        self.profiler = profiler
+        self._names = set()
+        self._futures = []
+        self._slots = threading.BoundedSemaphore(max_blocks)
+        self._copier = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hyranote-sync')
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='hyranote-write')
+
+    @property
+    def stats(self) -> dict:
+        return self.resources.stats
+
+    def _check(self):
+        """
+        Raise the first error of finished background tasks
+        """
+        pending = []
+        for x in self._futures:
+            if not x.done():
+                pending.append(x)
+            elif not x.cancelled() and x.exception() is not None:
+                raise x.exception()
+        self._futures = pending
+
+    def sync(self, name: str):
+        """
+        Copy attachment @ref.name in the background, once per run
+        """
+        if name in self._names:
+            return
+        self._check()
+        self._names.add(name)
+        self._futures.append(self._copier.submit(self._copy, name))
+
+    def _copy(self, name: str):
+        with profile_stage(self.profiler, 'sync_resources'):
+            self.resources.add(name)
+
+    def write(self, stream, block: str):
+        """
+        Write @ref.block to @ref.stream in the background, wait while too
+        many blocks are pending
+        """
+        self._check()
+        self._slots.acquire()
+        try:
+            self._futures.append(self._writer.submit(self._write, stream, block))
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _write(self, stream, block: str):
+        try:
+            with profile_stage(self.profiler, 'flush'):
+                stream.write(block)
+        finally:
+            self._slots.release()
+
+    def close_stream(self, stream):
+        """
+        Close @ref.stream once the blocks written before are written
+        """
+        self._futures.append(self._writer.submit(stream.close))
+
+    def close(self):
+        """
+        Wait for background tasks to finish, raise the first error
+        """
+        self._copier.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        self._check()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            # errors of background tasks are hidden by the one being raised
+            self._copier.shutdown(wait=True, cancel_futures=True)
+            self._writer.shutdown(wait=True)
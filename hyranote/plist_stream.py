@@ -0,0 +1,274 @@
+import base64
+import datetime
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from collections.abc import Sequence
+from xml.parsers import expat
+
+_END_ARRAY = b'</array>'
+_VALUE_TAGS = {'key', 'string', 'integer', 'real', 'date', 'data'}
+
+
+class LazySubnodes(Sequence):
+    """
+    Subnodes of a mind map node which are parsed from `contents.xml` on first
+    access. Parsed nodes are kept so that every access returns the same dicts.
+    Pickling materializes the whole subtree.
+    """
+    __slots__ = ('_document', '_start', '_end', '_items')
+
+    def __init__(self, document, start: int, end: int = None, items: list = None):
+        self._document = document
+        self._start = start
+        self._end = end
+        self._items = items
+
+    @property
+    def loaded(self) -> bool:
+        return self._items is not None
+
+    def _load(self) -> list:
+        if self._items is None:
+            self._items = self._document.load_array(self._start, self._end)
+        return self._items
+
+    def detach(self) -> list:
+        """
+        Return subnodes without keeping them, so that walking a large tree
+        once doesn't hold all of its nodes in memory
+        """
+        if self._items is not None:
+            return self._items
+        return self._document.load_array(self._start, self._end)
+
+    def __getitem__(self, index):
+        return self._load()[index]
+
+    def __len__(self):
+        return len(self._load())
+
+    def __iter__(self):
+        return iter(self._load())
+
+    def __reversed__(self):
+        return reversed(self._load())
+
+    def __eq__(self, other):
+        return list(self) == list(other)
+
+    def __repr__(self):
+        if self._items is None:
+            return f'<LazySubnodes {self._start}:{self._end}>'
+        return repr(self._items)
+
+    def __reduce__(self):
+        return list, (list(self._load()),)
+
+
+class _Builder(object):
+    """
+    Build plist values from expat events, `subnodes` arrays below the root
+    value become `LazySubnodes` instead of being built.
+
+    When scanning a whole document, byte ranges of all non-empty `subnodes`
+    arrays are appended to @ref.index. When loading a range, nested arrays
+    were replaced by `<lazy/>` placeholders which take their ranges in order
+    from @ref.ranges.
+    """
+
+    def __init__(self, document, parser, index=None, ranges=None):
+        self.document = document
+        self.parser = parser
+        self.index = index
+        self.ranges = ranges
+        self.root = None
+        self.stack = []
+        self.keys = []
+        self.key = None
+        self.text = None
+        # element depth inside a skipped `subnodes` array and the arrays open
+        # in it as [index position, depth, has children, lazy subnodes]
+        self.depth = 0
+        self.skipped = []
+
+        parser.StartElementHandler = self.start
+        parser.EndElementHandler = self.end
+        parser.CharacterDataHandler = self.data
+
+    def data(self, text):
+        if self.text is not None:
+            self.text.append(text)
+
+    def start(self, tag, attrs):
+        if self.skipped:
+            self.depth += 1
+            self.skipped[-1][2] = True
+            if tag == 'array' and self.key == 'subnodes':
+                self._open_skipped(None)
+            self.text = [] if tag == 'key' else None
+            self.key = None
+            return
+
+        if tag == 'lazy':
+            start, end = self.ranges.popleft()
+            self._add(LazySubnodes(self.document, start, end))
+        elif tag == 'array' and self.index is not None and self.key == 'subnodes' and self.stack:
+            lazy = LazySubnodes(self.document, self.parser.CurrentByteIndex)
+            self._add(lazy)
+            self.depth = 1
+            self._open_skipped(lazy)
+        elif tag == 'dict':
+            self._push({})
+        elif tag == 'array':
+            self._push([])
+        elif tag in _VALUE_TAGS:
+            self.text = []
+        self.key = None
+
+    def _open_skipped(self, lazy):
+        self.skipped.append([len(self.index), self.depth, False, lazy])
+        self.index.append([self.parser.CurrentByteIndex, None])
+
+    def _close_skipped(self):
+        position, _, has_children, lazy = self.skipped.pop()
+        entry = self.index[position]
+        if has_children:
+            entry[1] = self.parser.CurrentByteIndex + len(_END_ARRAY)
+        else:
+            entry[0] = None
+        if lazy is not None:
+            if has_children:
+                lazy._end = entry[1]
+            else:
+                lazy._items = []
+
+    def end(self, tag):
+        if self.skipped:
+            if tag == 'key':
+                self.key = ''.join(self.text)
+                self.text = None
+            elif tag == 'array' and self.skipped[-1][1] == self.depth:
+                self._close_skipped()
+            self.depth -= 1
+            return
+
+        if tag == 'key':
+            self.key = ''.join(self.text)
+            self.keys.append(self.key)
+            self.text = None
+            return
+        if tag in ('dict', 'array'):
+            self.stack.pop()
+            return
+        if tag == 'string':
+            value = ''.join(self.text)
+        elif tag == 'integer':
+            value = int(''.join(self.text))
+        elif tag == 'real':
+            value = float(''.join(self.text))
+        elif tag == 'true':
+            value = True
+        elif tag == 'false':
+            value = False
+        elif tag == 'date':
+            value = datetime.datetime.strptime(''.join(self.text), '%Y-%m-%dT%H:%M:%SZ')
+        elif tag == 'data':
+            value = base64.b64decode(''.join(self.text).encode('ascii'))
+        else:
+            return
+        self.text = None
+        self._add(value)
+
+    def _push(self, value):
+        self._add(value)
+        self.stack.append(value)
+
+    def _add(self, value):
+        if not self.stack:
+            self.root = value
+            return
+        container = self.stack[-1]
+        if isinstance(container, dict):
+            container[self.keys.pop()] = value
+        else:
+            container.append(value)
+
+
+class LazyDocument(object):
+    """
+    MindNode `contents.xml` parsed on demand.
+
+    A first pass streams the file through expat and builds the canvas without
+    the children of any node, only byte ranges of `subnodes` arrays are kept.
+    Subnodes are then parsed from their range when first accessed, so memory
+    and parse time follow the part of the mind maps actually walked, subtrees
+    skipped by the generator are never built.
+    """
+    chunk_size = 1 << 20
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fd = os.open(path, os.O_RDONLY)
+        index = []
+        parser = expat.ParserCreate()
+        builder = _Builder(self, parser, index=index)
+        offset = 0
+        while True:
+            chunk = os.pread(self._fd, self.chunk_size, offset)
+            offset += len(chunk)
+            parser.Parse(chunk, not chunk)
+            if not chunk:
+                break
+        self.data = builder.root
+        index = [x for x in index if x[0] is not None]
+        self._starts = array('q', (x[0] for x in index))
+        self._ends = array('q', (x[1] for x in index))
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+    def __del__(self):
+        self.close()
+
+    def _iter_range(self, start: int, end: int):
+        while start < end:
+            chunk = os.pread(self._fd, min(self.chunk_size, end - start), start)
+            if not chunk:
+                raise EOFError(f'{self.path} changed while loading')
+            start += len(chunk)
+            yield chunk
+
+    def load_array(self, start: int, end: int) -> list:
+        """
+        Parse `subnodes` array at byte range [@ref.start, @ref.end), nested
+        `subnodes` arrays are left lazy
+        """
+        parser = expat.ParserCreate('utf-8')
+        ranges = deque()
+        builder = _Builder(self, parser, ranges=ranges)
+        position = start
+        i = bisect_right(self._starts, start)
+        while i < len(self._starts) and self._starts[i] < end:
+            nested_start, nested_end = self._starts[i], self._ends[i]
+            for chunk in self._iter_range(position, nested_start):
+                parser.Parse(chunk, False)
+            ranges.append((nested_start, nested_end))
+            parser.Parse(b'<lazy/>', False)
+            position = nested_end
+            i = bisect_left(self._starts, nested_end, i)
+        for chunk in self._iter_range(position, end):
+            parser.Parse(chunk, False)
+        parser.Parse(b'', True)
+        return builder.root
+
+
+def load_lazy_contents(input_dir: str) -> dict:
+    """
+    Load `contents.xml` of MindNode file @ref.input_dir with lazily parsed
+    subnodes, see `LazyDocument`
+    """
+    return LazyDocument(os.path.join(input_dir, 'contents.xml')).data
@@ -0,0 +1,163 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from types import GeneratorType
+
+
+@contextmanager
+def profile_stage(profiler, name: str):
+    """
+    Record stage @ref.name with @ref.profiler unless it is `None`
+    """
+    if profiler is None:
+        yield
+    else:
+        with profiler.stage(name):
+            yield
+
+
+class Profiler(object):
+    """
+    Collect wall and CPU time per stage and per html visitor handler, counts
+    of nodes and bytes written and copied during a run.
+
+    Profiling is opt-in: code paths only call into a profiler when one is
+    configured, and visitor handlers are wrapped by `instrument`, so there is
+    no cost when profiling is disabled. Handler times exclude time spent in
+    child elements. CPU time is that of the thread running a stage, stages
+    of background I/O threads overlap those of the main thread, tables are
+    updated under a lock as these threads record into the same profiler.
+    """
+
+    def __init__(self):
+        # name -> [wall, cpu, calls]
+        self.stages = {}
+        self.handlers = {}
+        self.counts = {}
+        self.bytes = {}
+        self._lock = threading.Lock()
+
+    def _add(self, table, name, wall, cpu, calls=1):
+        with self._lock:
+            entry = table.get(name)
+            if entry is None:
+                table[name] = [wall, cpu, calls]
+            else:
+                entry[0] += wall
+                entry[1] += cpu
+                entry[2] += calls
+
+    @contextmanager
+    def stage(self, name: str):
+        start, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self._add(self.stages, name, time.perf_counter() - start, time.thread_time() - start_cpu)
+
+    def timed(self, name: str, f):
+        """
+        Return @ref.f recording its calls as stage @ref.name
+        """
+        def inner(*args, **kwargs):
+            with self.stage(name):
+                return f(*args, **kwargs)
+
+        return inner
+
+    def count(self, category: str, key: str, n: int = 1):
+        with self._lock:
+            counts = self.counts.setdefault(category, {})
+            counts[key] = counts.get(key, 0) + n
+
+    def add_bytes(self, kind: str, n: int):
+        with self._lock:
+            self.bytes[kind] = self.bytes.get(kind, 0) + n
+
+    def instrument(self, visitor):
+        """
+        Wrap visitor functions of @ref.visitor, either a `NodeVisitor` or a
+        streaming converter, to record time and calls per tag
+        """
+        visitor._tag_visitors = {tag: self._timed_handler(tag, f) for tag, f in visitor._tag_visitors.items()}
+
+    def _timed_handler(self, tag, f):
+        def handler(*args, **kwargs):
+            self.count('tags', tag)
+            start, start_cpu = time.perf_counter(), time.thread_time()
+            value = f(*args, **kwargs)
+            wall, cpu = time.perf_counter() - start, time.thread_time() - start_cpu
+            if type(value) is not GeneratorType:
+                self._add(self.handlers, tag, wall, cpu)
+                return value
+            return self._drive(tag, value, wall, cpu)
+
+        return handler
+
+    def _drive(self, tag, gen, wall, cpu):
+        """
+        Forward requests of generator handler @ref.gen to the visitor and
+        only time the handler's own steps
+        """
+        value = None
+        error = None
+        try:
+            while True:
+                start, start_cpu = time.perf_counter(), time.thread_time()
+                try:
+                    if error is not None:
+                        request = gen.throw(error)
+                        error = None
+                    else:
+                        request = gen.send(value)
+                except StopIteration as e:
+                    return e.value
+                finally:
+                    wall += time.perf_counter() - start
+                    cpu += time.thread_time() - start_cpu
+                try:
+                    value = yield request
+                except Exception as e:
+                    error = e
+                    value = None
+        finally:
+            self._add(self.handlers, tag, wall, cpu)
+
+    def merge(self, report: dict):
+        """
+        Merge a report collected by another profiler, e.g. of a worker process
+        """
+        for table, name in ((self.stages, 'stages'), (self.handlers, 'handlers')):
+            for key, x in report.get(name, {}).items():
+                self._add(table, key, x['wall'], x['cpu'], x['calls'])
+        for category, counts in report.get('counts', {}).items():
+            for key, n in counts.items():
+                self.count(category, key, n)
+        for kind, n in report.get('bytes', {}).items():
+            self.add_bytes(kind, n)
+
+    def report(self) -> dict:
+        def timings(table):
+            return {k: {'wall': v[0], 'cpu': v[1], 'calls': v[2]}
+                    for k, v in sorted(table.items(), key=lambda x: -x[1][0])}
+
+        with self._lock:
+            return {
+                'stages': timings(self.stages),
+                'handlers': timings(self.handlers),
+                'counts': {k: dict(v) for k, v in self.counts.items()},
+                'bytes': dict(self.bytes),
+            }
+
+    def write(self, path: str):
+        """
+        Write the JSON report to @ref.path, `-` for standard error
+        """
+        if path == '-':
+            json.dump(self.report(), sys.stderr, indent=2)
+            print(file=sys.stderr)
+            return
+        with open(path, 'wt') as fp:
+            json.dump(self.report(), fp, indent=2)
@@ -0,0 +1,377 @@
+"""
+Long running conversion service: html fragments and MindNode files are
+converted on request over local HTTP or a Unix socket, while parsed
+documents and converted markup stay in memory between requests.
+
+    POST /convert?format=adoc   body is an html fragment, returns its markup
+    POST /render                body is JSON `{"path": ..., "generator": "simple" | "weekly",
+                                "format": "adoc", "author": "", "prefix": ""}`, returns the document
+    GET  /metrics               request latency, cache and document counters as JSON
+
+Over TCP, requests whose Host header names neither localhost nor the address
+listened on are rejected, so web pages can't reach the service through DNS
+rebinding.
+"""
+import json
+import os
+import socket
+import socketserver
+import stat
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from hyranote.backends import backends
+from hyranote.cache import ConversionCache
+from hyranote.cmd_generate import get_current_week
+from hyranote.hyranote import BaseGenerator, Generator, SimpleGenerator, converters
+from hyranote.logging import Logging
+from hyranote.sinks import MemorySink
+from hyranote.snapshot import load_contents
+
+# largest request body accepted
+MAX_BODY_SIZE = 64 << 20
+
+generators = {
+    'simple': SimpleGenerator,
+    'weekly': Generator,
+}
+
+
+class RequestError(Exception):
+    """
+    Invalid request, answered with HTTP @ref.status
+    """
+
+    def __init__(self, status: int, message: str):
+        super(RequestError, self).__init__(message)
+        self.status = status
+
+
+class SharedConversionCache(ConversionCache):
+    """
+    Conversion cache shared by the threads of concurrent requests
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._lock = threading.RLock()
+        super(SharedConversionCache, self).__init__(*args, **kwargs)
+
+    def get(self, text: str):
+        with self._lock:
+            return super(SharedConversionCache, self).get(text)
+
+    def put(self, text: str, value: str):
+        with self._lock:
+            super(SharedConversionCache, self).put(text, value)
+
+    def take_added(self) -> dict:
+        with self._lock:
+            return super(SharedConversionCache, self).take_added()
+
+    def merge(self, entries: dict, stats: dict):
+        with self._lock:
+            super(SharedConversionCache, self).merge(entries, stats)
+
+    def save(self):
+        with self._lock:
+            super(SharedConversionCache, self).save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return super(SharedConversionCache, self).stats()
+
+
+class DocumentCache(object):
+    """
+    Parsed MindNode files by path, at most @ref.max_size of them. An entry
+    is used while size and mtime of its `contents.xml` are unchanged.
+    """
+
+    def __init__(self, max_size: int = 8, cache_dir: str = None):
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, input_dir: str) -> dict:
+        input_dir = os.path.abspath(os.path.expanduser(input_dir))
+        try:
+            stat = os.stat(os.path.join(input_dir, 'contents.xml'))
+        except OSError:
+            raise RequestError(404, f'no MindNode file at {input_dir}')
+        signature = (stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            entry = self._documents.get(input_dir)
+            if entry is not None and entry[0] == signature:
+                self._documents.move_to_end(input_dir)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        # loaded outside of the lock, concurrent requests of a changed file
+        # may both load it
+        data = load_contents(input_dir, self.cache_dir)
+        with self._lock:
+            self._documents[input_dir] = (signature, data)
+            self._documents.move_to_end(input_dir)
+            if len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+        return data
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._documents)}
+
+
+class Metrics(object):
+    """
+    Count requests per endpoint and keep the latency of the last
+    @ref.samples ones for percentiles
+    """
+
+    def __init__(self, samples: int = 1024):
+        self.samples = samples
+        self.started = time.time()
+        self._endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint: str, status: int, elapsed: float):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {'requests': 0, 'errors': 0, 'seconds': 0.0,
+                                                     'latency': deque(maxlen=self.samples)}
+            entry['requests'] += 1
+            entry['errors'] += status >= 400
+            entry['seconds'] += elapsed
+            entry['latency'].append(elapsed)
+
+    def report(self) -> dict:
+        endpoints = {}
+        with self._lock:
+            for name, entry in self._endpoints.items():
+                latency = sorted(entry['latency'])
+                endpoints[name] = {
+                    'requests': entry['requests'],
+                    'errors': entry['errors'],
+                    'mean_ms': entry['seconds'] / entry['requests'] * 1000,
+                    'p50_ms': latency[len(latency) // 2] * 1000,
+                    'p95_ms': latency[min(len(latency) - 1, int(len(latency) * 0.95))] * 1000,
+                    'max_ms': latency[-1] * 1000,
+                }
+        return {'uptime': time.time() - self.started, 'endpoints': endpoints}
+
+
+class ConversionService(object):
+    """
+    State kept warm between requests: conversion cache of @ref.converter,
+    persisted in @ref.cache_dir on `close`, parsed documents and metrics
+    """
+
+    def __init__(self, converter: str = 'soup', cache_dir: str = None, documents: int = 8,
+                 log_level: int = Logging.LOG_WARN, log_stream=None):
+        self.converter = converter
+        self.cache = SharedConversionCache(converters[converter].version, cache_dir=cache_dir)
+        self.documents = DocumentCache(documents, cache_dir)
+        self.metrics = Metrics()
+        self.log_level = log_level
+        self.log_stream = log_stream
+        self.logger = Logging(log_level, log_stream)
+
+    def _configs(self, fmt: str) -> dict:
+        if fmt not in backends:
+            raise RequestError(400, f'invalid format {fmt!r}, choose among {", ".join(backends)}')
+        return {
+            'logging': self.log_level,
+            'log_stream': self.log_stream,
+            'cache': self.cache,
+            'converter': self.converter,
+            'formats': [fmt],
+        }
+
+    def convert(self, text: str, fmt: str = 'adoc') -> str:
+        """
+        Return markup of the html fragment @ref.text
+        """
+        generator = BaseGenerator({}, self._configs(fmt))
+        if generator.fragments is None:
+            return generator._convert_to_markup(text)
+        return generator.backends[0].render(generator._get_fragment(text))
+
+    def render(self, path: str, generator: str = 'simple', fmt: str = 'adoc', author: str = '',
+               prefix: str = '') -> str:
+        """
+        Return the documents of all mind maps of MindNode file @ref.path,
+        weekly notes are those of the current week
+        """
+        generator_class = generators.get(generator)
+        if generator_class is None:
+            raise RequestError(400, f'invalid generator {generator!r}, choose among {", ".join(generators)}')
+        configs = self._configs(fmt)
+        data = self.documents.get(path)
+        prev_week, week_num, quarter = get_current_week()
+        mind_maps = data['canvas']['mindMaps']
+        sink = MemorySink()
+        logger = Logging(self.log_level, self.log_stream)
+        for index, main_node in enumerate(mind_maps):
+            generator = generator_class(main_node, dict(configs, input=path, author=author, prefix=prefix,
+                                                        previous_week=prev_week, current_week=week_num,
+                                                        current_quarter=quarter,
+                                                        map_index=index + 1 if len(mind_maps) > 1 else None))
+            generator.generate(sink)
+            logger.merge_tallies(generator.logger.tallies)
+        # counted warnings are reported once per request
+        logger.report_tallies()
+        return sink.getvalue()
+
+    def report(self) -> dict:
+        return dict(self.metrics.report(), cache=self.cache.stats(), documents=self.documents.stats())
+
+    def close(self):
+        self.cache.save()
+
+
+class ConversionHandler(BaseHTTPRequestHandler):
+    server_version = 'hyranote'
+    # keep connections open between requests of a client
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def _handle(self, method: str):
+        start = time.perf_counter()
+        url = urlsplit(self.path)
+        endpoint = url.path
+        try:
+            if not self.server.allows_host(self.headers.get('Host')):
+                endpoint = 'unknown'
+                raise RequestError(403, f'host {self.headers.get("Host")!r} is not allowed')
+            route = self._routes.get((method, endpoint))
+            if route is None:
+                endpoint = 'unknown'
+                raise RequestError(404, f'no {method} {url.path}')
+            status, content_type, body = route(self, parse_qs(url.query))
+        except RequestError as e:
+            status, content_type, body = e.status, 'text/plain', f'{e}\n'
+        except Exception as e:
+            self.server.service.logger.error(f'{method} {url.path}: {type(e).__name__}: {e}')
+            status, content_type, body = 500, 'text/plain', f'{type(e).__name__}: {e}\n'
+        data = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if status >= 400:
+            # the request body may not have been read
+            self.send_header('Connection', 'close')
+            self.close_connection = True
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.service.metrics.record(endpoint, status, time.perf_counter() - start)
+
+    def _read_body(self) -> str:
+        length = self.headers.get('Content-Length')
+        if length is None:
+            raise RequestError(411, 'Content-Length is required')
+        try:
+            length = int(length)
+        except ValueError:
+            raise RequestError(400, f'invalid Content-Length {length!r}')
+        if length > MAX_BODY_SIZE:
+            raise RequestError(413, f'body larger than {MAX_BODY_SIZE} bytes')
+        try:
+            return self.rfile.read(length).decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise RequestError(400, f'body is not UTF-8: {e}')
+
+    def _convert(self, query: dict):
+        fmt = query.get('format', ['adoc'])[0]
+        return 200, 'text/plain', self.server.service.convert(self._read_body(), fmt)
+
+    def _render(self, query: dict):
+        try:
+            request = json.loads(self._read_body())
+        except ValueError as e:
+            raise RequestError(400, f'invalid JSON: {e}')
+        if not isinstance(request, dict) or not isinstance(request.get('path'), str):
+            raise RequestError(400, 'expect a JSON object with the path of a MindNode file')
+        document = self.server.service.render(request['path'], request.get('generator', 'simple'),
+                                              request.get('format', 'adoc'), request.get('author', ''),
+                                              request.get('prefix', ''))
+        return 200, 'text/plain', document
+
+    def _metrics(self, query: dict):
+        return 200, 'application/json', json.dumps(self.server.service.report(), indent=2) + '\n'
+
+    _routes = {
+        ('POST', '/convert'): _convert,
+        ('POST', '/render'): _render,
+        ('GET', '/metrics'): _metrics,
+    }
+
+    def address_string(self) -> str:
+        # clients of a Unix socket have no address
+        return self.client_address[0] if self.client_address else 'local'
+
+    def log_message(self, format, *args):
+        self.server.service.logger.info(self.address_string(), format % args)
+
+
+class ThreadingLocalHTTPServer(ThreadingHTTPServer):
+    # bursts of concurrent clients wait instead of being refused
+    request_queue_size = socket.SOMAXCONN
+
+    def allows_host(self, host: str) -> bool:
+        if host is None:
+            # HTTP/1.0 clients, browsers always send the header
+            return True
+        if host.startswith('['):
+            name = host[1:host.find(']')]
+        else:
+            name = host.rsplit(':', 1)[0] if host.count(':') == 1 else host
+        return name.lower() in ('localhost', '127.0.0.1', '::1', self.server_address[0])
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    request_queue_size = socket.SOMAXCONN
+
+    def allows_host(self, host: str) -> bool:
+        # only reachable through the file system
+        return True
+
+    def server_bind(self):
+        try:
+            if stat.S_ISSOCK(os.stat(self.server_address).st_mode):
+                # left by a previous run
+                os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+        super(ThreadingUnixHTTPServer, self).server_bind()
+
+    def server_close(self):
+        super(ThreadingUnixHTTPServer, self).server_close()
+        try:
+            os.remove(self.server_address)
+        except FileNotFoundError:
+            pass
+
+
+def create_server(service: ConversionService, host: str = '127.0.0.1', port: int = 8765, socket_path: str = None):
+    """
+    Return a server answering requests with @ref.service in a thread per
+    connection, on the Unix socket @ref.socket_path when given
+    """
+    if socket_path:
+        server = ThreadingUnixHTTPServer(socket_path, ConversionHandler)
+    else:
+        server = ThreadingLocalHTTPServer((host, port), ConversionHandler)
+    server.service = service
+    return server
@@ -0,0 +1,110 @@
+import os
+import sys
+
+
+class BufferedSink(object):
+    """
+    Destination of rendered chunks, chunks are joined and written to
+    @ref.stream in blocks of at least @ref.buffer_size characters, by the
+    background thread of @ref.pipeline when given. @ref.written_chars counts
+    characters handed to the stream.
+    """
+
+    def __init__(self, stream, buffer_size: int = 1 << 20, pipeline=None):
+        self.stream = stream
+        self.buffer_size = buffer_size
+        self.pipeline = pipeline
+        self.written_chars = 0
+        self._parts = []
+        self._size = 0
+
+    def write(self, chunk: str):
+        self._parts.append(chunk)
+        self._size += len(chunk)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._parts:
+            block = ''.join(self._parts)
+            if self.pipeline is None:
+                self.stream.write(block)
+            else:
+                self.pipeline.write(self.stream, block)
+            self.written_chars += len(block)
+            self._parts = []
+            self._size = 0
+        if self.pipeline is None:
+            self.stream.flush()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class FileSink(BufferedSink):
+    def __init__(self, path: str, buffer_size: int = 1 << 20, pipeline=None):
+        self.path = path
+        super(FileSink, self).__init__(open(path, 'wt'), buffer_size, pipeline)
+
+    def close(self):
+        try:
+            super(FileSink, self).close()
+        finally:
+            if self.pipeline is None:
+                self.stream.close()
+            else:
+                self.pipeline.close_stream(self.stream)
+
+
+class StdoutSink(BufferedSink):
+    """
+    Write to standard output, the first chunk is flushed right away so that
+    a downstream tool can start working while the rest is rendered
+    """
+
+    def __init__(self, buffer_size: int = 1 << 16):
+        super(StdoutSink, self).__init__(sys.stdout, buffer_size)
+
+    def write(self, chunk: str):
+        super(StdoutSink, self).write(chunk)
+        if not self.written_chars:
+            self.flush()
+
+    def flush(self):
+        try:
+            super(StdoutSink, self).flush()
+        except BrokenPipeError:
+            # the reader went away, e.g. `| head`: later writes of the
+            # interpreter go to devnull, see the signal module documentation
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, self.stream.fileno())
+            sys.exit(1)
+
+
+class MemorySink(object):
+    def __init__(self):
+        self._parts = []
+
+    def write(self, chunk: str):
+        self._parts.append(chunk)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+    def getvalue(self) -> str:
+        return ''.join(self._parts)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
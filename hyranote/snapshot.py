@@ -0,0 +1,205 @@
+import hashlib
+import marshal
+import mmap
+import os
+import plistlib
+import struct
+
+from hyranote.hutil import file_digest
+
+# bump whenever the layout of snapshot files changes
+_MAGIC = b'HYRASNP1'
+_HEADER = struct.Struct('<8sI')
+_FORMAT_MARSHAL = 'marshal'
+_FORMAT_PLIST = 'bplist'
+# snapshots kept per cache folder, least recently used ones are removed beyond
+MAX_SNAPSHOTS = 64
+MAX_SNAPSHOT_BYTES = 256 << 20
+
+
+def _snapshot_dir(cache_dir: str) -> str:
+    return os.path.join(cache_dir, 'snapshots')
+
+
+def _snapshot_path(cache_dir: str, path: str) -> str:
+    name = hashlib.sha1(os.path.abspath(path).encode('utf-8')).hexdigest()
+    return os.path.join(_snapshot_dir(cache_dir), f'{name}.snapshot')
+
+
+def _read_snapshot(snapshot_path: str):
+    """
+    Return header of snapshot file, the memory mapped file and offset of the
+    payload in it, the caller closes the mapping
+    """
+    with open(snapshot_path, 'rb') as fp:
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        magic, header_size = _HEADER.unpack_from(mm)
+        if magic != _MAGIC:
+            raise ValueError('not a snapshot file')
+        offset = _HEADER.size
+        header = marshal.loads(mm[offset:offset + header_size])
+    except BaseException:
+        mm.close()
+        raise
+    return header, mm, offset + header_size
+
+
+def _load_payload(fmt: str, mm, offset: int):
+    payload = memoryview(mm)[offset:]
+    try:
+        if fmt == _FORMAT_MARSHAL:
+            return marshal.loads(payload)
+        return plistlib.loads(payload.tobytes(), fmt=plistlib.FMT_BINARY)
+    finally:
+        payload.release()
+
+
+def _write_snapshot(snapshot_path: str, header: dict, data: dict):
+    """
+    Write snapshot file, raise `ValueError` or `RecursionError` for outlines
+    nested too deep to be encoded
+    """
+    try:
+        payload = marshal.dumps(data)
+        header['format'] = _FORMAT_MARSHAL
+    except ValueError:
+        # dates and other plist values marshal can't encode
+        payload = plistlib.dumps(data, fmt=plistlib.FMT_BINARY, sort_keys=False)
+        header['format'] = _FORMAT_PLIST
+    header_bytes = marshal.dumps(header)
+    os.makedirs(os.path.dirname(snapshot_path), exist_ok=True)
+    tmp_path = f'{snapshot_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as fp:
+        fp.write(_HEADER.pack(_MAGIC, len(header_bytes)))
+        fp.write(header_bytes)
+        fp.write(payload)
+    os.replace(tmp_path, snapshot_path)
+
+
+def _evict_snapshots(cache_dir: str, keep: str):
+    """
+    Remove least recently used snapshots of @ref.cache_dir beyond
+    `MAX_SNAPSHOTS` files or `MAX_SNAPSHOT_BYTES`, never @ref.keep
+    """
+    entries = []
+    for x in _snapshot_files(cache_dir):
+        try:
+            stat = os.stat(x)
+        except OSError:
+            continue
+        entries.append((stat.st_mtime_ns, stat.st_size, x))
+    entries.sort(reverse=True)
+    count = 0
+    total = 0
+    for _, size, x in entries:
+        count += 1
+        total += size
+        if x != keep and (count > MAX_SNAPSHOTS or total > MAX_SNAPSHOT_BYTES):
+            try:
+                os.remove(x)
+            except OSError:
+                pass
+
+
+def load_contents(input_dir: str, cache_dir: str = None) -> dict:
+    """
+    Load `contents.xml` of MindNode file @ref.input_dir.
+
+    When @ref.cache_dir is given, the parsed canvas is kept there as a binary
+    snapshot keyed by path, size, mtime and hash of `contents.xml`, so repeat
+    runs skip xml parsing. A snapshot whose size matches but mtime doesn't is
+    still used when the content hash is unchanged. Least recently used
+    snapshots are removed beyond `MAX_SNAPSHOTS` files or
+    `MAX_SNAPSHOT_BYTES`, outlines too deep to be encoded get no snapshot.
+    """
+    path = os.path.join(input_dir, 'contents.xml')
+    if not cache_dir:
+        with open(path, 'rb') as fp:
+            return plistlib.load(fp)
+    stat = os.stat(path)
+    snapshot_path = _snapshot_path(cache_dir, path)
+    digest = None
+    try:
+        header, mm, offset = _read_snapshot(snapshot_path)
+        try:
+            if header['path'] == os.path.abspath(path) and header['size'] == stat.st_size:
+                if header['mtime'] != stat.st_mtime_ns:
+                    digest = file_digest(path)
+                if digest is None or digest == header['digest']:
+                    data = _load_payload(header['format'], mm, offset)
+                    if digest is None:
+                        # mark as recently used for eviction
+                        try:
+                            os.utime(snapshot_path)
+                        except OSError:
+                            pass
+                    else:
+                        # same content, refresh mtime so the next run skips hashing
+                        try:
+                            _write_snapshot(snapshot_path, dict(header, mtime=stat.st_mtime_ns), data)
+                        except OSError:
+                            pass
+                    return data
+        finally:
+            mm.close()
+    except (OSError, ValueError, EOFError, KeyError, TypeError, struct.error, plistlib.InvalidFileException):
+        pass
+
+    with open(path, 'rb') as fp:
+        data = plistlib.load(fp)
+    header = {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime': stat.st_mtime_ns,
+        'digest': digest or file_digest(path),
+    }
+    try:
+        _write_snapshot(snapshot_path, header, data)
+        _evict_snapshots(cache_dir, snapshot_path)
+    except (OSError, ValueError, RecursionError):
+        pass
+    return data
+
+
+def _snapshot_files(cache_dir: str) -> list:
+    folder = _snapshot_dir(cache_dir)
+    try:
+        names = sorted(os.listdir(folder))
+    except OSError:
+        return []
+    return [os.path.join(folder, x) for x in names if x.endswith('.snapshot')]
+
+
+def snapshot_stats(cache_dir: str) -> dict:
+    """
+    Return counters of snapshots in @ref.cache_dir, stale snapshots are those
+    whose `contents.xml` is gone or changed
+    """
+    stats = {'folder': _snapshot_dir(cache_dir), 'snapshots': 0, 'stale': 0, 'bytes': 0}
+    for x in _snapshot_files(cache_dir):
+        stats['snapshots'] += 1
+        stats['bytes'] += os.path.getsize(x)
+        try:
+            header, mm, _ = _read_snapshot(x)
+            mm.close()
+            stat = os.stat(header['path'])
+            if stat.st_size != header['size'] or stat.st_mtime_ns != header['mtime']:
+                stats['stale'] += 1
+        except (OSError, ValueError, EOFError, KeyError, TypeError, struct.error):
+            stats['stale'] += 1
+    return stats
+
+
+def clear_snapshots(cache_dir: str) -> int:
+    """
+    Remove snapshots in @ref.cache_dir, return number of removed files
+    """
+    removed = 0
+    for x in _snapshot_files(cache_dir):
+        try:
+            os.remove(x)
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -3,11 +3,50 @@
 meta introspection.
 """
 
+from types import GeneratorType
+
 from bs4 import PageElement, NavigableString, Tag
+from bs4.element import PreformattedString
 
 from hyranote.logging import Logging
 
 
+def get_dispatch_table(cls, prefix: str = 'visit_tag_') -> dict:
+    """Return mapping from tag names to names of visitor functions of @ref.cls,
+    including aliases of shared visitor functions.  The table is built once per
+    class and stored on it.
+    """
+    table = cls.__dict__.get('_dispatch_table')
+    if table is None:
+        table = {}
+        for name in dir(cls):
+            if not name.startswith(prefix):
+                continue
+            tag = name[len(prefix):]
+            if tag in ('fall_through', 'ignore_content'):
+                # shared visitor functions, only reachable through aliases
+                continue
+            table[tag] = name
+        cls._dispatch_table = table
+    return table
+
+
+def get_ignored_tags(cls, prefix: str = 'visit_tag_') -> frozenset:
+    """Return names of tags whose content @ref.cls doesn't visit, those of
+    the aliases of its `visit_tag_ignore_content`.
+    """
+    ignore = getattr(cls, f'{prefix}ignore_content', None)
+    return frozenset(tag for tag, name in get_dispatch_table(cls, prefix).items() if getattr(cls, name) is ignore)
+
+
+def is_text(node) -> bool:
+    """Tell whether @ref.node is text. Newer bs4 versions keep text of
+    elements such as `rt` or `template` in subclasses of `NavigableString`,
+    they are text as well, unlike comments and other preformatted strings.
+    """
+    return isinstance(node, NavigableString) and not isinstance(node, PreformattedString)
+
+
 class NodeVisitor(object):
     """Walks the abstract syntax tree and call visitor functions for every
     node found.  The visitor functions may return values which will be
@@ -18,42 +57,87 @@ class NodeVisitor(object):
     be `visit_TryFinally`.  This behavior can be changed by overriding
     the `get_visitor` function.  If no visitor function exists for a node
     (return value `None`) the `generic_visit` visitor is used instead.
+
+    Visitor functions which need content of child nodes are generators,
+    they delegate to `generic_visit` with ``yield from`` and receive the
+    joined content of the children.  Nested nodes are visited by `visit` with
+    an explicit stack of those generators, so deeply nested documents don't
+    hit the recursion limit.  Visitor functions only receive the node, state
+    which depends on its ancestors is kept on the visitor.
     """
 
     def __init__(self, logger: Logging):
         self.logger = logger
+        self._tag_visitors = {tag: getattr(self, name) for tag, name in get_dispatch_table(type(self)).items()}
 
     def get_visitor(self, node: PageElement):
         """Return the visitor function for this node or `None` if no visitor
         exists for this node.  In that case the generic visit function is
-        used instead.
+        used instead.  Missing visitors are reported once per run by
+        `Logging.report_tallies`.
         """
-        if type(node) is NavigableString:
-            method = "visit_text"
-        elif type(node) is Tag:
-            method = f"visit_tag_{node.name}"
-        else:
-            method = "visit_unknown"
-        value = getattr(self, method, None)
-        if value is None:
-            self.logger.warn('Cannot get visit method:', method)
-        return value
+        node_type = type(node)
+        if node_type is Tag:
+            value = self._tag_visitors.get(node.name)
+            if value is None:
+                self.logger.tally('Cannot get visit method:', f'visit_tag_{node.name}')
+            return value
+        if node_type is NavigableString or is_text(node):
+            return self.visit_text
+        return self.visit_unknown
 
-    def visit(self, node, *args, **kwargs):
-        """Visit a node."""
+    def _call_visitor(self, node):
         f = self.get_visitor(node)
         if f is not None:
-            return f(node, *args, **kwargs)
-        return self.generic_visit(node, *args, **kwargs)
+            return f(node)
+        return self.generic_visit(node)
+
+    def visit(self, node):
+        """Visit a node."""
+        value = self._call_visitor(node)
+        if type(value) is not GeneratorType:
+            return value
+
+        stack = [value]
+        value = None
+        error = None
+        while stack:
+            try:
+                if error is not None:
+                    request = stack[-1].throw(error)
+                    error = None
+                else:
+                    request = stack[-1].send(value)
+            except StopIteration as e:
+                stack.pop()
+                value = e.value
+                continue
+            except Exception as e:
+                stack.pop()
+                if not stack:
+                    raise
+                error = e
+                continue
+
+            # visitor function requests visiting a child node
+            try:
+                value = self._call_visitor(request)
+            except Exception as e:
+                error = e
+                continue
+            if type(value) is GeneratorType:
+                stack.append(value)
+                value = None
+        return value
 
-    def visit_text(self, node, *args, **kwargs):
+    def visit_text(self, node):
         return node.string
 
-    def visit_unknown(self, node, *args, **kwargs):
-        self.logger.warn('UNKNOWN Node Type:', node.__class__.__name__)
+    def visit_unknown(self, node):
+        self.logger.tally('UNKNOWN Node Type:', node.__class__.__name__)
         return ''
 
-    def generic_visit(self, node, *args, **kwargs):
+    def generic_visit(self, node):
         """Called if no explicit visitor function exists for a node."""
         if node is None:
             return ''
@@ -61,7 +145,7 @@ class NodeVisitor(object):
         content = []
         try:
             for child in node.contents:
-                value = self.visit(child, *args, **kwargs)
+                value = yield child
                 content.append(value)
         except TypeError as e:
             self.logger.error(e)
@@ -0,0 +1,194 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+from hyranote.logging import Logging
+
+CONTENTS = 'contents'
+RESOURCES = 'resources'
+
+# inotify(7) event masks
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_IGNORED = 0x00008000
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+_EVENT = struct.Struct('iIII')
+
+
+class InotifyWatcher(object):
+    """
+    Report changes of `contents.xml` and `resources` of the MindNode file
+    @ref.input_dir with inotify, only available on Linux
+    """
+
+    def __init__(self, input_dir: str):
+        self.input_dir = input_dir
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self._bundle_wd = self._add_watch(input_dir)
+        self._resources_wd = None
+        self._watch_resources()
+
+    def _add_watch(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f'inotify_add_watch failed on {path}')
+        return wd
+
+    def _watch_resources(self):
+        try:
+            self._resources_wd = self._add_watch(os.path.join(self.input_dir, 'resources'))
+        except OSError:
+            self._resources_wd = None
+
+    def wait(self, timeout: float = None) -> set:
+        """
+        Return kinds of changes seen within @ref.timeout seconds, wait forever
+        when @ref.timeout is `None`
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                return set()
+            changes = self._read_changes()
+            if changes:
+                return changes
+
+    def _read_changes(self) -> set:
+        changes = set()
+        try:
+            buffer = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return changes
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = _EVENT.unpack_from(buffer, offset)
+            offset += _EVENT.size
+            name = buffer[offset:offset + length].rstrip(b'\0').decode('utf-8', 'replace')
+            offset += length
+            if wd == self._resources_wd:
+                if mask & _IN_IGNORED:
+                    self._resources_wd = None
+                changes.add(RESOURCES)
+            elif wd == self._bundle_wd:
+                if name == 'contents.xml':
+                    changes.add(CONTENTS)
+                elif name == 'resources':
+                    self._watch_resources()
+                    changes.add(RESOURCES)
+        return changes
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher(object):
+    """
+    Report changes of `contents.xml` and `resources` of the MindNode file
+    @ref.input_dir by comparing their size and mtime every @ref.interval seconds
+    """
+
+    def __init__(self, input_dir: str, interval: float = 0.5):
+        self.input_dir = input_dir
+        self.interval = interval
+        self._state = self._scan()
+
+    def _scan(self) -> dict:
+        state = {}
+        try:
+            stat = os.stat(os.path.join(self.input_dir, 'contents.xml'))
+            state[CONTENTS] = (stat.st_size, stat.st_mtime_ns)
+        except OSError:
+            state[CONTENTS] = None
+        resources = {}
+        for root, _, files in os.walk(os.path.join(self.input_dir, 'resources')):
+            for x in files:
+                try:
+                    stat = os.stat(os.path.join(root, x))
+                except OSError:
+                    continue
+                resources[os.path.join(root, x)] = (stat.st_size, stat.st_mtime_ns)
+        state[RESOURCES] = resources
+        return state
+
+    def wait(self, timeout: float = None) -> set:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            state = self._scan()
+            changes = {k for k, v in state.items() if self._state.get(k) != v}
+            self._state = state
+            if changes:
+                return changes
+            if deadline is not None and time.monotonic() >= deadline:
+                return changes
+            delay = self.interval
+            if deadline is not None:
+                delay = min(delay, max(0.0, deadline - time.monotonic()))
+            time.sleep(delay)
+
+    def close(self):
+        pass
+
+
+def create_watcher(input_dir: str):
+    """
+    Return an inotify watcher when supported, a polling watcher otherwise
+    """
+    try:
+        return InotifyWatcher(input_dir)
+    except (OSError, AttributeError, TypeError):
+        return PollingWatcher(input_dir)
+
+
+def watch_bundle(input_dir: str, render, sync, debounce: float = 0.5, log_stream=None):
+    """
+    Render the MindNode file @ref.input_dir then render it again whenever
+    its `contents.xml` changes, until interrupted.
+
+    @ref.render returns attachments of the rendered documents and
+    @ref.sync copies them, only @ref.sync is called again when only resources
+    changed. Bursts of changes are merged until no change was seen for
+    @ref.debounce seconds. Failures are reported and watching goes on.
+    """
+    logger = Logging(Logging.LOG_INFO, log_stream)
+    watcher = create_watcher(input_dir)
+    print(f'watching {input_dir} with {type(watcher).__name__}, press Ctrl-C to stop', file=log_stream)
+    attachments = None
+    changes = {CONTENTS, RESOURCES}
+    changed_at = time.perf_counter()
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                if attachments is None or CONTENTS in changes:
+                    attachments = render()
+                sync(attachments)
+                elapsed = time.perf_counter() - start
+                print(f'{logger.green("ok  ")} {", ".join(sorted(changes))} in {elapsed:.3f}s, '
+                      f'{time.perf_counter() - changed_at:.3f}s after change', file=log_stream)
+            except Exception as e:
+                logger.error(f'{type(e).__name__}: {e}')
+
+            changes = watcher.wait()
+            changed_at = time.perf_counter()
+            while True:
+                more = watcher.wait(debounce)
+                if not more:
+                    break
+                changes |= more
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
@@ -0,0 +1,94 @@
+"""
+The streaming converter must give the markup of `AsciidocVisitor` on a tree
+built by BeautifulSoup, for the fragments of converter_corpus.txt on which
+they disagreed and for generated fragments.
+"""
+import json
+import os
+import random
+
+import pytest
+from bs4 import BeautifulSoup
+
+from hyranote.asciidoc_stream import AsciidocStreamConverter
+from hyranote.asciidoc_visitor import AsciidocVisitor
+from hyranote.document import build_fragment
+from hyranote.logging import Logging
+from hyranote.visitor import get_dispatch_table, get_ignored_tags
+
+CORPUS = os.path.join(os.path.dirname(__file__), 'converter_corpus.txt')
+
+TAGS = ['p', 'div', 'span', 'b', 'i', 'em', 'strong', 'a href="https://example.com"', 'a href="local"', 'ul', 'ol',
+        'li', 'pre', 'code class="language-python"', 'br', 'hr', 'img src="image.png" alt="alt"', 'blockquote', 'cite',
+        'figure', 'figure class="paragraph-image"', 'figcaption', 'noscript', 'h1', 'h3', 'h5', 'table', 'tr', 'td',
+        'th colspan="2"', 'caption', 'thead', 'section', 'script', 'style', 'template', 'textarea',
+        'span style="font-weight: bold"', 'u']
+TEXTS = ['text', ' ', '\n', '  spaced  ', '&amp;', '&lt;', 'a > b', 'multi\nline', '<!-- comment -->', '&nbsp;',
+         '&#65;', '<![CDATA[data]]>']
+
+
+def load_corpus() -> list:
+    with open(CORPUS, encoding='utf-8') as f:
+        return [json.loads(x) for x in f if x.strip() and not x.startswith('#')]
+
+
+def generate_fragment(rnd: random.Random, depth: int = 0) -> str:
+    """
+    Return a random fragment, with unbalanced tags when @ref.depth is `None`
+    """
+    out = []
+    for _ in range(rnd.randint(1, 4 if depth is not None else 12)):
+        r = rnd.random()
+        tag = rnd.choice(TAGS)
+        name = tag.split()[0]
+        if depth is None and r < 0.4:
+            out.append(f'<{tag}>')
+        elif depth is None and r < 0.7:
+            out.append(f'</{name}>')
+        elif depth is not None and depth < 5 and r < 0.5:
+            out.append(f'<{tag}>{generate_fragment(rnd, depth + 1)}</{name}>')
+        else:
+            out.append(rnd.choice(TEXTS))
+    return ''.join(out)
+
+
+@pytest.fixture(scope='module')
+def converters():
+    logger = Logging(Logging.LOG_ERROR + 1)
+    return AsciidocVisitor(logger), AsciidocStreamConverter(logger)
+
+
+def convert(converters, text: str):
+    visitor, converter = converters
+    doc = BeautifulSoup(f'<div>{text}</div>', features='html.parser')
+    return visitor.visit(doc.find()).strip(), converter.convert(text).strip()
+
+
+@pytest.mark.parametrize('text', load_corpus())
+def test_corpus(converters, text):
+    expected, value = convert(converters, text)
+    assert value == expected
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_generated(converters, seed):
+    rnd = random.Random(seed)
+    texts = [generate_fragment(rnd, None if i % 2 else 0) for i in range(1000)]
+    assert [x for x in texts if len(set(convert(converters, x))) > 1] == []
+
+
+def test_same_elements():
+    assert get_dispatch_table(AsciidocStreamConverter).keys() == get_dispatch_table(AsciidocVisitor).keys()
+    assert get_ignored_tags(AsciidocStreamConverter) == get_ignored_tags(AsciidocVisitor)
+
+
+def test_prettify():
+    logger = Logging(Logging.LOG_ERROR + 1)
+    rnd = random.Random(0)
+    texts = [x for x in load_corpus() if x.startswith('<table')]
+    texts += [generate_fragment(rnd, None if i % 2 else 0) for i in range(1000)]
+    for text in texts:
+        # without elements which take out part of their content
+        text = text.replace('blockquote', 'b').replace('figure', 'i')
+        doc = BeautifulSoup(f'<div>{text}</div>', features='html.parser').find()
+        assert build_fragment(doc, logger).prettify() == doc.prettify()
@@ -0,0 +1,28 @@
+"""
+The plain text fast path of title conversion must give the markup of the
+full html parser for every fragment it accepts.
+"""
+import random
+
+from benchmarks.bench_titles import REAL_FRAGMENTS, convert_full, generate_fragment
+from hyranote.asciidoc_visitor import AsciidocVisitor, convert_plain_fragment
+from hyranote.logging import Logging
+
+
+def test_fast_path():
+    visitor = AsciidocVisitor(Logging(Logging.LOG_ERROR + 1))
+    rnd = random.Random(0)
+    corpus = REAL_FRAGMENTS + [generate_fragment(rnd) for _ in range(5000)]
+    mismatches = []
+    for text in corpus:
+        value = convert_plain_fragment(text)
+        if value is not None and value != convert_full(visitor, text):
+            mismatches.append(text)
+    assert mismatches == []
+
+
+def test_plain_titles():
+    for text in ['W42', '[S] Backlog', '<span>Weekly sync</span>', 'Tom &amp; Jerry', '  padded title \n']:
+        assert convert_plain_fragment(text) is not None
+    for text in ['<span style="font-weight: bold">Important</span>', '<b>bold</b> title', '&copy; 2020']:
+        assert convert_plain_fragment(text) is None
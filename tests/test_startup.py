@@ -0,0 +1,24 @@
+"""
+Parsing the command line of any subcommand must not import heavy modules
+and must stay within the import time budget, measured with
+`python -X importtime` like benchmarks/bench_startup.py does.
+"""
+import pytest
+
+from benchmarks.bench_startup import COMMANDS, measure
+
+# milliseconds, the fastest of a few runs is kept
+BUDGET_MS = 40.0
+REPEAT = 3
+
+
+@pytest.mark.parametrize('argv, forbidden', COMMANDS, ids=[' '.join(x[0]) for x in COMMANDS])
+def test_startup(argv, forbidden):
+    total = None
+    modules = set()
+    for _ in range(REPEAT):
+        elapsed, modules = measure(argv)
+        total = elapsed if total is None else min(total, elapsed)
+    assert 'hyranote.cli' in modules
+    assert sorted(x for x in forbidden if x in modules) == []
+    assert total / 1000 <= BUDGET_MS